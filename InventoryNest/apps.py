@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class InventoryNestConfig(AppConfig):
+    name = 'InventoryNest'
+
+    def ready(self):
+        # Project-wide checks, not owned by any one app
+        from . import checks  # noqa: F401
@@ -0,0 +1,25 @@
+"""
+System checks for settings the apps rely on.
+"""
+from django.core import checks
+from django.core.cache.backends.locmem import LocMemCache
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Cached responses (me/, storefront pages, top sellers) are
+    invalidated by bumping a version kept in the cache. With a per-process
+    cache the bump only reaches the process that made it, and the others keep
+    serving stale data until it expires. Runs with `manage.py check --deploy`.
+    """
+    from django.core.cache import caches
+
+    if not isinstance(caches['default'], LocMemCache):
+        return []
+    return [checks.Error(
+        "The default cache is local to each server process, so cache invalidation doesn't reach the others.",
+        hint="Set REDIS_URL to share the cache. When running a single server process, add "
+             "'InventoryNest.E001' to SILENCED_SYSTEM_CHECKS.",
+        id='InventoryNest.E001',
+    )]
@@ -0,0 +1,126 @@
+"""
+Content codings for CompressionMiddleware.
+
+gzip is always available. Brotli (``br``) and Zstandard (``zstd``) are used
+when the ``brotli`` and ``zstandard`` packages are installed.
+
+Each codec compresses a whole body with ``compress(data)``, and a streamed
+body with the ``(compress_chunk, finish)`` pair returned by ``stream(flush)``.
+With ``flush`` every chunk is sent on as soon as it is compressed, rather
+than when the compressor's buffer fills up; that costs some compression on
+small chunks, so it is only worth it when the client waits on each chunk.
+"""
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipCodec:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        # mtime=0 keeps the output the same for the same content
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def stream(self, flush):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        if flush:
+            return lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+        return compressor.compress, compressor.flush
+
+
+class BrotliCodec:
+    name = 'br'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self, flush):
+        compressor = brotli.Compressor(quality=self.level)
+        if flush:
+            return lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish
+        return compressor.process, compressor.finish
+
+
+class ZstdCodec:
+    name = 'zstd'
+
+    def __init__(self, level):
+        self.level = level
+
+    # Compressor contexts are not thread safe, so each response gets its own
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self, flush):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        if flush:
+            return (lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                    compressor.flush)
+        return compressor.compress, compressor.flush
+
+
+CODECS = {'gzip': GzipCodec}
+if brotli is not None:
+    CODECS['br'] = BrotliCodec
+if zstandard is not None:
+    CODECS['zstd'] = ZstdCodec
+
+
+def available_codecs(levels):
+    """
+    Instances of the installed codecs, keyed by content coding, at the given
+    {coding: level}. Codings missing from `levels` are left out.
+    """
+    return {name: CODECS[name](level) for name, level in levels.items() if name in CODECS}
+
+
+def parse_accept_encoding(header):
+    """
+    Parse an Accept-Encoding header into {coding: q}.
+    """
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_codec(header, codecs):
+    """
+    The codec to use for a request's Accept-Encoding header, or None. The
+    client's preference (q value) wins; ties go to the order of `codecs`.
+    """
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for name, codec in codecs.items():
+        q = accepted.get(name, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = codec, q
+    return best
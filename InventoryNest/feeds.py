@@ -0,0 +1,52 @@
+"""
+Commit-ordered change feeds.
+
+Sequence numbers and timestamps are handed out when a row is written, not
+when its transaction commits, so a feed paged by them can skip a row whose
+transaction commits late. Feeds therefore record the transaction that wrote
+each row (`current_txid()` as the txid column's database default) and only
+read rows of transactions older than any still running, ordered by
+(txid, sequence). A transaction that commits later has a higher txid, so its
+rows sort after everything already read and a checkpoint never jumps them.
+
+A long-running transaction anywhere in the database holds the feeds back
+until it ends. PostgreSQL only.
+"""
+from django.db import connection
+from django.db.models import BigIntegerField, Func, Q
+from django.db.models.expressions import RawSQL
+
+_HORIZON_SQL = 'txid_snapshot_xmin(txid_current_snapshot())'
+
+
+def current_txid():
+    """
+    The id of the current transaction, as an expression.
+    """
+    return Func(function='txid_current', output_field=BigIntegerField())
+
+
+def horizon():
+    """
+    The oldest transaction still running; every transaction below it has ended.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {_HORIZON_SQL}')
+        return cursor.fetchone()[0]
+
+
+def settled(queryset, sequence='sequence', below=None):
+    """
+    The rows of `queryset` whose transactions have ended, in feed order.
+    `below` is a horizon() read earlier, the current one by default.
+    """
+    if below is None:
+        below = RawSQL(_HORIZON_SQL, [], output_field=BigIntegerField())
+    return queryset.filter(txid__lt=below).order_by('txid', sequence)
+
+
+def after(txid, position, sequence='sequence'):
+    """
+    Filter for the rows after the feed position (txid, position).
+    """
+    return Q(txid__gt=txid) | Q(txid=txid, **{f'{sequence}__gt': position})
@@ -0,0 +1,195 @@
+"""
+In-process metrics in the Prometheus text format.
+
+`MetricsMiddleware` records per-view request latency, database queries and
+database time; the cache and email backends below count cache hits and misses
+and time outbound email. Everything is served by the `metrics` view at
+`/metrics`. Values are kept per server process, so scrape every process (or
+sum across them in Prometheus).
+"""
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache as BaseLocMemCache
+from django.core.cache.backends.redis import RedisCache as BaseRedisCache
+from django.core.mail.backends.smtp import EmailBackend as BaseSMTPEmailBackend
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Per-request counters of the request being handled in this thread
+current_request = ContextVar('current_request', default=None)
+
+_registry = []
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+                   for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _render_samples(self, items):
+        return [f'{self.name}{self._label_text(labels)} {value}' for labels, value in items]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # One count per bucket, then +Inf, then the sum
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def _render_samples(self, items):
+        lines = []
+        for labels, state in items:
+            for bound, count in zip(self.buckets, state):
+                lines.append(f'{self.name}_bucket{self._label_text(labels, [("le", bound)])} {count}')
+            lines.append(f'{self.name}_bucket{self._label_text(labels, [("le", "+Inf")])} {state[-2]}')
+            lines.append(f'{self.name}_count{self._label_text(labels)} {state[-2]}')
+            lines.append(f'{self.name}_sum{self._label_text(labels)} {state[-1]}')
+        return lines
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds', "Time spent handling a request.", ('view', 'method'))
+requests_total = Counter(
+    'http_requests_total', "Requests handled.", ('view', 'method', 'status'))
+request_queries = Histogram(
+    'http_request_db_queries', "Database queries made by a request.", ('view',), QUERY_COUNT_BUCKETS)
+request_db_duration = Histogram(
+    'http_request_db_duration_seconds', "Time a request spent in the database.", ('view',))
+cache_requests = Counter(
+    'cache_requests_total', "Cache lookups by result.", ('cache', 'result'))
+email_duration = Histogram(
+    'email_send_duration_seconds', "Time spent sending a batch of emails.")
+emails_sent = Counter(
+    'emails_sent_total', "Emails sent.")
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    """
+    Serve all metrics in the Prometheus text format. The scraper must send
+    `METRICS_TOKEN` as a bearer token; without a token configured nobody can
+    read them.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    sent = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(sent.encode(), f'Bearer {token}'.encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class CacheMetricsMixin:
+    """
+    Counts hits and misses of `get` (which `get_or_set` and the default
+    `get_many` go through), labelled with the cache's LOCATION. Mix into any
+    cache backend.
+    """
+    _missing = object()
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.metrics_name = location or self.__class__.__name__
+
+    def _record(self, hits, misses):
+        if hits:
+            cache_requests.inc(self.metrics_name, 'hit', amount=hits)
+        if misses:
+            cache_requests.inc(self.metrics_name, 'miss', amount=misses)
+        stats = current_request.get()
+        if stats is not None:
+            stats.cache_hits += hits
+            stats.cache_misses += misses
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        if value is self._missing:
+            self._record(0, 1)
+            return default
+        self._record(1, 0)
+        return value
+
+
+class LocMemCache(CacheMetricsMixin, BaseLocMemCache):
+    pass
+
+
+class RedisCache(CacheMetricsMixin, BaseRedisCache):
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        # LOCATION is the server URL, which may hold a password
+        self.metrics_name = 'redis'
+
+
+class EmailMetricsMixin:
+    """
+    Times `send_messages`. Mix into any email backend.
+    """
+    def send_messages(self, email_messages):
+        started = time.perf_counter()
+        try:
+            sent = super().send_messages(email_messages)
+        finally:
+            elapsed = time.perf_counter() - started
+            email_duration.observe(elapsed)
+            stats = current_request.get()
+            if stats is not None:
+                stats.email_time += elapsed
+        emails_sent.inc(amount=sent or 0)
+        return sent
+
+
+class SMTPEmailBackend(EmailMetricsMixin, BaseSMTPEmailBackend):
+    pass
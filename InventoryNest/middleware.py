@@ -0,0 +1,174 @@
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+from . import compression, metrics
+
+slow_request_logger = logging.getLogger('InventoryNest.slow_requests')
+
+
+class RequestStats:
+    """
+    What one request did: database queries and time, cache lookups and email
+    time. SQL is only kept when the request was picked for the slow request log.
+    """
+    def __init__(self, capture_sql):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.email_time = 0.0
+        self.statements = [] if capture_sql else None
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if self.statements is not None:
+                self.statements.append((sql, elapsed))
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count and database time for every request, labelled
+    with the URL name of the view, and logs a sample of slow requests along
+    with the SQL they ran.
+
+    Put it first in MIDDLEWARE so the timings cover the whole stack.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = settings.SLOW_REQUEST_THRESHOLD
+        self.sample_rate = settings.SLOW_REQUEST_SAMPLE_RATE
+
+    def __call__(self, request):
+        stats = RequestStats(capture_sql=random.random() < self.sample_rate)
+        token = metrics.current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(stats.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        metrics.request_duration.observe(elapsed, view, request.method)
+        metrics.requests_total.inc(view, request.method, response.status_code)
+        metrics.request_queries.observe(stats.queries, view)
+        metrics.request_db_duration.observe(stats.db_time, view)
+
+        if stats.statements is not None and elapsed >= self.slow_threshold:
+            log_slow_request(request, view, response, elapsed, stats)
+        return response
+
+
+def log_slow_request(request, view, response, elapsed, stats):
+    # Group identical statements so N+1 patterns stand out as one line with a high count
+    grouped = defaultdict(lambda: [0, 0.0])
+    for sql, duration in stats.statements:
+        grouped[sql][0] += 1
+        grouped[sql][1] += duration
+    top = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)[:settings.SLOW_REQUEST_LOGGED_STATEMENTS]
+
+    lines = [
+        f"Slow request: {request.method} {request.path} ({view}) -> {response.status_code} "
+        f"in {elapsed * 1000:.0f} ms; {stats.queries} queries in {stats.db_time * 1000:.0f} ms, "
+        f"{len(grouped)} distinct; cache {stats.cache_hits} hits / {stats.cache_misses} misses; "
+        f"email {stats.email_time * 1000:.0f} ms"
+    ]
+    for sql, (count, duration) in top:
+        lines.append(f"  {count}x {duration * 1000:.1f} ms  {sql}")
+    slow_request_logger.warning('\n'.join(lines))
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best coding the client accepts out of
+    COMPRESSION_LEVELS (zstd and br when installed, and gzip). Bodies smaller
+    than COMPRESSION_MIN_SIZE and already compressed content types are sent
+    as they are. Streaming responses are compressed as they stream; server-sent
+    events are flushed one by one so they aren't held back in the compressor.
+
+    Put it right after MetricsMiddleware, above anything that reads or changes
+    the response body.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.codecs = compression.available_codecs(settings.COMPRESSION_LEVELS)
+        self.min_size = settings.COMPRESSION_MIN_SIZE
+        self.skip_types = settings.COMPRESSION_SKIP_CONTENT_TYPES
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.should_compress(response):
+            return response
+
+        # The body depends on Accept-Encoding from here on, compressed or not
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codec = compression.choose_codec(request.headers.get('Accept-Encoding', ''), self.codecs)
+        if codec is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response, codec)
+            del response.headers['Content-Length']
+        else:
+            compressed = codec.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The compressed body is no longer byte-for-byte what a strong ETag promised
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codec.name
+        return response
+
+    def should_compress(self, response):
+        if response.has_header('Content-Encoding') or 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        content_type = response.get('Content-Type', '').partition(';')[0].strip().lower()
+        for skipped in self.skip_types:
+            if content_type == skipped or (skipped.endswith('/') and content_type.startswith(skipped)):
+                return False
+        if response.streaming:
+            # File responses know their size up front
+            length = response.get('Content-Length')
+            return length is None or int(length) >= self.min_size
+        return len(response.content) >= self.min_size
+
+    @staticmethod
+    def compress_stream(response, codec):
+        flush = response.get('Content-Type', '').startswith('text/event-stream')
+        compress_chunk, finish = codec.stream(flush)
+        content = response.streaming_content
+        if response.is_async:
+            async def stream():
+                async for chunk in content:
+                    if compressed := compress_chunk(chunk):
+                        yield compressed
+                yield finish()
+        else:
+            def stream():
+                for chunk in content:
+                    # Without flushing, most chunks only fill the compressor's buffer
+                    if compressed := compress_chunk(chunk):
+                        yield compressed
+                yield finish()
+        return stream()
@@ -0,0 +1,116 @@
+"""
+Background removal of soft-deleted shops, products and accounts.
+
+Everything depending on a deleted row (cart items, orders, price history,
+the products of a shop) is deleted `batch_size` rows at a time, each batch
+in its own short transaction, so no statement locks more than a batch and
+the request that deleted the row never waits for it. The delete views queue
+these functions; the purge_deleted command runs them for anything left over,
+e.g. after a restart dropped the queue.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderEvent
+from products.models import Product, ProductPriceHistory
+from shop.models import Shop
+from users.models import UserProfile
+
+BATCH_SIZE = 1000
+
+
+def _delete_in_batches(queryset, batch_size):
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        queryset.model._base_manager.filter(pk__in=ids).delete()
+
+
+def _delete_orders_in_batches(queryset, batch_size):
+    # Like _delete_in_batches, with the DELETED events for the order feeds
+    # (Order.delete writes them one order at a time)
+    while True:
+        with transaction.atomic():
+            orders = list(queryset.values_list('pk', 'status')[:batch_size])
+            if not orders:
+                return
+            OrderEvent.objects.bulk_create([
+                OrderEvent(order_id=pk, event_type=OrderEvent.DELETED, status=status) for pk, status in orders
+            ])
+            Order.objects.filter(pk__in=[pk for pk, _ in orders]).delete()
+
+
+def _hide_products_in_batches(queryset, batch_size):
+    # Soft-delete the products queryset still shows
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        Product.hide(Product.all_objects.filter(pk__in=ids))
+
+
+def purge_products(batch_size=BATCH_SIZE, **filters):
+    """
+    Remove the deleted products matching `filters`, with their cart items,
+    orders and price history. Returns the number of products removed.
+    """
+    products = Product.all_objects.filter(deleted_at__isnull=False, **filters)
+    purged = 0
+    while True:
+        ids = list(products.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        carts = list(Cart.objects.filter(items__product__in=ids).values_list('id', flat=True).distinct())
+        _delete_in_batches(CartItem.objects.filter(product__in=ids), batch_size)
+        # Totals of carts that held the products are now stale
+        Cart.recalculate(Cart.objects.filter(id__in=carts))
+        _delete_orders_in_batches(Order.objects.filter(product__in=ids), batch_size)
+        _delete_in_batches(ProductPriceHistory.objects.filter(product__in=ids), batch_size)
+        # Each deletion leaves a tombstone for catalog sync (products.signals)
+        Product.all_objects.filter(id__in=ids).delete()
+        purged += len(ids)
+
+
+def purge_shop(shop_id, batch_size=BATCH_SIZE):
+    """
+    Remove a deleted shop and its products.
+    """
+    if not Shop.all_objects.filter(pk=shop_id, deleted_at__isnull=False).exists():
+        return
+    _hide_products_in_batches(Product.objects.filter(shop_id=shop_id), batch_size)
+    purge_products(batch_size, shop_id=shop_id)
+    Shop.all_objects.filter(pk=shop_id).delete()
+    Shop.invalidate_storefront(shop_id)
+
+
+def purge_account(user_id, batch_size=BATCH_SIZE):
+    """
+    Remove a deleted account with its shop, products and orders.
+    """
+    if not UserProfile.all_objects.filter(user_id=user_id, deleted_at__isnull=False).exists():
+        return
+    for shop_id in list(Shop.all_objects.filter(owner_id=user_id).values_list('id', flat=True)):
+        Shop.all_objects.filter(pk=shop_id, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        purge_shop(shop_id, batch_size)
+    _hide_products_in_batches(Product.objects.filter(user_id=user_id), batch_size)
+    purge_products(batch_size, user_id=user_id)
+    _delete_orders_in_batches(Order.objects.filter(user_id=user_id), batch_size)
+    # What's left (profile, cart, tokens) is a handful of rows
+    User.objects.filter(pk=user_id).delete()
+
+
+def purge_deleted(batch_size=BATCH_SIZE):
+    """
+    Purge every deleted account, shop and product. Returns the number of
+    each purged.
+    """
+    accounts = list(UserProfile.all_objects.filter(deleted_at__isnull=False).values_list('user_id', flat=True))
+    for user_id in accounts:
+        purge_account(user_id, batch_size)
+    shops = list(Shop.all_objects.filter(deleted_at__isnull=False).values_list('id', flat=True))
+    for shop_id in shops:
+        purge_shop(shop_id, batch_size)
+    return len(accounts), len(shops), purge_products(batch_size)
@@ -0,0 +1,39 @@
+from rest_framework.utils import encoders
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it's installed. Values orjson
+    doesn't handle the same way as DRF (Decimal, datetimes, lazy strings...)
+    go through DRF's own encoder, so the output is the same JSON either way.
+    Indented output (e.g. ``Accept: application/json; indent=4``) and
+    installs without orjson fall back to the standard renderer.
+    """
+    default = encoders.JSONEncoder().default
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=self.default, option=self.options)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets views answer ``Accept: text/event-stream`` requests with a streaming
+    response. Anything else the view returns, such as errors, is sent as JSON.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
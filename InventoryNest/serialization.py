@@ -0,0 +1,146 @@
+"""
+Lean serialization for hot list endpoints.
+
+`ValuesExtractor` turns `.values()` rows into the same output a serializer
+would produce from model instances, without building the instances or running
+the serializer's per-object machinery. Each serializer field is resolved once,
+when the extractor is built:
+
+- model fields and `ReadOnlyField`s read their column from the row and go
+  through the DRF field's own `to_representation`, so formats match exactly
+  (datetimes use an equivalent that looks up the time zone once per call);
+- `PrimaryKeyRelatedField`s read the foreign key column as is;
+- other related fields (e.g. `StringRelatedField`) need a lookup in the
+  serializer's `lean_sources`, e.g. `{'user': 'user__username'}`.
+
+A serializer that adds keys in `to_representation` maps each of them to the
+columns it needs in `lean_extra` and adds them in a `lean_finish(row, data)`
+static method.
+
+An extractor can be limited to some of the output names (sparse fieldsets,
+see `requested_fields`); it then only selects the columns those names need.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+_extractors = {}
+_DATETIME = object()
+
+
+def _is_plain_datetime(field):
+    # Aware datetimes in ISO 8601, in the current time zone
+    return (isinstance(field, serializers.DateTimeField) and settings.USE_TZ
+            and not hasattr(field, 'timezone')
+            and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601)
+
+
+def _datetime_representation(tz):
+    """The same as DateTimeField.to_representation for aware values."""
+    def to_representation(value):
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return to_representation
+
+
+class ValuesExtractor:
+    def __init__(self, serializer_class, fields=None):
+        serializer = serializer_class()
+        sources = getattr(serializer_class, 'lean_sources', {})
+        extra = getattr(serializer_class, 'lean_extra', {})
+
+        # (output name, row key, converter or None)
+        self.plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in sources:
+                lookup, convert = sources[name], None
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+                lookup, convert = field.source, None
+            elif isinstance(field, (serializers.RelatedField, serializers.SerializerMethodField,
+                                    serializers.BaseSerializer)) or '.' in field.source:
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{name} needs an entry in lean_sources."
+                )
+            elif _is_plain_datetime(field):
+                lookup, convert = field.source, _DATETIME
+            else:
+                lookup, convert = field.source, field.to_representation
+            self.plan.append((name, lookup, convert))
+        # Every name the output can have, in output order
+        self.names = [name for name, _, _ in self.plan] + list(extra)
+
+        if fields is not None:
+            self.plan = [entry for entry in self.plan if entry[0] in fields]
+            self.dropped = [name for name in extra if name not in fields]
+            extra = {name: lookups for name, lookups in extra.items() if name in fields}
+        else:
+            self.dropped = []
+        # lean_finish adds the extra keys, so skip it when none of them is wanted
+        self.finish = getattr(serializer_class, 'lean_finish', None) if extra else None
+
+        lookups = [lookup for _, lookup, _ in self.plan]
+        for extra_lookups in extra.values():
+            lookups.extend(extra_lookups)
+        self.lookups = list(dict.fromkeys(lookups))
+
+    def __call__(self, rows):
+        # Look the time zone up once per call rather than once per value
+        to_datetime = _datetime_representation(timezone.get_current_timezone())
+        plan = [(name, key, to_datetime if convert is _DATETIME else convert) for name, key, convert in self.plan]
+        finish = self.finish
+        dropped = self.dropped if finish is not None else ()
+        results = []
+        for row in rows:
+            data = {}
+            for name, key, convert in plan:
+                value = row[key]
+                data[name] = value if value is None or convert is None else convert(value)
+            if finish is not None:
+                finish(row, data)
+                for name in dropped:
+                    data.pop(name, None)
+            results.append(data)
+        return results
+
+    def values(self, queryset):
+        """The queryset reduced to the columns the extractor reads."""
+        return queryset.values(*self.lookups)
+
+
+def extractor_for(serializer_class, fields=None):
+    """
+    Return the (cached) extractor of a serializer class, limited to `fields`
+    when given.
+    """
+    key = (serializer_class, fields and frozenset(fields))
+    extractor = _extractors.get(key)
+    if extractor is None:
+        extractor = _extractors[key] = ValuesExtractor(serializer_class, fields)
+    return extractor
+
+
+def requested_fields(request, serializer_class):
+    """
+    The output names picked with ``?fields=id,name`` or left over after
+    ``?exclude=description``, or None when neither is given. Raises
+    ValueError for names the serializer doesn't have.
+    """
+    fields = [name for name in request.query_params.get('fields', '').split(',') if name]
+    exclude = [name for name in request.query_params.get('exclude', '').split(',') if name]
+    if not fields and not exclude:
+        return None
+    if fields and exclude:
+        raise ValueError("Use either fields or exclude, not both.")
+
+    names = extractor_for(serializer_class).names
+    unknown = [name for name in fields + exclude if name not in names]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(names)}.")
+    fields = frozenset(fields or (name for name in names if name not in exclude))
+    if not fields:
+        raise ValueError("At least one field has to be left.")
+    return fields
@@ -50,15 +50,19 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
+    'InventoryNest',
     'users',
     'products',
     'orders',
     'cart',
     'corsheaders',
     'shop',
+    'throttling',
 ]
 
 MIDDLEWARE = [
+    'InventoryNest.middleware.MetricsMiddleware',
+    'InventoryNest.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -113,6 +117,28 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'InventoryNest.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'throttling.throttles.AnonThrottle',
+        'throttling.throttles.UserThrottle',
+    ),
+    # Token bucket rates: '60/min' allows bursts of 60 and refills one per second
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '120/min',
+        'user': '600/min',
+        'ip': '300/min',
+        'products': '60/min',
+        'signup': '10/hour',
+        'login': '30/min',
+        'login_identifier': '10/hour',
+        'otp_identifier': '10/hour',
+    },
+    # Proxies in front of the app that append to X-Forwarded-For. With 0, clients
+    # are identified by REMOTE_ADDR and a forged X-Forwarded-For is ignored.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
 
 SIMPLE_JWT = {
@@ -157,13 +183,23 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (shop logos and covers). Stored names never change content,
+# so they are served with a far-future, immutable Cache-Control header.
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Let Django serve MEDIA_ROOT itself; in production leave this off and have the
+# web server serve it with the same Cache-Control header
+SERVE_MEDIA = DEBUG
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Email settings for Gmail SMTP
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = 'InventoryNest.metrics.SMTPEmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -171,3 +207,112 @@ EMAIL_USE_TLS = True
 # Gmail credentials (use environment variables for security)
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
+
+# An order event stream is closed after this many seconds, since each open
+# stream holds a worker and a database connection; clients reconnect
+ORDER_EVENT_STREAM_SECONDS = 60
+
+# Responses to requests sent with an Idempotency-Key header are kept this long,
+# and a retry waits up to IDEMPOTENCY_WAIT_SECONDS for the first attempt to finish.
+# An attempt that hasn't finished after IDEMPOTENCY_LOCK_TIMEOUT is taken for
+# dead and a retry runs the request again
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+IDEMPOTENCY_WAIT_SECONDS = 10
+IDEMPOTENCY_LOCK_TIMEOUT = timedelta(minutes=1)
+
+# Checkout admission control, per product and per worker process: how many
+# checkouts may run at once, how many may queue behind them, and how long a
+# queued checkout waits (in seconds) before it is turned away with a 429
+CHECKOUT_MAX_IN_FLIGHT_PER_PRODUCT = 4
+CHECKOUT_MAX_QUEUED_PER_PRODUCT = 64
+CHECKOUT_QUEUE_TIMEOUT = 5
+
+# Storefront pages are cached until the shop's catalog changes; stock shown may
+# lag behind checkouts by up to the timeout (seconds)
+STOREFRONT_PAGE_SIZE = 20
+STOREFRONT_CACHE_TIMEOUT = 60
+
+# Response compression. Codings in order of preference with their level; br
+# and zstd are only used when the brotli and zstandard packages are installed.
+# Smaller bodies (bytes) and content types that are already compressed (a
+# trailing slash matches the whole type) are sent as they are.
+COMPRESSION_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_SKIP_CONTENT_TYPES = (
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/avif', 'video/', 'audio/',
+    'font/woff', 'font/woff2', 'application/zip', 'application/gzip', 'application/x-gzip',
+    'application/zstd', 'application/pdf',
+)
+
+# Upper bounds of the price buckets counted by ?facets=true on the product
+# list (the last bucket is open ended), and how long counts are cached (seconds)
+PRODUCT_PRICE_BUCKETS = (10, 25, 50, 100, 250, 500)
+PRODUCT_FACETS_CACHE_TIMEOUT = 60
+
+# Popularity ranks products by their orders over this many days, recounted by
+# refresh_popularity. The top sellers list is cached until the next refresh,
+# or at most the timeout (seconds), which also bounds how stale it shows prices
+PRODUCT_POPULARITY_WINDOW_DAYS = 30
+PRODUCT_TOP_SELLERS_MAX = 100
+PRODUCT_TOP_SELLERS_CACHE_TIMEOUT = 300
+
+# The me/ response is cached per user, and dropped when the profile or shop changes
+ME_CACHE_TIMEOUT = 300
+
+# Deleted products are reported by /products/sync/ for this long, see
+# purge_product_tombstones; older sync tokens are refused
+PRODUCT_SYNC_RETENTION_DAYS = 30
+
+# Cache lookups are counted for /metrics by the instrumented backends. Set
+# REDIS_URL to share the cache between server processes; the in-memory
+# fallback is per process, so entries changed in one aren't seen by the others
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'InventoryNest.metrics.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'InventoryNest.metrics.LocMemCache',
+            'LOCATION': 'default',
+        },
+    }
+
+# Send as a bearer token to read /metrics; while unset, /metrics is closed
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# A sample of requests slower than the threshold (seconds) is logged with its SQL
+SLOW_REQUEST_THRESHOLD = 0.5
+SLOW_REQUEST_SAMPLE_RATE = 0.1
+SLOW_REQUEST_LOGGED_STATEMENTS = 20
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{asctime} {levelname} {name}: {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.getenv('LOG_LEVEL', 'INFO'),
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
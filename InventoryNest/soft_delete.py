@@ -0,0 +1,18 @@
+"""
+Soft deletion of shops, products and accounts.
+
+Deleting one only stamps its `deleted_at`, a single-row UPDATE however much
+depends on it. The default `objects` manager hides stamped rows, so they drop
+out of the API at once, while `all_objects` still sees them. The rows and
+everything depending on them are removed later, a batch at a time, by
+InventoryNest.purge.
+
+Related objects reached through a foreign key (e.g. an order's product) use
+the base manager, so they still load while the purge is pending.
+"""
+from django.db import models
+
+
+class SoftDeleteManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
@@ -0,0 +1,29 @@
+"""
+A small in-process background queue for work that shouldn't hold up a request,
+such as sending notification emails.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='background')
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", func.__name__)
+    finally:
+        # Tasks run outside the request cycle, so they close their own connections
+        connections.close_all()
+
+
+def enqueue(func, *args, **kwargs):
+    """
+    Run ``func`` in a background thread once the current transaction commits.
+    """
+    transaction.on_commit(lambda: _executor.submit(_run, func, args, kwargs))
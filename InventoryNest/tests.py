@@ -0,0 +1,210 @@
+import gzip
+import os
+import unittest
+import zlib
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core import checks
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from orders.models import Order
+from orders.serializers import OrderSerializer
+from orders.tests import create_product
+from products.models import Product
+from products.serializers import ProductsSerializer
+from . import compression
+from .middleware import CompressionMiddleware
+from .renderers import FastJSONRenderer
+from .serialization import extractor_for
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_registered_as_a_deploy_check(self):
+        from .checks import check_shared_cache
+
+        self.assertIn(check_shared_cache, checks.registry.registry.get_checks(include_deployment_checks=True))
+        self.assertNotIn(check_shared_cache, checks.registry.registry.get_checks())
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_is_an_error(self):
+        errors = checks.run_checks(tags=[checks.Tags.caches], include_deployment_checks=True)
+        self.assertEqual([error.id for error in errors], ['InventoryNest.E001'])
+
+
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(METRICS_TOKEN=None)
+    def test_closed_without_a_token(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_the_bearer_token(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_request_duration_seconds', response.content.decode())
+
+
+class ValuesExtractorTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        lamp = create_product(seller, price=Decimal('19.99'), stock=10, name='Lamp')
+        rug = create_product(seller, price=Decimal('1250.50'), stock=10, name='Rug')
+        Order.objects.create(user=buyer, product=lamp, quantity=3)
+        Order.objects.create(guest_email='guest@example.com', product=rug, quantity=1)
+
+    def assertSameOutput(self, serializer_class, queryset, fields=None):
+        extractor = extractor_for(serializer_class, fields)
+        lean = extractor(extractor.values(queryset))
+        full = [dict(row) for row in serializer_class(queryset, many=True).data]
+        if fields is not None:
+            full = [{name: value for name, value in row.items() if name in fields} for row in full]
+        self.assertEqual(lean, full)
+        # Rendered byte for byte the same, Decimals and datetimes included
+        renderer = FastJSONRenderer()
+        self.assertEqual(renderer.render(lean), renderer.render(full))
+
+    def test_products_match_the_serializer(self):
+        self.assertSameOutput(ProductsSerializer, Product.objects.order_by('id'))
+
+    def test_orders_match_the_serializer(self):
+        self.assertSameOutput(OrderSerializer, Order.objects.order_by('id'))
+
+    def test_datetimes_follow_the_current_time_zone(self):
+        with timezone.override('Asia/Kolkata'):
+            self.assertSameOutput(ProductsSerializer, Product.objects.order_by('id'))
+            self.assertSameOutput(OrderSerializer, Order.objects.order_by('id'))
+
+    def test_sparse_fields_match_the_serializer(self):
+        self.assertSameOutput(ProductsSerializer, Product.objects.order_by('id'), frozenset({'id', 'price', 'user'}))
+        self.assertSameOutput(OrderSerializer, Order.objects.order_by('id'),
+                              frozenset({'id', 'created_at', 'product_details'}))
+        self.assertSameOutput(OrderSerializer, Order.objects.order_by('id'), frozenset({'total_price'}))
+
+
+class ChooseCodecTests(SimpleTestCase):
+    def setUp(self):
+        # Only the names and their order matter here
+        self.codecs = {name: SimpleNamespace(name=name) for name in ('zstd', 'br', 'gzip')}
+
+    def choose(self, header):
+        codec = compression.choose_codec(header, self.codecs)
+        return codec and codec.name
+
+    def test_highest_q_value_wins(self):
+        self.assertEqual(self.choose('gzip;q=0.5, br;q=0.8'), 'br')
+        self.assertEqual(self.choose('zstd;q=0.1, gzip'), 'gzip')
+
+    def test_ties_go_to_the_server_order(self):
+        self.assertEqual(self.choose('gzip, br'), 'br')
+        self.assertEqual(self.choose('gzip, br, zstd'), 'zstd')
+
+    def test_wildcard_and_refusals(self):
+        self.assertEqual(self.choose('*'), 'zstd')
+        self.assertEqual(self.choose('zstd;q=0, *;q=0.5'), 'br')
+        self.assertEqual(self.choose('GZIP;Q=0.3, br;q=oops'), 'gzip')
+        self.assertIsNone(self.choose('gzip;q=0'))
+        self.assertIsNone(self.choose('identity'))
+        self.assertIsNone(self.choose(''))
+
+
+@override_settings(COMPRESSION_LEVELS={'gzip': 6}, COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"name": "Lamp", "price": "10.00"}' * 20
+
+    def respond(self, response, accept_encoding='gzip'):
+        request = RequestFactory().get('/', headers={'Accept-Encoding': accept_encoding})
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_compresses_the_body(self):
+        response = self.respond(HttpResponse(self.body, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_not_accepted(self):
+        response = self.respond(HttpResponse(self.body, content_type='application/json'), 'identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        # Another client could still get a compressed body
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, self.body)
+
+    def test_skips_small_and_already_compressed_bodies(self):
+        for response in (
+            HttpResponse(self.body[:99], content_type='application/json'),
+            HttpResponse(self.body, content_type='image/png'),
+            HttpResponse(self.body, content_type='video/mp4'),
+            HttpResponse(self.body, content_type='application/json', headers={'Content-Encoding': 'br'}),
+            HttpResponse(self.body, content_type='application/json', headers={'Cache-Control': 'no-transform'}),
+        ):
+            with self.subTest(content_type=response['Content-Type']):
+                content = response.content
+                response = self.respond(response)
+                self.assertNotEqual(response.get('Content-Encoding'), 'gzip')
+                self.assertFalse(response.has_header('Vary'))
+                self.assertEqual(response.content, content)
+
+    def test_keeps_bodies_that_do_not_shrink(self):
+        body = os.urandom(500)
+        response = self.respond(HttpResponse(body, content_type='application/octet-stream'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, body)
+
+    def test_weakens_strong_etags(self):
+        response = self.respond(HttpResponse(self.body, content_type='application/json', headers={'ETag': '"v1"'}))
+        self.assertEqual(response['ETag'], 'W/"v1"')
+        response = self.respond(HttpResponse(self.body, content_type='application/json', headers={'ETag': 'W/"v1"'}))
+        self.assertEqual(response['ETag'], 'W/"v1"')
+
+    def test_streamed_body(self):
+        chunks = [self.body[:300], self.body[300:]]
+        response = self.respond(StreamingHttpResponse(iter(chunks), content_type='text/csv'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+
+    def test_server_sent_events_are_flushed_one_by_one(self):
+        events = [f'data: {{"sequence": {n}}}\n\n'.encode() for n in range(3)]
+        response = self.respond(StreamingHttpResponse(iter(events), content_type='text/event-stream'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        # Every event can be decoded as soon as its chunk arrives
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        stream = iter(response.streaming_content)
+        for event in events:
+            self.assertEqual(decompressor.decompress(next(stream)), event)
+        decompressor.decompress(b''.join(stream))
+        self.assertTrue(decompressor.eof)
+
+
+class CodecTests(SimpleTestCase):
+    body = b'data: {"sequence": 1}\n\n' * 50
+
+    def round_trip(self, codec, decompress):
+        self.assertEqual(decompress(codec.compress(self.body)), self.body)
+        for flush in (False, True):
+            compress_chunk, finish = codec.stream(flush)
+            self.assertEqual(decompress(compress_chunk(self.body[:500]) + compress_chunk(self.body[500:]) + finish()),
+                             self.body)
+
+    def test_gzip(self):
+        self.round_trip(compression.GzipCodec(6), gzip.decompress)
+
+    @unittest.skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        self.round_trip(compression.BrotliCodec(4), compression.brotli.decompress)
+
+    @unittest.skipIf(compression.zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        def decompress(data):
+            return compression.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        self.round_trip(compression.ZstdCodec(3), decompress)
@@ -14,14 +14,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from .metrics import metrics
+from .views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('', include('users.urls')),
     path('', include('products.urls')),
     path('', include('orders.urls')),
     path('', include('cart.urls')),
     path('', include('shop.urls')),
 ]
+
+if settings.SERVE_MEDIA:
+    urlpatterns.append(re_path(r'^media/(?P<path>.*)$', serve_media))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+
+def serve_media(request, path):
+    """
+    Serve an uploaded file for development. Uploads are never overwritten in
+    place, so clients may cache them for good.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if response.status_code == 200:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE, immutable=True)
+    return response
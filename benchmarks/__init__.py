@@ -0,0 +1,61 @@
+"""
+Benchmarks for InventoryNest. Run them from the repository root, e.g.
+
+    python -m benchmarks.list_orders --orders 1000000
+
+Each benchmark runs against a throwaway test database created from the
+configured DATABASES settings, so it never touches real data.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'InventoryNest.settings')
+    import django
+    from django.test.utils import setup_test_environment
+    django.setup()
+    # As under manage.py test: the test client's 'testserver' host is allowed
+    # and emails go to the in-memory outbox
+    setup_test_environment()
+
+
+@contextmanager
+def test_database(keepdb=False):
+    """
+    Create the test database for the duration of the benchmark.
+    """
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def timed(func, repeat=5):
+    """
+    Run ``func`` several times and return the best wall time in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def count_queries(func):
+    """
+    Run ``func`` once and return the number of SQL queries it made.
+    """
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return len(queries)
@@ -0,0 +1,123 @@
+"""
+Flash-sale load test for checkout.
+
+Many guest buyers put the same product in their cart and check out at the
+same moment. The run reports the latency percentiles, how the requests were
+answered, and checks that every buyer admitted to checkout got an order
+until the stock ran out, with no units oversold. It exits non-zero otherwise.
+
+    python -m benchmarks.checkout_load --buyers 500 --stock 200
+
+Use PostgreSQL for meaningful numbers; SQLite serializes every write.
+"""
+import argparse
+import logging
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import setup_django, test_database
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buyers', type=int, default=500, help="Concurrent buyers.")
+    parser.add_argument('--stock', type=int, default=200, help="Units of the product on sale.")
+    parser.add_argument('--quantity', type=int, default=1, help="Units each buyer orders.")
+    parser.add_argument('--workers', type=int, default=64,
+                        help="Requests served at once, like the threads of an app server.")
+    parser.add_argument('--no-admission', action='store_true',
+                        help="Disable admission control to compare against.")
+    args = parser.parse_args()
+
+    setup_django()
+    # Sold-out buyers get a 400 each, which Django would log one by one
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    from django.contrib.auth.models import User
+    from django.db import connections
+    from django.test import Client
+    from orders.admission import checkout_admission
+    from orders.models import Order
+    from products.models import Product
+
+    if args.no_admission:
+        checkout_admission.max_in_flight = args.buyers
+
+    with test_database():
+        seller = User.objects.create_user('seller', 'seller@example.com', 'seller')
+        product = Product.objects.create(name="Flash sale item", description="", price=10,
+                                         stock=args.stock, user=seller)
+
+        # Every buyer fills a cart first, the rush starts at checkout
+        # Each buyer has their own address, as in a real rush, so per-IP throttles don't kick in
+        buyers = [Client(REMOTE_ADDR=f'10.0.{i >> 8 & 255}.{i & 255}') for i in range(args.buyers)]
+        for client in buyers:
+            client.post('/cart/add/', {'product': product.id, 'quantity': args.quantity},
+                        content_type='application/json')
+
+        latencies = []
+        statuses = Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(min(args.workers, args.buyers))
+
+        def checkout(index):
+            if index < start.parties:
+                start.wait()
+            started = time.perf_counter()
+            response = buyers[index].post('/orders/create/', {'email': f"buyer{index}@example.com"},
+                                          content_type='application/json')
+            elapsed = time.perf_counter() - started
+            connections.close_all()
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(checkout, range(args.buyers)))
+        wall = time.perf_counter() - started
+
+        product.refresh_from_db()
+        orders = Order.objects.filter(product=product).count()
+        sold = orders * args.quantity
+
+        print(f"admission control: {'off' if args.no_admission else 'on'}, "
+              f"{args.buyers} buyers, {args.workers} workers, {args.stock} in stock")
+        print(f"responses: {dict(sorted(statuses.items()))}")
+        print(f"latency ms: p50 {percentile(latencies, 50) * 1000:.1f}, "
+              f"p95 {percentile(latencies, 95) * 1000:.1f}, p99 {percentile(latencies, 99) * 1000:.1f}, "
+              f"mean {statistics.mean(latencies) * 1000:.1f}")
+        print(f"throughput: {args.buyers / wall:.0f} checkouts/s over {wall:.2f}s")
+        print(f"sold {sold}, stock left {product.stock}")
+
+        # Every buyer that got past admission control either bought or found the product sold out
+        problems = []
+        unexpected = {status: count for status, count in statuses.items() if status not in (201, 400, 429)}
+        if unexpected:
+            problems.append(f"unexpected responses {unexpected}")
+        if statuses[201] != orders:
+            problems.append(f"{statuses[201]} checkouts succeeded but {orders} orders exist")
+        admitted = args.buyers - statuses[429]
+        expected_sold = min(args.stock // args.quantity, admitted) * args.quantity
+        if sold != expected_sold:
+            problems.append(f"sold {sold}, expected {expected_sold}")
+        if product.stock != args.stock - sold:
+            problems.append(f"stock left {product.stock}, expected {args.stock - sold}")
+        if args.no_admission and statuses[429]:
+            problems.append("admission control is off but buyers got 429")
+
+    if problems:
+        print("FAILED: " + "; ".join(problems))
+        sys.exit(1)
+    print("OK")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Bytes on the wire and CPU time of response compression per response size.
+
+Renders product list pages of growing size as the API does, then compresses
+each with every installed codec (gzip always, br and zstd when brotli and
+zstandard are installed) at a few levels, whole and as a stream of one
+NDJSON line per product.
+
+    python -m benchmarks.compression --rows 10 100 1000 10000
+"""
+import argparse
+
+from benchmarks import setup_django, test_database, timed
+
+LEVELS = {'gzip': [1, 6, 9], 'br': [1, 4, 6, 11], 'zstd': [1, 3, 9, 19]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help="Products per response.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from InventoryNest.compression import CODECS
+    from InventoryNest.renderers import FastJSONRenderer
+    from InventoryNest.serialization import extractor_for
+    from products.models import Product
+    from products.serializers import ProductsSerializer
+
+    renderer = FastJSONRenderer()
+    extractor = extractor_for(ProductsSerializer)
+    with test_database():
+        call_command('seed_data', users=200, shops=20, products=max(args.rows), carts=0, orders=0,
+                     seed=args.seed, verbosity=0)
+        products = extractor(extractor.values(Product.objects.order_by('id')))
+
+    print(f"installed codecs: {', '.join(CODECS)}")
+    print(f"{'rows':>6} {'bytes':>9} {'coding':>7} {'level':>5} {'wire bytes':>11} {'ratio':>6} "
+          f"{'ms':>8} {'MB/s':>7} {'stream bytes':>13} {'flushed':>9}")
+    for rows in args.rows:
+        body = renderer.render({'count': rows, 'results': products[:rows]})
+        lines = [renderer.render(product) + b'\n' for product in products[:rows]]
+        for name, codec_class in CODECS.items():
+            for level in LEVELS[name]:
+                codec = codec_class(level)
+                compressed = codec.compress(body)
+                seconds = timed(lambda: codec.compress(body), args.repeat)
+                streamed = [
+                    sum(len(chunk) for chunk in stream(codec, lines, flush)) for flush in (False, True)
+                ]
+                print(f"{rows:>6} {len(body):>9} {name:>7} {level:>5} {len(compressed):>11} "
+                      f"{len(body) / len(compressed):>6.1f} {seconds * 1000:>8.3f} "
+                      f"{len(body) / seconds / 1e6:>7.0f} {streamed[0]:>13} {streamed[1]:>9}")
+
+
+def stream(codec, chunks, flush):
+    compress_chunk, finish = codec.stream(flush)
+    for chunk in chunks:
+        yield compress_chunk(chunk)
+    yield finish()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare list_orders serialization with and without the product join.
+
+"before" reproduces the old OrderSerializer, which read the product of every
+order for the total price and product details. "after" is the current
+serializer, which only reads the snapshot columns stored on the order.
+
+    python -m benchmarks.list_orders --orders 1000000 --rows 1000
+"""
+import argparse
+import random
+from decimal import Decimal
+
+from benchmarks import count_queries, setup_django, test_database, timed
+
+
+def seed(orders, products, batch_size):
+    from django.contrib.auth.models import User
+    from orders.models import Order
+    from products.models import Product
+
+    user = User.objects.create_user('bench', 'bench@example.com', 'bench')
+    Product.objects.bulk_create(
+        [Product(name=f"Product {i}", description="", price=Decimal(random.randint(100, 10000)) / 100,
+                 stock=1000, user=user) for i in range(products)],
+        batch_size=batch_size,
+    )
+    product_prices = list(Product.objects.values_list('id', 'name', 'price'))
+
+    for start in range(0, orders, batch_size):
+        batch = []
+        for _ in range(min(batch_size, orders - start)):
+            product_id, name, price = random.choice(product_prices)
+            quantity = random.randint(1, 5)
+            # bulk_create skips Order.save, so no stock is deducted
+            batch.append(Order(user=user, product_id=product_id, quantity=quantity, product_name=name,
+                               unit_price=price, total_price=price * quantity))
+        Order.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=1000000, help="Orders in the table.")
+    parser.add_argument('--products', type=int, default=10000, help="Products the orders refer to.")
+    parser.add_argument('--rows', type=int, default=1000, help="Orders serialized per run.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework import serializers
+    from orders.models import Order
+    from orders.serializers import OrderSerializer
+
+    class LegacyOrderSerializer(OrderSerializer):
+        total_price = serializers.SerializerMethodField()
+
+        def get_total_price(self, obj):
+            return obj.product.price * obj.quantity
+
+        def to_representation(self, instance):
+            representation = super(OrderSerializer, self).to_representation(instance)
+            product = instance.product
+            representation['product_details'] = {
+                'name': product.name,
+                'price': product.price,
+                'stock': product.stock,
+            }
+            return representation
+
+    cases = {
+        'before': lambda: LegacyOrderSerializer(Order.objects.all()[:args.rows], many=True).data,
+        'after': lambda: OrderSerializer(Order.objects.select_related('user')[:args.rows], many=True).data,
+    }
+
+    random.seed(args.seed)
+    with test_database():
+        print(f"Seeding {args.orders} orders over {args.products} products...")
+        seed(args.orders, args.products, args.batch_size)
+
+        for name, run in cases.items():
+            queries = count_queries(run)
+            seconds = timed(run, args.repeat)
+            print(f"{name:>6}: {seconds * 1000:8.1f} ms for {args.rows} orders, "
+                  f"{args.rows / seconds:9.0f} orders/s, {queries} queries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Product list filters and facet counts on a large catalog.
+
+Seeds the catalog with the seed_data command, then requests the product list
+through the full request stack with each filter on its own and combined,
+with and without facet counts. Facet counts are cached, so they are timed
+both right after the cache is cleared and from the cache. On PostgreSQL the
+plan of each page query is printed too, to check it uses an index.
+
+    python -m benchmarks.product_filters --products 1000000
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--shops', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=20, help="Timed requests per case.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--explain', action='store_true', help="Print the plan of each page query (PostgreSQL).")
+    args = parser.parse_args()
+
+    setup_django()
+    import logging
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from products.models import Product
+
+    # Unfiltered counts over the whole catalog are slow on purpose here, keep them out of the log
+    logging.getLogger('InventoryNest.slow_requests').setLevel(logging.ERROR)
+
+    with test_database():
+        started = time.perf_counter()
+        call_command('seed_data', users=args.shops, shops=args.shops, products=args.products, carts=0, orders=0,
+                     seed=args.seed, verbosity=0)
+        print(f"Seeded {args.products} products in {time.perf_counter() - started:.1f}s")
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        shop = Product.objects.values_list('shop_id', flat=True).first()
+        month_ago = (timezone.now() - timezone.timedelta(days=30)).date().isoformat()
+        cases = {
+            'no filters': {},
+            'price 20-50': {'min_price': 20, 'max_price': 50},
+            'in stock': {'in_stock': 'true'},
+            'shop': {'shop': shop},
+            'last 30 days': {'created_since': month_ago},
+            'combined': {'min_price': 20, 'max_price': 50, 'in_stock': 'true', 'shop': shop},
+            'price 20-50, by price': {'min_price': 20, 'max_price': 50, 'ordering': 'price'},
+            'shop, by -price': {'shop': shop, 'ordering': '-price'},
+        }
+
+        client = Client()
+        print(f"{'case':<24}{'facets':>8}{'p50 ms':>10}{'max ms':>10}{'queries':>9}{'count':>9}")
+        for name, params in cases.items():
+            for facets in ('', 'cold', 'cached'):
+                query = dict(params, fields='id,name,price,stock')
+                if facets:
+                    query['facets'] = 'true'
+                latencies = []
+                for i in range(args.requests):
+                    if facets == 'cold':
+                        cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        # A new client address every request, so the rate limits don't kick in
+                        response = client.get('/products/', query, REMOTE_ADDR=f'10.3.{i >> 8 & 255}.{i & 255}')
+                        latencies.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.content
+                print(f"{name:<24}{facets or '-':>8}{statistics.median(latencies) * 1000:>10.1f}"
+                      f"{max(latencies) * 1000:>10.1f}{len(queries):>9}{response.data['count']:>9}")
+            if args.explain and connection.vendor == 'postgresql':
+                page = [q['sql'] for q in queries.captured_queries if 'LIMIT' in q['sql']][-1]
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN ' + page)
+                    print('    ' + '\n    '.join(row[0] for row in cursor.fetchall()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare serializing list pages with DRF serializers against the lean values()
+path, and rendering them with the standard JSONRenderer against orjson.
+
+"serializer" builds model instances and runs ProductsSerializer/OrderSerializer
+on them; "lean" reads the same rows with .values() through the extractor used
+by the list endpoints. Both produce the same data, which is checked before
+timing. Rendering is timed on the same serialized page.
+
+    python -m benchmarks.serialization --products 100000 --orders 100000 --rows 1000
+"""
+import argparse
+import json
+
+from benchmarks import setup_django, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--rows', type=int, default=1000, help="Objects serialized per run.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from rest_framework.renderers import JSONRenderer
+    from InventoryNest.renderers import FastJSONRenderer, orjson
+    from InventoryNest.serialization import extractor_for
+    from orders.models import Order
+    from orders.serializers import OrderSerializer
+    from products.models import Product
+    from products.serializers import ProductsSerializer
+
+    cases = [
+        ('products', ProductsSerializer, Product.objects.order_by('created_at', 'id'), 'user'),
+        ('orders', OrderSerializer, Order.objects.order_by('id'), 'user'),
+    ]
+
+    with test_database():
+        call_command('seed_data', users=args.users, shops=max(1, args.users // 10), products=args.products,
+                     carts=0, orders=args.orders, seed=args.seed, verbosity=0)
+
+        for label, serializer_class, queryset, related in cases:
+            extractor = extractor_for(serializer_class)
+            page = queryset[:args.rows]
+
+            def serializer():
+                return serializer_class(page.select_related(related), many=True).data
+
+            def lean():
+                return extractor(extractor.values(page))
+
+            # Both paths have to produce the same JSON
+            standard = JSONRenderer().render(serializer())
+            assert json.loads(standard) == json.loads(JSONRenderer().render(lean())), label
+
+            for name, run in (('serializer', serializer), ('lean', lean)):
+                seconds = timed(run, args.repeat)
+                print(f"{label:>8} {name:>10}: {seconds * 1000:8.1f} ms for {args.rows} rows, "
+                      f"{args.rows / seconds:9.0f} objects/s")
+
+            data = lean()
+            assert json.loads(FastJSONRenderer().render(data)) == json.loads(standard), label
+            renderers = [('json', JSONRenderer())]
+            if orjson:
+                renderers.append(('orjson', FastJSONRenderer()))
+            for name, renderer in renderers:
+                seconds = timed(lambda: renderer.render(data), args.repeat)
+                print(f"{label:>8} {name:>10}: {seconds * 1000:8.1f} ms to render, "
+                      f"{args.rows / seconds:9.0f} objects/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""
+End-to-end API benchmark suite.
+
+Seeds a throwaway database with users, shops, products, carts and orders
+using the seed_data command, then drives the real endpoints through the Django
+test client (the full middleware, authentication and throttling stack) and
+records throughput, latency percentiles and SQL queries per request for each
+scenario.
+
+    python -m benchmarks.suite --scale small --output baseline.json
+    python -m benchmarks.suite --scale small --compare baseline.json
+
+The run fails (exit status 1) when a scenario gets a response other than
+2xx, since it would only be timing error pages. With --compare it also fails
+when a scenario got slower or makes more queries than in the baseline. Compare runs made at the same scale,
+on the same machine and database.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import django
+
+from benchmarks import setup_django, test_database
+
+SCALES = {
+    'small': {'users': 200, 'shops': 20, 'products': 2000, 'carts': 100, 'orders': 2000},
+    'medium': {'users': 2000, 'shops': 200, 'products': 50000, 'carts': 1000, 'orders': 20000},
+    'large': {'users': 20000, 'shops': 2000, 'products': 500000, 'carts': 10000, 'orders': 100000},
+}
+
+
+def seed(counts, batch_size, random_seed):
+    from django.core.management import call_command
+    from django.contrib.auth.models import User
+    from products.models import Product
+
+    call_command('seed_data', seed=random_seed, batch_size=batch_size, verbosity=0, **counts)
+    # Keep checkouts from running out of stock halfway through the run
+    Product.objects.update(stock=1000000)
+    return (list(User.objects.order_by('id').values_list('id', flat=True)),
+            list(Product.objects.order_by('id').values_list('id', flat=True)))
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def scenarios(user_ids, product_ids):
+    """
+    Return the scenarios as name -> (prepare, request). `prepare(i)` runs
+    untimed before request `i`, `request(i)` makes the timed request.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    users = User.objects.in_bulk(user_ids)
+    clients = [
+        Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(users[user_id]).access_token}',
+               REMOTE_ADDR=f'10.1.{n >> 8 & 255}.{n & 255}')
+        for n, user_id in enumerate(user_ids)
+    ]
+    anonymous = Client()
+
+    # Popular products are requested far more often than the long tail
+    weights = [1 / rank for rank in range(1, len(product_ids) + 1)]
+    popular = random.choices(product_ids, weights=weights, k=10000)
+    pages = max(1, len(product_ids) // 10)
+
+    def user_client(i):
+        return clients[i % len(clients)]
+
+    def anonymous_ip(i):
+        # A different client address per request, so per-IP throttles don't kick in
+        return f'10.2.{i >> 8 & 255}.{i & 255}'
+
+    def fill_cart(i):
+        user_client(i).post('/cart/add/', {'product': popular[i % len(popular)], 'quantity': 1},
+                            content_type='application/json')
+
+    return {
+        'list_products': (None, lambda i: anonymous.get(
+            '/products/', {'page': random.randint(1, pages)}, REMOTE_ADDR=anonymous_ip(i))),
+        'get_product': (None, lambda i: user_client(i).get(f'/products/{popular[i % len(popular)]}/')),
+        'add_to_cart': (None, lambda i: user_client(i).post(
+            '/cart/add/', {'product': popular[i % len(popular)], 'quantity': 1},
+            content_type='application/json')),
+        'view_cart': (None, lambda i: user_client(i).get('/cart/')),
+        'process_order': (fill_cart, lambda i: user_client(i).post(
+            '/orders/create/', {}, content_type='application/json')),
+        'list_orders': (None, lambda i: user_client(i).get('/orders/')),
+    }
+
+
+def run_scenario(prepare, request, requests, warmup):
+    from django.db import connection
+
+    latencies = []
+    queries = []
+    errors = {}
+    for i in range(warmup + requests):
+        if prepare:
+            prepare(i)
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            response = request(i)
+            elapsed = time.perf_counter() - started
+        if not 200 <= response.status_code < 300:
+            errors[response.status_code] = errors.get(response.status_code, 0) + 1
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        queries.append(counter.count)
+
+    latencies.sort()
+
+    def percentile(pct):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))] * 1000, 3)
+
+    return {
+        'requests': requests,
+        # Responses other than 2xx by status, warmup included
+        'errors': sum(errors.values()),
+        'error_statuses': {str(code): count for code, count in sorted(errors.items())},
+        'throughput_rps': round(requests / sum(latencies), 1),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'queries_mean': round(statistics.mean(queries), 2),
+        'queries_max': max(queries),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print each scenario against the baseline and return the regressions found.
+    Latency may grow by `tolerance` before it counts; query counts may not grow at all.
+    """
+    regressions = []
+    print(f"{'scenario':<16}{'p50 ms was/now':>18}{'p95 ms was/now':>18}{'p99 ms was/now':>18}"
+          f"{'queries was/now':>16}")
+    for name, current in results['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            print(f"{name:<16} (not in baseline)")
+            continue
+        flags = []
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if current[metric] > before[metric] * (1 + tolerance):
+                flags.append(f"{metric} {before[metric]} -> {current[metric]}")
+        if current['queries_mean'] > before['queries_mean']:
+            flags.append(f"queries {before['queries_mean']} -> {current['queries_mean']}")
+        if current['errors'] > before['errors']:
+            flags.append(f"errors {before['errors']} -> {current['errors']}")
+
+        cells = ''.join(f"{before[m]:>9.1f}{current[m]:>9.1f}" for m in ('p50_ms', 'p95_ms', 'p99_ms'))
+        print(f"{name:<16}{cells}{before['queries_mean']:>8.1f}{current['queries_mean']:>8.1f}"
+              f"  {'REGRESSION' if flags else 'ok'}")
+        regressions.extend(f"{name}: {flag}" for flag in flags)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for kind in SCALES['small']:
+        parser.add_argument(f'--{kind}', type=int, help=f"Override the number of {kind} of the scale.")
+    parser.add_argument('--scenario', action='append', help="Only run this scenario (repeatable).")
+    parser.add_argument('--requests', type=int, default=200, help="Timed requests per scenario.")
+    parser.add_argument('--warmup', type=int, default=10, help="Untimed requests before each scenario.")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    parser.add_argument('--compare', metavar='BASELINE', help="Compare against a saved results file.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed latency growth over the baseline, as a fraction (default 0.25).")
+    args = parser.parse_args()
+
+    counts = dict(SCALES[args.scale])
+    for kind in counts:
+        if getattr(args, kind) is not None:
+            counts[kind] = getattr(args, kind)
+
+    setup_django()
+    from django.db import connection
+
+    random.seed(args.seed)
+    with test_database():
+        started = time.perf_counter()
+        user_ids, product_ids = seed(counts, args.batch_size, args.seed)
+        print(f"Seeded {counts} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        results = {
+            'meta': {
+                'scale': args.scale,
+                'counts': counts,
+                'requests': args.requests,
+                'seed': args.seed,
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            },
+            'scenarios': {},
+        }
+        for name, (prepare, request) in scenarios(user_ids, product_ids).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            results['scenarios'][name] = result = run_scenario(prepare, request, args.requests, args.warmup)
+            print(f"{name:<16} {result['throughput_rps']:8.1f} req/s  p50 {result['p50_ms']:8.2f}  "
+                  f"p95 {result['p95_ms']:8.2f}  p99 {result['p99_ms']:8.2f} ms  "
+                  f"{result['queries_mean']:6.1f} queries  {result['errors']} errors", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif not args.compare:
+        print(json.dumps(results, indent=2))
+
+    failed = {name: result['error_statuses'] for name, result in results['scenarios'].items() if result['errors']}
+    if failed:
+        print("\nScenarios with non-2xx responses (status: count):\n  "
+              + "\n  ".join(f"{name}: {statuses}" for name, statuses in failed.items()))
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Cost of one throttle check.
+
+Times `allow_request` for many distinct clients against a bucket table that
+already holds `--clients` rows, and checks that a burst beyond the rate is
+refused.
+
+    python -m benchmarks.throttle --clients 100000
+"""
+import argparse
+import random
+import time
+
+from benchmarks import setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=100000, help="Buckets already in the table.")
+    parser.add_argument('--checks', type=int, default=5000, help="Throttle checks to time.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import AnonymousUser
+    from rest_framework.test import APIRequestFactory
+    from throttling.models import ThrottleBucket
+    from throttling.throttles import IPThrottle
+
+    with test_database():
+        now = time.time()
+        ThrottleBucket.objects.bulk_create(
+            (ThrottleBucket(key=f'ip:ip:10.{i >> 16}.{(i >> 8) & 255}.{i & 255}', full_at=now + 30)
+             for i in range(args.clients)),
+            batch_size=10000,
+        )
+        throttle = IPThrottle()
+        factory = APIRequestFactory()
+        requests = []
+        for _ in range(args.checks):
+            i = random.randrange(args.clients)
+            request = factory.get('/products/', REMOTE_ADDR=f'10.{i >> 16}.{(i >> 8) & 255}.{i & 255}')
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        timings = []
+        for request in requests:
+            started = time.perf_counter()
+            throttle.allow_request(request, None)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+
+        burst = IPThrottle()
+        request = factory.get('/products/', REMOTE_ADDR='192.0.2.1')
+        request.user = AnonymousUser()
+        allowed = sum(burst.allow_request(request, None) for _ in range(burst.capacity * 2))
+
+        print(f"{args.clients} buckets, {args.checks} checks")
+        print(f"check ms: p50 {timings[len(timings) // 2] * 1000:.3f}, "
+              f"p99 {timings[int(len(timings) * 0.99)] * 1000:.3f}")
+        print(f"burst of {burst.capacity * 2}: {allowed} allowed (capacity {burst.capacity}), "
+              f"retry after {burst.wait():.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned guest carts and expired sessions in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of rows deleted per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help="Seconds to pause between batches to give other queries room.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count what would be deleted.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options['batch_size']
+
+        # Guest carts whose session is gone or has expired
+        live_session = Session.objects.filter(session_key=OuterRef('session_id'), expire_date__gt=now)
+        carts = Cart.objects.filter(user__isnull=True).exclude(Exists(live_session))
+        sessions = Session.objects.filter(expire_date__lte=now)
+
+        if options['dry_run']:
+            self.stdout.write(f"{carts.count()} abandoned guest carts and {sessions.count()} expired sessions would be deleted.")
+            return
+
+        started = time.monotonic()
+        deleted_carts = deleted_items = 0
+        last_id = 0
+        while True:
+            ids = list(carts.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                deleted_items += CartItem.objects.filter(cart_id__in=ids).delete()[0]
+                deleted_carts += Cart.objects.filter(id__in=ids).delete()[1].get('cart.Cart', 0)
+            last_id = ids[-1]
+            time.sleep(options['sleep'])
+        self._report("guest carts", deleted_carts + deleted_items, started,
+                     f"{deleted_carts} carts, {deleted_items} items")
+
+        started = time.monotonic()
+        deleted_sessions = 0
+        while True:
+            keys = list(sessions.values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                break
+            deleted_sessions += Session.objects.filter(session_key__in=keys).delete()[0]
+            time.sleep(options['sleep'])
+        self._report("expired sessions", deleted_sessions, started, f"{deleted_sessions} sessions")
+
+    def _report(self, label, rows, started, details):
+        elapsed = time.monotonic() - started
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {label}: {details} in {elapsed:.2f}s ({rate:.0f} rows/s)."
+        ))
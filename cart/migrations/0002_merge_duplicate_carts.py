@@ -0,0 +1,45 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:35
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """
+    Fold duplicate carts and cart items together so the unique constraints can be added.
+    """
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    # Carts of authenticated users are no longer keyed by session
+    Cart.objects.filter(user__isnull=False).update(session_id=None)
+
+    duplicates = (Cart.objects.filter(user__isnull=False)
+                  .values('user').annotate(keep=Min('id'), carts=Count('id')).filter(carts__gt=1))
+    for row in duplicates:
+        CartItem.objects.filter(cart__user=row['user']).update(cart=row['keep'])
+        Cart.objects.filter(user=row['user']).exclude(id=row['keep']).delete()
+
+    duplicates = (Cart.objects.filter(user__isnull=True, session_id__isnull=False)
+                  .values('session_id').annotate(keep=Min('id'), carts=Count('id')).filter(carts__gt=1))
+    for row in duplicates:
+        CartItem.objects.filter(cart__user__isnull=True, cart__session_id=row['session_id']).update(cart=row['keep'])
+        Cart.objects.filter(user__isnull=True, session_id=row['session_id']).exclude(id=row['keep']).delete()
+
+    # Collapse repeated products within a cart into a single item
+    duplicates = (CartItem.objects.values('cart', 'product')
+                  .annotate(keep=Min('id'), total=Sum('quantity'), items=Count('id')).filter(items__gt=1))
+    for row in duplicates:
+        CartItem.objects.filter(id=row['keep']).update(quantity=row['total'])
+        CartItem.objects.filter(cart=row['cart'], product=row['product']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+    ]
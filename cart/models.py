@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from products.models import Product
 
@@ -8,14 +12,67 @@ class Cart(models.Model):
     session_id = models.CharField(max_length=255, null=True, blank=True) # For unauthenticated users
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized summary, kept up to date as items change
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # One cart per user, and one guest cart per session
+            models.UniqueConstraint(fields=['user'], condition=models.Q(user__isnull=False),
+                                    name='unique_cart_per_user'),
+            models.UniqueConstraint(fields=['session_id'], condition=models.Q(user__isnull=True),
+                                    name='unique_cart_per_guest_session'),
+        ]
+
     def __str__(self):
         return f"Cart {self.id} for {self.user if self.user else 'Guest'}"
 
+    @property
+    def summary_cache_key(self):
+        """
+        Cache key of the cart summary. Every change bumps the version, so a
+        cached summary is never served for a later version of the cart.
+        """
+        return f"cart_summary_{self.pk}_v{self.version}"
+
+    def apply_change(self, quantity, amount):
+        """
+        Adjust the summary after items were added or removed and bump the version.
+        Call it in the transaction that changed the items.
+        """
+        Cart.objects.filter(pk=self.pk).update(
+            item_count=F('item_count') + quantity,
+            subtotal=F('subtotal') + amount,
+            version=F('version') + 1,
+        )
+
+    @staticmethod
+    def recalculate(carts):
+        """
+        Recompute the summary of the given carts from their items in one UPDATE.
+        """
+        items = CartItem.objects.filter(cart=OuterRef('pk')).values('cart')
+        carts.update(
+            item_count=Coalesce(Subquery(items.annotate(total=Sum('quantity')).values('total')), 0),
+            subtotal=Coalesce(
+                Subquery(items.annotate(total=Sum(F('quantity') * F('product__price'))).values('total')),
+                Decimal('0'), output_field=models.DecimalField(),
+            ),
+            version=F('version') + 1,
+        )
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, related_name='cart_items', on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} of {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} of {self.product.name}"
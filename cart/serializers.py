@@ -38,13 +38,40 @@ class CartItemSerializer(serializers.ModelSerializer):
         return value
 
 
+class CartBatchItemSerializer(serializers.Serializer):
+    ADD = 'add'
+    SET = 'set'
+    REMOVE = 'remove'
+
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, default=1)
+    action = serializers.ChoiceField(choices=[ADD, SET, REMOVE], default=ADD)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    items = CartBatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        """
+        Look up every product in the batch with a single query.
+        """
+        product_ids = {item['product'] for item in items}
+        products = Product.objects.in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise serializers.ValidationError(f"Products not found: {missing}.")
+
+        for item in items:
+            item['product'] = products[item['product']]
+        return items
+
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'session_id', 'created_at', 'items']
+        fields = ['id', 'user', 'session_id', 'created_at', 'item_count', 'subtotal', 'items']
     
     def create(self, validated_data):
         """
@@ -53,4 +80,10 @@ class CartSerializer(serializers.ModelSerializer):
         user = validated_data.get('user')
         session_id = validated_data.get('session_id')
         cart, created, = Cart.objects.get_or_create(user=user, session_id=session_id)
-        return cart
\ No newline at end of file
+        return cart
+
+
+class CartSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Cart
+        fields = ['id', 'item_count', 'subtotal', 'version']
@@ -1,3 +1,265 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from products.models import Product
+from shop.models import Shop
+from .models import Cart, CartItem
+from .utils import merge_guest_cart
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        shop = Shop.objects.create(owner=seller, shop_name='Shop', shop_description='Shop', shop_category='Home',
+                                   business_address='Street 1', email=seller.email, is_active=True)
+        self.lamp = Product.objects.create(user=seller, shop=shop, name='Lamp', description='A lamp',
+                                           price='10.00', stock=10)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def summary(self):
+        response = self.client.get('/cart/summary/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['item_count'], response.data['subtotal']
+
+    def test_every_change_shows_up_in_the_summary(self):
+        self.assertEqual(self.summary(), (0, '0.00'))
+
+        self.client.post('/cart/add/', {'product': self.lamp.pk, 'quantity': 2}, format='json')
+        self.assertEqual(self.summary(), (2, '20.00'))
+        # Served from the cache until the cart changes
+        self.assertEqual(self.summary(), (2, '20.00'))
+
+        self.client.patch('/cart/update/', {'product': self.lamp.pk, 'quantity': 3}, format='json')
+        self.assertEqual(self.summary(), (3, '30.00'))
+
+        self.client.delete('/cart/remove/', {'product': self.lamp.pk}, format='json')
+        self.assertEqual(self.summary(), (0, '0.00'))
+
+    def test_cache_key_follows_the_version(self):
+        self.client.post('/cart/add/', {'product': self.lamp.pk, 'quantity': 1}, format='json')
+        cart = Cart.objects.get(user=self.buyer)
+        self.summary()
+        self.assertIsNotNone(cache.get(cart.summary_cache_key))
+
+        # A summary cached for an older version, e.g. by another process, is never read again
+        Cart.recalculate(Cart.objects.filter(pk=cart.pk))
+        cart.refresh_from_db()
+        self.assertIsNone(cache.get(cart.summary_cache_key))
+
+
+class ConcurrentCartChangeTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        shop = Shop.objects.create(owner=seller, shop_name='Shop', shop_description='Shop', shop_category='Home',
+                                   business_address='Street 1', email=seller.email, is_active=True)
+        self.lamp = Product.objects.create(user=seller, shop=shop, name='Lamp', description='A lamp',
+                                           price='10.00', stock=10)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.client.post('/cart/add/', {'product': self.lamp.pk, 'quantity': 1}, format='json')
+
+    def in_parallel(self, request):
+        """Send two requests from separate threads and return their status codes."""
+        codes = []
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(self.buyer)
+            try:
+                codes.append(request(client).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(codes)
+
+    def assertSummaryMatchesItems(self):
+        cart = Cart.objects.get(user=self.buyer)
+        items = list(CartItem.objects.filter(cart=cart).select_related('product'))
+        self.assertEqual(cart.item_count, sum(item.quantity for item in items))
+        self.assertEqual(cart.subtotal, sum(item.quantity * item.product.price for item in items))
+
+    def test_interleaved_adds_both_count(self):
+        # Both requests read the existing item before either writes it
+        barrier = threading.Barrier(2, timeout=5)
+        get_or_create = CartItem.objects.get_or_create
+
+        def read_then_wait(*args, **kwargs):
+            result = get_or_create(*args, **kwargs)
+            barrier.wait()
+            return result
+
+        with mock.patch.object(CartItem.objects, 'get_or_create', side_effect=read_then_wait):
+            codes = self.in_parallel(
+                lambda client: client.post('/cart/add/', {'product': self.lamp.pk, 'quantity': 2}, format='json'))
+
+        self.assertEqual(codes, [201, 201])
+        self.assertEqual(CartItem.objects.get(cart__user=self.buyer).quantity, 5)
+        self.assertSummaryMatchesItems()
+
+    def test_concurrent_updates_keep_the_summary_exact(self):
+        codes = self.in_parallel(
+            lambda client: client.patch('/cart/update/', {'product': self.lamp.pk, 'quantity': 4}, format='json'))
+
+        self.assertEqual(codes, [200, 200])
+        self.assertSummaryMatchesItems()
+
+    def test_only_one_concurrent_remove_applies(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            codes = self.in_parallel(
+                lambda client: client.delete('/cart/remove/', {'product': self.lamp.pk}, format='json'))
+
+        self.assertEqual(codes, [200, 404])
+        self.assertSummaryMatchesItems()
+
+
+class MergeGuestCartTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        shop = Shop.objects.create(owner=seller, shop_name='Shop', shop_description='Shop', shop_category='Home',
+                                   business_address='Street 1', email=seller.email, is_active=True)
+        self.lamp, self.chair, self.rug = [
+            Product.objects.create(user=seller, shop=shop, name=name, description=name, price=price, stock=10)
+            for name, price in (('Lamp', '10.00'), ('Chair', '25.00'), ('Rug', '40.00'))
+        ]
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+
+    def fill(self, cart, **quantities):
+        for name, quantity in quantities.items():
+            CartItem.objects.create(cart=cart, product=getattr(self, name), quantity=quantity)
+        Cart.recalculate(Cart.objects.filter(pk=cart.pk))
+
+    def contents(self, cart):
+        cart.refresh_from_db()
+        items = dict(cart.items.values_list('product__name', 'quantity'))
+        return items, cart.item_count, str(cart.subtotal)
+
+    def test_guest_cart_is_adopted_without_a_user_cart(self):
+        guest_cart = Cart.objects.create(session_id='guest-session')
+        self.fill(guest_cart, lamp=2)
+
+        cart = merge_guest_cart('guest-session', self.buyer)
+
+        self.assertEqual(cart.pk, guest_cart.pk)
+        cart.refresh_from_db()
+        self.assertEqual((cart.user, cart.session_id), (self.buyer, None))
+        self.assertEqual(self.contents(cart), ({'Lamp': 2}, 2, '20.00'))
+
+    def test_guest_items_are_merged_into_the_user_cart(self):
+        user_cart = Cart.objects.create(user=self.buyer)
+        self.fill(user_cart, lamp=1, chair=1)
+        guest_cart = Cart.objects.create(session_id='guest-session')
+        self.fill(guest_cart, lamp=2, rug=1)
+
+        cart = merge_guest_cart('guest-session', self.buyer)
+
+        self.assertEqual(cart.pk, user_cart.pk)
+        # Shared products are added up, the rest moved over
+        self.assertEqual(self.contents(cart), ({'Lamp': 3, 'Chair': 1, 'Rug': 1}, 5, '95.00'))
+        self.assertFalse(Cart.objects.filter(pk=guest_cart.pk).exists())
+
+    def test_nothing_to_merge(self):
+        self.assertIsNone(merge_guest_cart(None, self.buyer))
+        self.assertIsNone(merge_guest_cart('unknown-session', self.buyer))
+        self.assertFalse(Cart.objects.exists())
+
+    def test_one_cart_per_user_and_per_guest_session(self):
+        Cart.objects.create(user=self.buyer)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.buyer)
+
+        Cart.objects.create(session_id='guest-session')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(session_id='guest-session')
+
+        # Sessions only have to be unique among guest carts
+        Cart.objects.create(user=User.objects.create_user('other', 'other@example.com', 'password'),
+                            session_id='guest-session')
+        self.assertEqual(Cart.objects.filter(session_id='guest-session').count(), 2)
+
+
+class BatchUpdateCartTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        shop = Shop.objects.create(owner=seller, shop_name='Shop', shop_description='Shop', shop_category='Home',
+                                   business_address='Street 1', email=seller.email, is_active=True)
+        self.lamp = Product.objects.create(user=seller, shop=shop, name='Lamp', description='A lamp',
+                                           price='10.00', stock=10)
+        self.chair = Product.objects.create(user=seller, shop=shop, name='Chair', description='A chair',
+                                            price='25.00', stock=3)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def batch(self, *items):
+        return self.client.post('/cart/batch/', {'items': list(items)}, format='json')
+
+    def contents(self):
+        cart = Cart.objects.get(user=self.buyer)
+        items = dict(cart.items.values_list('product__name', 'quantity'))
+        return items, cart.item_count, str(cart.subtotal)
+
+    def test_add_and_set(self):
+        response = self.batch({'product': self.lamp.pk, 'quantity': 2}, {'product': self.chair.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.contents(), ({'Lamp': 2, 'Chair': 1}, 3, '45.00'))
+
+        # Adds go on top of the cart, sets replace it; items apply in order
+        response = self.batch(
+            {'product': self.lamp.pk, 'quantity': 3},
+            {'product': self.chair.pk, 'quantity': 3, 'action': 'set'},
+            {'product': self.lamp.pk, 'quantity': 1},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['removed']), (2, 0))
+        self.assertEqual(self.contents(), ({'Lamp': 6, 'Chair': 3}, 9, '135.00'))
+
+    def test_zero_quantities_remove_items(self):
+        self.batch({'product': self.lamp.pk, 'quantity': 2}, {'product': self.chair.pk, 'quantity': 2})
+
+        response = self.batch(
+            {'product': self.lamp.pk, 'action': 'remove'},
+            {'product': self.chair.pk, 'quantity': 0, 'action': 'set'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['removed']), (0, 2))
+        self.assertEqual(self.contents(), ({}, 0, '0.00'))
+
+    def test_nothing_changes_when_one_item_is_out_of_stock(self):
+        self.batch({'product': self.chair.pk, 'quantity': 2})
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.batch({'product': self.lamp.pk, 'quantity': 5}, {'product': self.chair.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'], {self.chair.pk: ["Only 3 items are available in stock."]})
+        self.assertEqual(self.contents(), ({'Chair': 2}, 2, '50.00'))
+
+    def test_unknown_products_are_rejected(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.batch({'product': self.lamp.pk}, {'product': 999999})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_summary_follows_the_batch(self):
+        self.batch({'product': self.lamp.pk, 'quantity': 4})
+        self.assertEqual(self.client.get('/cart/summary/').data['item_count'], 4)
+
+        # A change of -3 lamps and +1 chair
+        self.batch({'product': self.lamp.pk, 'quantity': 1, 'action': 'set'}, {'product': self.chair.pk})
+        summary = self.client.get('/cart/summary/').data
+        self.assertEqual((summary['item_count'], summary['subtotal']), (2, '35.00'))
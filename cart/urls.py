@@ -6,4 +6,6 @@ urlpatterns = [
     path('cart/', views.view_cart, name='view_cart'),
     path('cart/update/', views.update_cart, name='update_cart'),
     path('cart/remove/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/batch/', views.batch_update_cart, name='batch_update_cart'),
+    path('cart/summary/', views.cart_summary, name='cart_summary'),
 ]
@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .models import Cart, CartItem
+
+
+def get_cart(request, create=False):
+    """
+    Resolve the cart for the current user or guest session.
+    The result is cached on the request so views only look it up once.
+    """
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, '_cached_cart') or (create and http_request._cached_cart is None):
+        http_request._cached_cart = _resolve_cart(request, create)
+    return http_request._cached_cart
+
+
+def _resolve_cart(request, create):
+    if request.user.is_authenticated:
+        lookup = {'user': request.user}
+    else:
+        # Guests are identified by their session, create one if needed
+        if not request.session.session_key:
+            if not create:
+                return None
+            request.session.create()
+        lookup = {'user': None, 'session_id': request.session.session_key}
+
+    if create:
+        cart, created = Cart.objects.get_or_create(**lookup)
+        return cart
+    return Cart.objects.filter(**lookup).first()
+
+
+def merge_guest_cart(session_id, user):
+    """
+    Move the guest cart of a session into the user's cart at login.
+    Quantities of products that are already in the user's cart are added up.
+    """
+    if not session_id:
+        return None
+
+    with transaction.atomic():
+        guest_cart = Cart.objects.select_for_update().filter(user__isnull=True, session_id=session_id).first()
+        if guest_cart is None:
+            return None
+
+        # If the user has no cart yet the guest cart simply becomes theirs
+        if not Cart.objects.filter(user=user).exists():
+            guest_cart.user = user
+            guest_cart.session_id = None
+            guest_cart.save(update_fields=['user', 'session_id'])
+            return guest_cart
+
+        user_cart = Cart.objects.get(user=user)
+        guest_items = CartItem.objects.filter(cart=guest_cart)
+
+        # Add guest quantities to the products both carts have in common
+        guest_quantity = guest_items.filter(product=OuterRef('product')).values('quantity')[:1]
+        CartItem.objects.filter(
+            cart=user_cart, product__in=guest_items.values('product')
+        ).update(quantity=F('quantity') + Subquery(guest_quantity))
+
+        # Move the remaining guest items over to the user's cart
+        guest_items.exclude(
+            product__in=CartItem.objects.filter(cart=user_cart).values('product')
+        ).update(cart=user_cart)
+
+        guest_cart.delete()
+        Cart.recalculate(Cart.objects.filter(pk=user_cart.pk))
+        return user_cart
@@ -2,24 +2,19 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 
 from .models import Cart, CartItem
-from .serializers import CartItemSerializer, CartSerializer
-from products.models import Product
-from orders.models import Order
+from .serializers import (CartBatchItemSerializer, CartBatchSerializer, CartItemSerializer, CartSerializer,
+                          CartSummarySerializer)
+from .utils import get_cart
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def add_to_cart(request):
-    # Use session ID if the user is unauthenticated
-    user = request.user if request.user.is_authenticated else None
-    session_id = request.session.session_key
-
-    # Ensure the session is valid
-    if not session_id:
-        request.session.create()
-
     data = request.data
     serializer = CartItemSerializer(data=data)
 
@@ -28,13 +23,16 @@ def add_to_cart(request):
         quantity = serializer.validated_data['quantity']
 
         # Get or create a cart for the user or session
-        cart, created = Cart.objects.get_or_create(user=user, session_id=session_id)
+        cart = get_cart(request, create=True)
 
-        # Check if the item already exists in the cart
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-        if not created:
-            cart_item.quantity += quantity
-        cart_item.save()
+        with transaction.atomic():
+            # Check if the item already exists in the cart
+            cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product,
+                                                                defaults={'quantity': quantity})
+            if not created:
+                # Added in the UPDATE, so concurrent adds all count
+                CartItem.objects.filter(pk=cart_item.pk).update(quantity=F('quantity') + quantity)
+            cart.apply_change(quantity, product.price * quantity)
 
         return Response({
             "message": "Item added to cart."
@@ -44,18 +42,9 @@ def add_to_cart(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])  # Allow access to both authenticated and unauthenticated users
 def view_cart(request):
-    # Use session ID if the user is unauthenticated
-    user = request.user if request.user.is_authenticated else None
-    session_id = request.session.session_key
-
-    # Ensure the session is valid for unauthenticated users
-    if not session_id:
-        request.session.create()
-
-    try:
-        # Get the cart using either user or session_id
-        cart = Cart.objects.get(user=user, session_id=session_id)
-    except Cart.DoesNotExist:
+    # Get the cart using either the user or the session
+    cart = get_cart(request)
+    if cart is None:
         return Response({"message": "Your cart is empty."}, status=status.HTTP_200_OK)
 
     serializer = CartSerializer(cart)
@@ -65,38 +54,128 @@ def view_cart(request):
 @api_view(['PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
 def update_cart(request):
-    user = request.user
     product_id = request.data.get('product')
     new_quantity = request.data.get('quantity')
 
     if not product_id or not isinstance(product_id, int):
         return Response({'error': 'Invalid product ID.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        cart = Cart.objects.get(user=user)
-        cart_item = cart.items.get(product__id=product_id)
-    except (Cart.DoesNotExist, CartItem.DoesNotExist):
+    cart = get_cart(request)
+    cart_item = cart.items.filter(product__id=product_id).first() if cart else None
+    if cart_item is None:
         return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
 
     serializer = CartItemSerializer(cart_item, data={'quantity': new_quantity, 'product': product_id}, partial=True)
-    if serializer.is_valid():
-        serializer.save()
-        return Response({'message': 'Cart item updated.'}, status=status.HTTP_200_OK)
-    else:
+    if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    with transaction.atomic():
+        # The change is taken from the locked row, not from the read above
+        cart_item = cart.items.select_for_update().select_related('product').filter(pk=cart_item.pk).first()
+        if cart_item is None:
+            return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
+        change = serializer.validated_data['quantity'] - cart_item.quantity
+        cart_item.quantity = serializer.validated_data['quantity']
+        cart_item.save(update_fields=['quantity'])
+        cart.apply_change(change, cart_item.product.price * change)
+    return Response({'message': 'Cart item updated.'}, status=status.HTTP_200_OK)
+
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def remove_from_cart(request):
-    user = request.user
     product_id = request.data.get('product')
 
-    try:
-        cart = Cart.objects.get(user=user)
-        cart_item = cart.items.get(product__id=product_id)
-    except (Cart.DoesNotExist, CartItem.DoesNotExist):
+    cart = get_cart(request)
+    cart_item = cart.items.filter(product__id=product_id).first() if cart else None
+    if cart_item is None:
         return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
 
-    cart_item.delete()
+    with transaction.atomic():
+        # Lock the row so a concurrent removal of the same item finds it gone
+        cart_item = cart.items.select_for_update().select_related('product').filter(pk=cart_item.pk).first()
+        deleted = CartItem.objects.filter(pk=cart_item.pk).delete()[0] if cart_item else 0
+        if not deleted:
+            return Response({'error': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
+        cart.apply_change(-cart_item.quantity, -cart_item.product.price * cart_item.quantity)
     return Response({'message': 'Item removed from cart.'}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def batch_update_cart(request):
+    """
+    Add, update or remove many cart items in one request.
+    """
+    serializer = CartBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    items = serializer.validated_data['items']
+    products = {item['product'].id: item['product'] for item in items}
+    cart = get_cart(request, create=True)
+
+    with transaction.atomic():
+        # Current quantities of the products in the batch
+        previous = dict(
+            cart.items.select_for_update().filter(product__in=products).values_list('product', 'quantity')
+        )
+        quantities = dict(previous)
+
+        # Apply the changes in memory, in the order they were sent
+        for item in items:
+            product_id = item['product'].id
+            if item['action'] == CartBatchItemSerializer.REMOVE:
+                quantities[product_id] = 0
+            elif item['action'] == CartBatchItemSerializer.SET:
+                quantities[product_id] = item['quantity']
+            else:
+                quantities[product_id] = quantities.get(product_id, 0) + item['quantity']
+
+        errors = {
+            product_id: [f"Only {products[product_id].stock} items are available in stock."]
+            for product_id, quantity in quantities.items() if quantity > products[product_id].stock
+        }
+        if errors:
+            return Response({'items': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        removed = [product_id for product_id, quantity in quantities.items() if quantity == 0]
+        updated = [
+            CartItem(cart=cart, product=products[product_id], quantity=quantity)
+            for product_id, quantity in quantities.items() if quantity > 0
+        ]
+        if removed:
+            cart.items.filter(product__in=removed).delete()
+        if updated:
+            CartItem.objects.bulk_create(updated, update_conflicts=True,
+                                         unique_fields=['cart', 'product'], update_fields=['quantity'])
+
+        changes = {product_id: quantity - previous.get(product_id, 0) for product_id, quantity in quantities.items()}
+        cart.apply_change(
+            sum(changes.values()),
+            sum(products[product_id].price * change for product_id, change in changes.items()),
+        )
+
+    return Response({
+        'message': 'Cart updated.',
+        'updated': len(updated),
+        'removed': len(removed),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def cart_summary(request):
+    """
+    Item count and subtotal of the cart, for badges that don't need the full cart.
+    """
+    cart = get_cart(request)
+    if cart is None:
+        return Response(CartSummarySerializer(Cart()).data, status=status.HTTP_200_OK)
+
+    # Keyed by the cart's version, so a change shows up at once in every server process
+    summary = cache.get(cart.summary_cache_key)
+    if summary is None:
+        summary = CartSummarySerializer(cart).data
+        cache.set(cart.summary_cache_key, summary, timeout=300)
+    return Response(summary, status=status.HTTP_200_OK)
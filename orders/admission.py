@@ -0,0 +1,112 @@
+"""
+Per-product admission control for checkout.
+
+When a popular product goes on sale, every checkout competes for the same
+product row and the transactions pile up on lock waits. The controller lets
+only a few checkouts per product into the database at a time, queues the
+next ones for a bounded time and turns the rest away straight away, so the
+database stays busy with work that can finish.
+
+Limits apply per worker process; size them with the number of workers in mind.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a product's queue is full or the wait for a slot ran out.
+    """
+    def __init__(self, product_id, retry_after):
+        super().__init__(f"Too many checkouts in progress for product {product_id}.")
+        self.product_id = product_id
+        self.retry_after = retry_after
+
+
+class _Gate:
+    def __init__(self, lock):
+        self.in_flight = 0
+        self.waiting = 0
+        self.condition = threading.Condition(lock)
+
+
+class ProductAdmission:
+    def __init__(self, max_in_flight, max_queued, max_wait):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._gates = {}
+
+    @property
+    def retry_after(self):
+        return max(1, math.ceil(self.max_wait))
+
+    def acquire(self, product_id):
+        with self._lock:
+            gate = self._gates.get(product_id)
+            if gate is None:
+                gate = self._gates[product_id] = _Gate(self._lock)
+
+            # Newcomers don't overtake checkouts that are already queued
+            if gate.in_flight < self.max_in_flight and not gate.waiting:
+                gate.in_flight += 1
+                return
+            if gate.waiting >= self.max_queued:
+                raise AdmissionRejected(product_id, self.retry_after)
+
+            gate.waiting += 1
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while gate.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise AdmissionRejected(product_id, self.retry_after)
+                    gate.condition.wait(remaining)
+            except AdmissionRejected:
+                gate.waiting -= 1
+                if gate.waiting and gate.in_flight < self.max_in_flight:
+                    # The wakeup of a release may have come to this waiter just
+                    # as it gave up; pass it on so the free slot isn't left idle
+                    gate.condition.notify()
+                elif not gate.in_flight and not gate.waiting:
+                    del self._gates[product_id]
+                raise
+            gate.waiting -= 1
+            gate.in_flight += 1
+
+    def release(self, product_id):
+        with self._lock:
+            gate = self._gates[product_id]
+            gate.in_flight -= 1
+            if gate.waiting:
+                gate.condition.notify()
+            elif not gate.in_flight:
+                del self._gates[product_id]
+
+    @contextmanager
+    def admit(self, product_ids):
+        """
+        Hold a checkout slot for each product for the duration of the block.
+        Slots are taken in id order so two checkouts can't wait on each other.
+        """
+        acquired = []
+        try:
+            for product_id in sorted(set(product_ids)):
+                self.acquire(product_id)
+                acquired.append(product_id)
+            yield
+        finally:
+            for product_id in acquired:
+                self.release(product_id)
+
+
+checkout_admission = ProductAdmission(
+    max_in_flight=settings.CHECKOUT_MAX_IN_FLIGHT_PER_PRODUCT,
+    max_queued=settings.CHECKOUT_MAX_QUEUED_PER_PRODUCT,
+    max_wait=settings.CHECKOUT_QUEUE_TIMEOUT,
+)
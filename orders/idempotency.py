@@ -0,0 +1,123 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+def _owner(request):
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if request.session.session_key:
+        return f"session:{request.session.session_key}"
+    return None
+
+
+def _claim(owner, key, request_hash):
+    """
+    Insert the key for this request, or return the existing one and ``False``
+    when another request already claimed it. A claim whose lease ran out
+    without a response is taken over.
+    """
+    now = timezone.now()
+    locked_until = now + settings.IDEMPOTENCY_LOCK_TIMEOUT
+    while True:
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    owner=owner, key=key, request_hash=request_hash,
+                    expires_at=now + settings.IDEMPOTENCY_KEY_TTL, locked_until=locked_until,
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(owner=owner, key=key).first()
+            if record is None:
+                continue  # The other request failed and released the key
+            if record.expires_at <= now:
+                record.delete()
+                continue
+            if record.is_complete or record.request_hash != request_hash or (
+                    record.locked_until is not None and record.locked_until > now):
+                return record, False
+            # Whoever held the lease is gone; only one retry wins the takeover
+            if _owned(record).update(locked_until=locked_until):
+                record.locked_until = locked_until
+                return record, True
+
+
+def _owned(record):
+    # The record, as long as no retry has taken it over since
+    return IdempotencyKey.objects.filter(pk=record.pk, locked_until=record.locked_until)
+
+
+def _wait_for(record):
+    """
+    Wait for the first request with the same key to finish.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while not record.is_complete and time.monotonic() < deadline:
+        time.sleep(0.1)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            return None
+    return record
+
+
+def idempotent(view):
+    """
+    Make a view safe to retry with an ``Idempotency-Key`` header.
+
+    The first response for a key is stored per user or guest session and
+    replayed for retries until the key expires. A retry that arrives while the
+    first request is still running waits for its result instead of running the
+    view a second time.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        owner = _owner(request)
+        if not key or owner is None:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': "Idempotency-Key must be at most 255 characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        request_hash = hashlib.sha256(
+            json.dumps(request.data, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        record, claimed = _claim(owner, key, request_hash)
+
+        if not claimed:
+            if record.request_hash != request_hash:
+                return Response({'error': "This Idempotency-Key was already used for a different request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            record = _wait_for(record)
+            if record is None or not record.is_complete:
+                return Response({'error': "A request with this Idempotency-Key is still being processed."},
+                                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+            return Response(record.response_body, status=record.status_code,
+                            headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            _owned(record).delete()
+            raise
+
+        if response.status_code >= 500 or response.status_code == 429 or not hasattr(response, 'data'):
+            # Let the client retry failures that weren't its fault
+            _owned(record).delete()
+        else:
+            _owned(record).update(status_code=response.status_code,
+                                  response_body=json.loads(JSONRenderer().render(response.data)))
+        return response
+
+    return wrapper
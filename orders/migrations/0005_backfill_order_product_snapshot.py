@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models import Case, F, Max, OuterRef, Subquery, When
+
+BATCH_SIZE = 10000
+
+
+def backfill_product_snapshot(apps, schema_editor):
+    """
+    Copy the product name and unit price onto existing orders, one id range at a time.
+    """
+    Order = apps.get_model('orders', 'Order')
+    Product = apps.get_model('products', 'Product')
+
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    last_id = Order.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    for start in range(0, last_id, BATCH_SIZE):
+        Order.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE).update(
+            product_name=Subquery(product.values('name')[:1]),
+            # Prefer the price that was actually charged, older orders have no total yet
+            unit_price=Case(
+                When(total_price__gt=0, quantity__gt=0, then=F('total_price') / F('quantity')),
+                default=Subquery(product.values('price')[:1]),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    # Every batch is committed on its own so the table is never locked as a whole
+    atomic = False
+
+    dependencies = [
+        ('orders', '0004_order_product_snapshot'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_snapshot, migrations.RunPython.noop),
+    ]
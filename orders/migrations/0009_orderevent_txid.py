@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderevent',
+            name='txid',
+            field=models.BigIntegerField(db_default=models.Func(function='txid_current', output_field=models.BigIntegerField()), editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='orderevent',
+            index=models.Index(fields=['txid', 'sequence'], name='orderevent_feed_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from InventoryNest import feeds
 from products.models import Product
 
 class Order(models.Model):
@@ -21,29 +24,96 @@ class Order(models.Model):
         (CANCELLED, 'Cancelled'),
     ]
 
+    # Statuses an order can move to from each status
+    STATUS_TRANSITIONS = {
+        PENDING: [PROCESSING, CANCELLED],
+        PROCESSING: [READY_TO_SHIP],
+        READY_TO_SHIP: [OUT_FOR_DELIVERY],
+        OUT_FOR_DELIVERY: [DELIVERED],
+        DELIVERED: [],
+        CANCELLED: [],
+    }
+
     # Fields
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_orders', null=True, blank=True)
     guest_email = models.EmailField(null=True, blank=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='product_orders')
     quantity = models.PositiveIntegerField()
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Snapshot of the product at checkout, so reading orders doesn't need the product
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     status = models.CharField(max_length=50, choices=ORDER_STATUS_CHOICES, default=PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Recent orders, e.g. for product popularity
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
+
     def __str__(self):
         user_display = self.user.username if self.user else self.guest_email
-        return f"Order for {self.product.name} by {user_display}"
+        return f"Order for {self.product_name} by {user_display}"
+
+    # Status the order had when it was loaded, to detect status changes on save
+    _loaded_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_status = self.status
 
     def save(self, *args, **kwargs):
-        if self._state.adding:  # New order
-            if self.product.stock < self.quantity:
-                raise ValidationError("Not enough stock available.")
-            self.product.stock -= self.quantity
-            self.product.save()
+        adding = self._state.adding
+        with transaction.atomic():
+            if adding:  # New order
+                # Take the stock with a conditional UPDATE so concurrent orders can't oversell
+                reserved = Product.objects.filter(pk=self.product_id, stock__gte=self.quantity).update(
+                    stock=F('stock') - self.quantity, units_sold=F('units_sold') + self.quantity
+                )
+                if not reserved:
+                    # The product may have been deleted since it went into the cart
+                    if not Product.objects.filter(pk=self.product_id).exists():
+                        raise ValidationError(f"{self.product.name} is no longer available.")
+                    raise ValidationError(f"Not enough stock for {self.product.name}.")
+                self.product.stock -= self.quantity
+
+                self.product_name = self.product.name
+                self.unit_price = self.product.price
+
+            elif self.status == self.CANCELLED and self._loaded_status != self.CANCELLED:
+                # Put the stock back and take the units out of the product's sales
+                Product.all_objects.filter(pk=self.product_id).update(
+                    stock=F('stock') + self.quantity, units_sold=F('units_sold') - self.quantity
+                )
+
+            self.total_price = self.unit_price * self.quantity
+            super().save(*args, **kwargs)
+
+            # Record the change in the event log within the same transaction
+            if adding:
+                OrderEvent.objects.create(order=self, event_type=OrderEvent.CREATED, status=self.status)
+            elif self.status != self._loaded_status:
+                OrderEvent.objects.create(order=self, event_type=OrderEvent.STATUS_CHANGED, status=self.status)
+        self._loaded_status = self.status
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            OrderEvent.objects.create(order=self, event_type=OrderEvent.DELETED, status=self.status)
+            return super().delete(*args, **kwargs)
 
-        self.total_price = self.product.price * self.quantity
-        super().save(*args, **kwargs)
+    def can_transition_to(self, status):
+        """
+        Check whether the order may move from its current status to ``status``.
+        """
+        return status in self.STATUS_TRANSITIONS.get(self.status, [])
 
     def cancel(self):
         """
@@ -51,8 +121,7 @@ class Order(models.Model):
         """
         if self.status != self.PENDING:
             raise ValidationError("Order cannot be canceled once it is processed or shipped.")
-        self.product.stock += self.quantity
-        self.product.save()
+        # save() restores the stock
         self.status = self.CANCELLED
         self.save()
 
@@ -69,3 +138,90 @@ class Order(models.Model):
         Retrieve orders that are not canceled or delivered.
         """
         return Order.objects.exclude(status__in=[Order.CANCELLED, Order.DELIVERED])
+
+
+class OrderEvent(models.Model):
+    """
+    Append-only log of order changes for downstream consumers.
+    """
+    CREATED = 'created'
+    STATUS_CHANGED = 'status_changed'
+    DELETED = 'deleted'
+
+    EVENT_TYPE_CHOICES = [
+        (CREATED, 'Created'),
+        (STATUS_CHANGED, 'Status Changed'),
+        (DELETED, 'Deleted'),
+    ]
+
+    sequence = models.BigAutoField(primary_key=True)
+    # Events outlive the orders they describe, so there is no database constraint
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events')
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    status = models.CharField(max_length=50, choices=Order.ORDER_STATUS_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Transaction that wrote the event, see InventoryNest.feeds
+    txid = models.BigIntegerField(db_default=feeds.current_txid(), editable=False)
+
+    class Meta:
+        ordering = ['sequence']
+        indexes = [
+            models.Index(fields=['txid', 'sequence'], name='orderevent_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.sequence} {self.event_type} for order {self.order_id}"
+
+    @property
+    def cursor(self):
+        """
+        Feed checkpoint just after this event.
+        """
+        return f"{self.txid}-{self.sequence}"
+
+    @staticmethod
+    def settled():
+        """
+        Events of transactions that have ended, in commit-safe order (see InventoryNest.feeds).
+        """
+        return feeds.settled(OrderEvent.objects)
+
+    @staticmethod
+    def after(since):
+        """
+        Settled events after the ``since`` checkpoint, a cursor or, from before
+        cursors, a sequence number. Raises ValueError for anything else.
+        """
+        txid, _, sequence = str(since).partition('-')
+        if not sequence:
+            return OrderEvent.settled().filter(sequence__gt=int(txid))
+        return OrderEvent.settled().filter(feeds.after(int(txid), int(sequence)))
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response to a request sent with an ``Idempotency-Key`` header, replayed when the request is retried.
+    """
+    owner = models.CharField(max_length=255)  # "user:<id>" or "session:<key>"
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # Both stay empty while the first request is still being processed
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    # Lease of the request processing the key; a retry takes over a claim
+    # whose lease ran out, e.g. because its worker died
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} for {self.owner}"
+
+    @property
+    def is_complete(self):
+        return self.status_code is not None
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Order
+from .models import Order, OrderEvent
 from products.models import Product
 
 
@@ -7,7 +7,7 @@ class OrderSerializer(serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
     user = serializers.StringRelatedField(read_only=True)
     guest_email = serializers.EmailField(required=False, allow_blank=True)
-    total_price = serializers.SerializerMethodField()  # Add total price field
+    total_price = serializers.ReadOnlyField()
 
     class Meta:
         model = Order
@@ -17,6 +17,10 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    # Lookups for the lean list path (InventoryNest.serialization)
+    lean_sources = {'user': 'user__username'}
+    lean_extra = {'product_details': ['product_name', 'unit_price']}
+
     def validate_quantity(self, value):
         """
         Ensure that the ordered quantity does not exceed available stock.
@@ -59,24 +63,42 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 f"'{value}' is not a valid status. Choose from {valid_statuses}."
             )
+        if self.instance and value != self.instance.status and not self.instance.can_transition_to(value):
+            raise serializers.ValidationError(
+                f"An order cannot move from '{self.instance.status}' to '{value}'."
+            )
         return value
 
-    def get_total_price(self, obj):
-        """
-        Calculate the total price based on the product price and quantity.
-        """
-        return obj.product.price * obj.quantity
-
     def to_representation(self, instance):
         """
-        Add additional product details in the serialized output.
+        Add the product details captured at checkout to the serialized output.
         """
         representation = super().to_representation(instance)
-        product = instance.product
-
-        representation['product_details'] = {
-            'name': product.name,
-            'price': product.price,
-            'stock': product.stock,
-        }
+        representation['product_details'] = self.product_details(instance.product_name, instance.unit_price)
         return representation
+
+    @staticmethod
+    def product_details(name, price):
+        return {'name': name, 'price': price}
+
+    @staticmethod
+    def lean_finish(row, data):
+        data['product_details'] = OrderSerializer.product_details(row['product_name'], row['unit_price'])
+
+
+class OrderStatusBulkSerializer(serializers.Serializer):
+    orders = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    status = serializers.ChoiceField(choices=Order.ORDER_STATUS_CHOICES)
+
+    def validate_status(self, value):
+        if value == Order.CANCELLED:
+            raise serializers.ValidationError(
+                "Orders have to be cancelled one at a time so their stock is restored."
+            )
+        return value
+
+
+class OrderEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderEvent
+        fields = ['sequence', 'cursor', 'order', 'event_type', 'status', 'created_at']
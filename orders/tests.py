@@ -1,3 +1,349 @@
-from django.test import TestCase
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from InventoryNest.purge import purge_account, purge_products
+from cart.models import Cart, CartItem
+from products.models import Product
+from shop.models import Shop
+from users.models import UserProfile
+from .admission import AdmissionRejected, ProductAdmission
+from .models import IdempotencyKey, Order, OrderEvent
+
+
+def create_product(owner, price='10.00', stock=10, name='Lamp'):
+    shop = Shop.objects.filter(owner=owner).first() or Shop.objects.create(
+        owner=owner, shop_name=f'{owner.username} shop', shop_description='Shop', shop_category='Home',
+        business_address='Street 1', email=owner.email, is_active=True,
+    )
+    return Product.objects.create(user=owner, shop=shop, name=name, description='A product', price=price,
+                                  stock=stock)
+
+
+def fill_cart(user, product, quantity=1):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+    Cart.recalculate(Cart.objects.filter(pk=cart.pk))
+    return cart
+
+
+class ProcessOrderTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.product = create_product(self.seller, stock=5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def test_confirmation_email_failure_keeps_the_order(self):
+        fill_cart(self.buyer, self.product, quantity=2)
+        with mock.patch('orders.views.send_mail', side_effect=OSError("SMTP is down")), \
+                self.assertLogs('orders.views', 'ERROR'):
+            response = self.client.post('/orders/create/', format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['email_error'], "SMTP is down")
+        self.assertEqual(len(response.data['orders']), 1)
+        self.assertEqual(Order.objects.filter(user=self.buyer).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_deleted_product_in_cart_is_reported(self):
+        fill_cart(self.buyer, self.product)
+        Product.objects.filter(pk=self.product.pk).update(deleted_at=timezone.now())
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post('/orders/create/', format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], "Lamp is no longer available.")
+        self.assertFalse(Order.objects.exists())
+
+    def test_out_of_stock_is_reported(self):
+        fill_cart(self.buyer, self.product, quantity=6)
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post('/orders/create/', format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], "Not enough stock for Lamp.")
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.product = create_product(seller, stock=5)
+        fill_cart(self.buyer, self.product)
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def checkout(self, key='order-1', data=None):
+        return self.client.post('/orders/create/', data or {}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def claim(self, locked_until):
+        # An unfinished first attempt at an empty checkout
+        return IdempotencyKey.objects.create(
+            owner=f"user:{self.buyer.pk}", key='order-1',
+            request_hash=hashlib.sha256(json.dumps({}).encode()).hexdigest(),
+            expires_at=timezone.now() + timedelta(hours=1), locked_until=locked_until,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.checkout()
+        retry = self.checkout()
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_another_request_is_refused(self):
+        self.checkout()
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.checkout(data={'email': 'other@example.com'})
+        self.assertEqual(response.status_code, 422)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_retry_during_the_first_attempt_is_turned_away(self):
+        self.claim(locked_until=timezone.now() + timedelta(minutes=1))
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.checkout()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_retry_takes_over_a_claim_whose_lease_ran_out(self):
+        self.claim(locked_until=timezone.now() - timedelta(seconds=1))
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        record = IdempotencyKey.objects.get()
+        self.assertEqual(record.status_code, 201)
+        self.assertGreater(record.locked_until, timezone.now())
+
+
+class BulkUpdateOrderStatusTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        product = create_product(admin)
+        self.orders = [Order.objects.create(user=buyer, product=product, quantity=1, status=Order.PROCESSING)
+                       for _ in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def bulk_update(self, orders, new_status):
+        return self.client.post('/orders/bulk-status/', {'orders': [order.pk for order in orders],
+                                                         'status': new_status}, format='json')
+
+    def status_events(self):
+        return list(OrderEvent.objects.filter(event_type=OrderEvent.STATUS_CHANGED)
+                    .order_by('order_id').values_list('order_id', flat=True))
+
+    def test_orders_move_together(self):
+        response = self.bulk_update(self.orders, Order.READY_TO_SHIP)
+
+        self.assertEqual(response.data['updated'], [order.pk for order in self.orders])
+        self.assertEqual(self.status_events(), [order.pk for order in self.orders])
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {Order.READY_TO_SHIP})
+
+    def test_order_moved_by_another_request_is_a_conflict(self):
+        moved = self.orders[0]
+        can_transition_to = Order.can_transition_to
+
+        def move_concurrently(order, new_status):
+            # Another request moves the order after this one has read it
+            if order.pk == moved.pk:
+                Order.objects.filter(pk=moved.pk).update(status=new_status)
+            return can_transition_to(order, new_status)
+
+        with mock.patch.object(Order, 'can_transition_to', move_concurrently):
+            response = self.bulk_update(self.orders, Order.READY_TO_SHIP)
+
+        self.assertEqual(response.data['updated'], [order.pk for order in self.orders[1:]])
+        self.assertEqual(response.data['conflicts'], [moved.pk])
+        # No event or email on behalf of the other request
+        self.assertEqual(self.status_events(), [order.pk for order in self.orders[1:]])
+
+
+class PurgeTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.product = create_product(self.seller)
+
+    def deleted_events(self):
+        return set(OrderEvent.objects.filter(event_type=OrderEvent.DELETED).values_list('order_id', 'status'))
+
+    def test_purged_product_orders_leave_deleted_events(self):
+        orders = [Order.objects.create(user=self.buyer, product=self.product, quantity=1) for _ in range(3)]
+        orders[0].cancel()
+        Product.objects.filter(pk=self.product.pk).update(deleted_at=timezone.now())
+
+        self.assertEqual(purge_products(batch_size=2), 1)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.deleted_events(), {
+            (orders[0].pk, Order.CANCELLED), (orders[1].pk, Order.PENDING), (orders[2].pk, Order.PENDING),
+        })
+
+    def test_purged_account_orders_leave_deleted_events(self):
+        order = Order.objects.create(user=self.buyer, product=self.product, quantity=1)
+        UserProfile.objects.filter(user=self.buyer).update(deleted_at=timezone.now())
+
+        purge_account(self.buyer.pk)
+
+        self.assertFalse(User.objects.filter(pk=self.buyer.pk).exists())
+        self.assertEqual(self.deleted_events(), {(order.pk, Order.PENDING)})
+
+    def test_deleting_an_order_of_a_deleted_product_restores_its_stock(self):
+        self.product.refresh_from_db()
+        order = Order.objects.create(user=self.buyer, product=self.product, quantity=3)
+        Product.objects.filter(pk=self.product.pk).update(deleted_at=timezone.now())
+
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        response = client.delete(f'/orders/{order.pk}/delete/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(Product.all_objects.values_list('stock', 'units_sold').get(pk=self.product.pk), (10, 0))
+
+
+class ProductAdmissionTests(SimpleTestCase):
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out waiting")
+            time.sleep(0.005)
+
+    def test_full_queue_is_rejected_at_once(self):
+        admission = ProductAdmission(max_in_flight=1, max_queued=0, max_wait=5)
+        admission.acquire(1)
+        with self.assertRaises(AdmissionRejected) as rejected:
+            admission.acquire(1)
+        self.assertEqual(rejected.exception.retry_after, 5)
+
+    def test_waiter_gives_up_after_max_wait(self):
+        admission = ProductAdmission(max_in_flight=1, max_queued=1, max_wait=0.05)
+        admission.acquire(1)
+        with self.assertRaises(AdmissionRejected):
+            admission.acquire(1)
+        # The gate is usable again once the slot is released
+        admission.release(1)
+        admission.acquire(1)
+
+    def test_waiter_woken_after_its_deadline_takes_the_free_slot(self):
+        admission = ProductAdmission(max_in_flight=1, max_queued=5, max_wait=5)
+        admission.acquire(1)
+        results = {}
+
+        def checkout(name):
+            try:
+                admission.acquire(1)
+                results[name] = 'admitted'
+            except AdmissionRejected:
+                results[name] = 'rejected'
+
+        first = threading.Thread(target=checkout, args=('first',))
+        first.start()
+        self.wait_for(lambda: admission._gates[1].waiting == 1)
+        second = threading.Thread(target=checkout, args=('second',))
+        second.start()
+        self.wait_for(lambda: admission._gates[1].waiting == 2)
+
+        # The first waiter gets the release's wakeup only after its deadline
+        offset = [0]
+        real_monotonic = time.monotonic
+        with mock.patch('orders.admission.time.monotonic', lambda: real_monotonic() + offset[0]):
+            offset[0] = 60
+            admission.release(1)
+            first.join(2)
+            self.assertEqual(results, {'first': 'admitted'})
+
+            # ...and the slot moves on to the second waiter without stalling
+            offset[0] = 0
+            admission.release(1)
+            second.join(2)
+
+        self.assertEqual(results, {'first': 'admitted', 'second': 'admitted'})
+        self.assertEqual(admission._gates[1].in_flight, 1)
+
+
+class OrderEventFeedTests(TransactionTestCase):
+    # The feeds only show events of finished transactions, so the tests can't
+    # run inside TestCase's transaction
+
+    def setUp(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def create_event(self, order_id):
+        return OrderEvent.objects.create(order_id=order_id, event_type=OrderEvent.CREATED, status=Order.PENDING)
+
+    def test_pages_follow_the_cursor(self):
+        events = [self.create_event(order_id) for order_id in (1, 2, 3)]
+
+        response = self.client.get('/orders/events/', {'limit': 2})
+        self.assertEqual([event['order'] for event in response.data['events']], [1, 2])
+        response = self.client.get('/orders/events/', {'since': response.data['next_since']})
+        self.assertEqual([event['order'] for event in response.data['events']], [3])
+        events[2].refresh_from_db()
+        self.assertEqual(response.data['next_since'], events[2].cursor)
+
+        # Sequence numbers from before cursors still work
+        response = self.client.get('/orders/events/', {'since': events[0].sequence})
+        self.assertEqual([event['order'] for event in response.data['events']], [2, 3])
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/orders/events/', {'since': 'latest'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_event_committed_late_is_not_skipped(self):
+        started, inserted, written, commit = (threading.Event() for _ in range(4))
+
+        def slow_checkout():
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT txid_current()")
+                    started.set()
+                    inserted.wait(5)
+                    # Gets a higher sequence number than the event below, but commits after it
+                    self.create_event(1)
+                    written.set()
+                    commit.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_checkout)
+        thread.start()
+        started.wait(5)
+        self.create_event(2)
+        inserted.set()
+        self.addCleanup(thread.join)
+        self.addCleanup(commit.set)
+        written.wait(5)
+
+        response = self.client.get('/orders/events/')
+        self.assertEqual(response.data['events'], [])
+        checkpoint = response.data['next_since']
+
+        commit.set()
+        thread.join(5)
+        response = self.client.get('/orders/events/', {'since': checkpoint})
+        self.assertEqual([event['order'] for event in response.data['events']], [1, 2])
+        late, early = response.data['events']
+        self.assertGreater(late['sequence'], early['sequence'])
 
-# Create your tests here.
@@ -11,4 +11,7 @@ urlpatterns = [
     path('orders/<int:order_id>/update/', views.update_order, name='update_order'),  # Update order (PUT/PATCH)
     path('orders/<int:order_id>/delete/', views.delete_order, name='delete_order'),  # Delete order (DELETE)
     path('orders/<int:order_id>/cancel/', views.cancel_order, name='cancel_order'),  # Cancel order (POST)
+    path('orders/bulk-status/', views.bulk_update_order_status, name='bulk_update_order_status'),  # Bulk status change (POST)
+    path('orders/events/', views.order_events, name='order_events'),  # Incremental event feed (GET)
+    path('orders/events/stream/', views.order_event_stream, name='order_event_stream'),  # Server-sent events (GET)
 ]
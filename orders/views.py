@@ -1,74 +1,102 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+import logging
+import time
+from collections import defaultdict
+
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.core.mail import send_mail
+from django.core.exceptions import ValidationError
+from django.core.mail import send_mail, send_mass_mail
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 
 from InventoryNest import settings
+from InventoryNest.renderers import EventStreamRenderer
+from InventoryNest.serialization import extractor_for, requested_fields
+from InventoryNest.tasks import enqueue
 from cart.models import Cart
-from .models import Order
-from .serializers import OrderSerializer
+from cart.utils import get_cart
+from .admission import AdmissionRejected, checkout_admission
+from .idempotency import idempotent
+from .models import Order, OrderEvent
+from .serializers import OrderEventSerializer, OrderSerializer, OrderStatusBulkSerializer
 from products.models import Product
 from django.db import transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+def status_update_email(order):
+    """
+    Build the email telling a customer about the current status of their order.
+    """
+    user_email = order.user.email if order.user else order.guest_email
+    if not user_email:
+        return None
+    return (
+        "Your Order Status Update",
+        (f"Hi {user_email},\n\n"
+         f"Your order for {order.product_name} has been updated to: {order.status}.\n\n"
+         "Thank you for shopping with us!"),
+        settings.EMAIL_HOST_USER,
+        [user_email],
+    )
 
 
 # Create an order (public access - for both authenticated and unauthenticated users)
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@idempotent
 def process_order(request):
     """
     Combines cart checkout and order creation in one function.
     """
     user = request.user if request.user.is_authenticated else None
     guest_email = request.data.get('email') if not user else None
-    session_id = request.session.session_key
-
-    # Ensure the session is valid for unauthenticated users
-    if not session_id:
-        request.session.create()
 
-    # Retrieve cart items
-    try:
-        cart = Cart.objects.get(user=user, session_id=session_id)
-        cart_items = cart.items.select_related('product')
-    except Cart.DoesNotExist:
+    # Retrieve cart items, in product order so concurrent checkouts lock rows in the same order
+    cart = get_cart(request)
+    cart_items = list(cart.items.select_related('product').order_by('product_id')) if cart else []
+    if not cart_items:
         return Response({'error': 'Your cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Validate stock and prepare order data
     order_data = []
-    with transaction.atomic():
-        for item in cart_items:
-            product = item.product
-
-            # Check stock availability
-            if product.stock < item.quantity:
-                return Response({'error': f"Not enough stock for {product.name}."}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Create order
-            order = Order.objects.create(
-                user=user,
-                guest_email=guest_email,
-                product=product,
-                quantity=item.quantity,
-                total_price=product.price * item.quantity,
-                status=Order.PENDING
-            )
-
-            # Deduct stock
-            product.stock -= item.quantity
-            product.save()
-
-            order_data.append({
-                'order_id': order.id,
-                'product_name': product.name,
-                'quantity': item.quantity,
-                'actual_price': product.price,  # Include actual price
-                'total_price': order.total_price,
-                'user': user.username if user else guest_email
-            })
-
-        # Clear the cart
-        cart.items.all().delete()
+    try:
+        # Limit how many checkouts compete for the same products at once
+        with checkout_admission.admit([item.product_id for item in cart_items]), transaction.atomic():
+            for item in cart_items:
+                product = item.product
+
+                # Create the order, this takes the stock or fails if there isn't enough
+                order = Order.objects.create(
+                    user=user,
+                    guest_email=guest_email,
+                    product=product,
+                    quantity=item.quantity,
+                    status=Order.PENDING
+                )
+
+                order_data.append({
+                    'order_id': order.id,
+                    'product_name': product.name,
+                    'quantity': item.quantity,
+                    'actual_price': product.price,  # Include actual price
+                    'total_price': order.total_price,
+                    'user': user.username if user else guest_email
+                })
+
+            # Clear the cart
+            cart.items.all().delete()
+            Cart.recalculate(Cart.objects.filter(pk=cart.pk))
+    except AdmissionRejected as e:
+        return Response({'error': 'This product is in high demand right now. Please try again shortly.'},
+                        status=status.HTTP_429_TOO_MANY_REQUESTS, headers={'Retry-After': str(e.retry_after)})
+    except ValidationError as e:
+        # Out of stock or deleted, nothing was saved, the whole checkout is rolled back
+        return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
 
     # Send notification email
     recipient_email = guest_email if not user else user.email
@@ -93,7 +121,7 @@ def process_order(request):
                 fail_silently=False,
             )
         except Exception as e:
-            print(f"Error sending email: {e}")
+            logger.exception("Error sending email")
             return Response({
                 'message': 'Order processed successfully, but there was an issue sending the confirmation email.',
                 'orders': order_data,
@@ -110,23 +138,34 @@ def process_order(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_orders(request):
-    orders = Order.objects.all()
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    # Only the fields asked for with ?fields= or ?exclude=, and only their columns are read
+    try:
+        fields = requested_fields(request, OrderSerializer)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Serialize straight from the selected columns, output is the same as OrderSerializer
+    extractor = extractor_for(OrderSerializer, fields)
+    orders = extractor.values(Order.objects.all())
+    return Response(extractor(orders), status=status.HTTP_200_OK)
 
 
 # Retrieve a single order (GET request)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def get_order(request, pk):
+def get_order(request, order_id):
     try:
-        order = Order.objects.get(pk=pk)
-    except Order.DoesNotExist:
+        fields = requested_fields(request, OrderSerializer)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    extractor = extractor_for(OrderSerializer, fields)
+    order = extractor.values(Order.objects.filter(pk=order_id)).first()
+    if order is None:
         return Response({'error': "Order not found."},
                         status=status.HTTP_404_NOT_FOUND)
 
-    serializer = OrderSerializer(order)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return Response(extractor([order])[0], status=status.HTTP_200_OK)
 
 
 @api_view(['PUT', 'PATCH'])
@@ -146,54 +185,91 @@ def update_order(request, order_id):
 
     serializer = OrderSerializer(order, data=request.data, partial=True, context={'request': request})
     if serializer.is_valid():
-        # Save the updated order
+        previous_status = order.status
         serializer.save()
 
-        # Notify user about the status update if applicable
-        if 'status' in request.data:
-            status_message = request.data['status']
-
-            # Determine the user's email
-            user_email = order.user.email if order.user else order.guest_email
-
-            if user_email:
-                try:
-                    # Send email notification about the status update
-                    send_mail(
-                        subject="Your Order Status Update",
-                        message=(f"Hi {user_email},\n\n"
-                                 f"Your order for {order.product.name} has been updated to: {status_message}.\n\n"
-                                 "Thank you for shopping with us!"),
-                        from_email=settings.EMAIL_HOST_USER,
-                        recipient_list=[user_email],
-                        fail_silently=False,
-                    )
-                except Exception as e:
-                    # Log email errors for debugging
-                    print(f"Error sending email: {e}")
-
-        # Save the updated order
-        serializer.save()
+        # Notify the user about the status update in the background
+        if order.status != previous_status:
+            email = status_update_email(order)
+            if email:
+                enqueue(send_mass_mail, [email])
+
         return Response(serializer.data, status=status.HTTP_200_OK)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_update_order_status(request):
+    """
+    Move many orders to a new status at once, e.g. from processing to ready_to_ship.
+    """
+    serializer = OrderStatusBulkSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    order_ids = set(serializer.validated_data['orders'])
+    new_status = serializer.validated_data['status']
+    orders = list(Order.objects.select_related('user').filter(pk__in=order_ids))
+
+    # Validate every transition before anything is written
+    errors = {order_id: ["Order not found."] for order_id in order_ids - {order.id for order in orders}}
+    errors.update({
+        order.id: [f"An order cannot move from '{order.status}' to '{new_status}'."]
+        for order in orders if not order.can_transition_to(new_status)
+    })
+    if errors:
+        return Response({'orders': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    orders_by_status = defaultdict(list)
+    for order in orders:
+        orders_by_status[order.status].append(order)
+
+    updated = []
+    with transaction.atomic():
+        for expected_status, group in orders_by_status.items():
+            # Lock the rows still in the expected status, anything moved meanwhile is left alone
+            locked_ids = set(
+                Order.objects.select_for_update().filter(pk__in=[order.id for order in group], status=expected_status)
+                .order_by('pk').values_list('id', flat=True)
+            )
+            Order.objects.filter(pk__in=locked_ids).update(status=new_status, updated_at=timezone.now())
+            updated.extend(order for order in group if order.id in locked_ids)
+
+        OrderEvent.objects.bulk_create([
+            OrderEvent(order=order, event_type=OrderEvent.STATUS_CHANGED, status=new_status) for order in updated
+        ])
+
+        # Notify all affected customers in one batch
+        for order in updated:
+            order.status = new_status
+        emails = [email for email in map(status_update_email, updated) if email]
+        if emails:
+            enqueue(send_mass_mail, emails)
+
+    updated_ids = {order.id for order in updated}
+    return Response({
+        'message': 'Order statuses updated.',
+        'updated': sorted(updated_ids),
+        'conflicts': sorted(order_ids - updated_ids),
+    }, status=status.HTTP_200_OK)
 
 
 # Delete order (DELETE request)
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
-def delete_order(request, pk):
+def delete_order(request, order_id):
     try:
-        order = Order.objects.get(pk=pk)
+        order = Order.objects.get(pk=order_id)
     except Order.DoesNotExist:
         return Response({'error': "Order not found."},
                         status=status.HTTP_404_NOT_FOUND)
 
-    # Add stock back to product when an order is deleted
-    product = order.product
-    product.stock += order.quantity
-    product.save()
+    # Add stock back to product when an order is deleted, unless cancelling it already did
+    if order.status != Order.CANCELLED:
+        Product.all_objects.filter(pk=order.product_id).update(
+            stock=F('stock') + order.quantity, units_sold=F('units_sold') - order.quantity
+        )
 
     # Notify the customer that the order was canceled
     try:
@@ -206,11 +282,12 @@ def delete_order(request, pk):
             "If you have any questions or concerns, please feel free to contact our support team.\n\n"
             "Thank you for your patience and understanding.\n\n"
             "Best regards,\nThe InventoryNest Team."),
+            from_email=settings.EMAIL_HOST_USER,
             recipient_list=[order.user.email],
             fail_silently=False,
         )
-    except Exception as e:
-            print(f"Error sending email: {e}")
+    except Exception:
+            logger.exception("Error sending email")
 
     order.delete()
     return Response({"message": "Order deleted successfully."},
@@ -219,13 +296,13 @@ def delete_order(request, pk):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def cancel_order(request, pk):
+def cancel_order(request, order_id):
     """
     Allow users to cancel their own orders.
     """
     try:
         # Retrieve the order
-        order = Order.objects.get(pk=pk)
+        order = Order.objects.get(pk=order_id)
     except Order.DoesNotExist:
         return Response({'error': "Order not found."},
                         status=status.HTTP_404_NOT_FOUND)
@@ -236,6 +313,12 @@ def cancel_order(request, pk):
             {"error": "You do not have permission to cancel this order."},
             status=status.HTTP_403_FORBIDDEN)
 
+    # Cancel the order, which puts its stock back; only pending orders can be cancelled
+    try:
+        order.cancel()
+    except ValidationError as e:
+        return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+
     # Send an email notification to the product owner
     try:
         send_mail(
@@ -246,11 +329,12 @@ def cancel_order(request, pk):
             "If you have already started processing this order, please contact the user for clarification.\n\n"
             "Thank you for your understanding.\n\n"
             "Best regards,\nThe InventoryNest Team."),
+            from_email=settings.EMAIL_HOST_USER,
             recipient_list=[order.product.user.email],  # Notify the product owner
             fail_silently=False,
         )
-    except Exception as e:
-            print(f"Error sending email: {e}")
+    except Exception:
+            logger.exception("Error sending email")
 
     # Send a confirmation email to the user
     try:
@@ -262,14 +346,12 @@ def cancel_order(request, pk):
             "If this was a mistake or you need further assistance, please contact our support team.\n\n"
             "Thank you for using our service.\n\n"
             "Best regards,\nThe InventoryNest Team."),
+            from_email=settings.EMAIL_HOST_USER,
             recipient_list=[order.user.email],
             fail_silently=False,
         )
-    except Exception as e:
-            print(f"Error sending email: {e}")
-
-    # Delete the order
-    order.delete()
+    except Exception:
+            logger.exception("Error sending email")
 
     return Response(
         {
@@ -277,3 +359,69 @@ def cancel_order(request, pk):
             "Order canceled successfully. Notifications have been sent."
         },
         status=status.HTTP_200_OK)
+
+
+# How often the event feeds look for new events while waiting, in seconds
+EVENT_POLL_INTERVAL = 1
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def order_events(request):
+    """
+    Incremental feed of order events after the ``since`` checkpoint.
+    With ``wait`` the request is held open until new events arrive (long polling).
+    """
+    since = request.query_params.get('since', '0')
+    try:
+        pending = OrderEvent.after(since)
+        limit = min(int(request.query_params.get('limit', 100)), 1000)
+        wait = min(float(request.query_params.get('wait', 0)), 30)
+    except ValueError:
+        return Response({'error': "'since' must be a checkpoint from the feed, 'limit' and 'wait' numbers."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    deadline = time.monotonic() + wait
+    while True:
+        events = list(pending[:limit])
+        if events or time.monotonic() >= deadline:
+            break
+        time.sleep(EVENT_POLL_INTERVAL)
+
+    return Response({
+        'events': OrderEventSerializer(events, many=True).data,
+        'next_since': events[-1].cursor if events else since,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def order_event_stream(request):
+    """
+    Server-sent events stream of order events. Clients resume from the
+    ``Last-Event-ID`` header, or from ``since`` on the first connection.
+    """
+    since = request.headers.get('Last-Event-ID') or request.query_params.get('since', '0')
+    try:
+        OrderEvent.after(since)
+    except ValueError:
+        return Response({'error': "'since' must be a checkpoint from the feed."}, status=status.HTTP_400_BAD_REQUEST)
+
+    def stream(last_cursor):
+        # Each stream holds a worker and a database connection, so it is closed
+        # after a while; EventSource clients reconnect on their own
+        deadline = time.monotonic() + settings.ORDER_EVENT_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            events = list(OrderEvent.after(last_cursor)[:100])
+            for event in events:
+                data = JSONRenderer().render(OrderEventSerializer(event).data).decode()
+                yield f"id: {event.cursor}\nevent: {event.event_type}\ndata: {data}\n\n"
+                last_cursor = event.cursor
+            if not events:
+                yield ": keep-alive\n\n"
+                time.sleep(EVENT_POLL_INTERVAL)
+
+    response = StreamingHttpResponse(stream(since), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
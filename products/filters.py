@@ -0,0 +1,159 @@
+"""
+Product list filters and facet counts.
+
+Every filter maps to an indexed column: price ranges to the price index,
+created_since to the created_at index, shop to the (shop, ...) indexes. The
+in-stock filter is left to the index the list is ordered by; nearly all
+products are in stock, so it rarely skips rows, and indexing stock would
+slow down every checkout that updates it.
+"""
+import hashlib
+import json
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, ExpressionWrapper, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def parse_filters(params):
+    """
+    Read the filters out of the query parameters. Raises ValueError for
+    values that can't be parsed.
+    """
+    filters = {}
+    if params.get('search'):
+        filters['search'] = params['search']
+    for name in ('min_price', 'max_price'):
+        if params.get(name):
+            try:
+                filters[name] = Decimal(params[name])
+            except InvalidOperation:
+                raise ValueError(f"'{name}' must be a number.")
+            if not filters[name].is_finite():
+                raise ValueError(f"'{name}' must be a number.")
+    if params.get('in_stock'):
+        value = params['in_stock'].lower()
+        if value not in TRUE_VALUES + FALSE_VALUES:
+            raise ValueError("'in_stock' must be true or false.")
+        filters['in_stock'] = value in TRUE_VALUES
+    if params.get('shop'):
+        try:
+            filters['shop'] = int(params['shop'])
+        except ValueError:
+            raise ValueError("'shop' must be a shop ID.")
+    if params.get('created_since'):
+        filters['created_since'] = parse_since(params['created_since'])
+    return filters
+
+
+def parse_since(value, name='created_since'):
+    # A date means the start of that day
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValueError(f"'{name}' must be an ISO 8601 date or datetime.")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def price_q(filters):
+    q = Q()
+    if 'min_price' in filters:
+        q &= Q(price__gte=filters['min_price'])
+    if 'max_price' in filters:
+        q &= Q(price__lte=filters['max_price'])
+    return q
+
+
+def stock_q(filters):
+    if 'in_stock' not in filters:
+        return Q()
+    return Q(stock__gt=0) if filters['in_stock'] else Q(stock__lte=0)
+
+
+def base_q(filters):
+    """The filters that facets are counted within."""
+    q = Q()
+    if 'search' in filters:
+        q &= Q(name__icontains=filters['search'])
+    if 'shop' in filters:
+        q &= Q(shop_id=filters['shop'])
+    if 'created_since' in filters:
+        q &= Q(created_at__gte=filters['created_since'])
+    return q
+
+
+def filter_products(queryset, filters):
+    return queryset.filter(base_q(filters) & price_q(filters) & stock_q(filters))
+
+
+def price_buckets():
+    """
+    (min, max) price ranges from PRODUCT_PRICE_BUCKETS, the last one open ended.
+    """
+    bounds = [Decimal(0)] + [Decimal(str(bound)) for bound in settings.PRODUCT_PRICE_BUCKETS] + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def product_facets(queryset, filters):
+    """
+    Product counts per price bucket and in stock or not. Each facet is
+    counted with the other filters applied but not its own, so a client can
+    see what widening that filter would bring. One grouped query gives the
+    counts per (bucket, in stock, within the price filter); the facets are
+    summed up from those few rows. Results are cached for
+    PRODUCT_FACETS_CACHE_TIMEOUT seconds.
+    """
+    key = 'product_facets_' + hashlib.sha256(
+        json.dumps(filters, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    facets = cache.get(key)
+    if facets is not None:
+        return facets
+
+    buckets = price_buckets()
+    groups = {
+        'bucket': Case(*(When(price__lt=high, then=Value(i)) for i, (_, high) in enumerate(buckets[:-1])),
+                       default=Value(len(buckets) - 1)),
+        'in_stock': ExpressionWrapper(Q(stock__gt=0), output_field=BooleanField()),
+    }
+    in_price = price_q(filters)
+    if in_price:
+        groups['in_price'] = ExpressionWrapper(in_price, output_field=BooleanField())
+    rows = (queryset.filter(base_q(filters)).annotate(**groups)
+            .values(*groups).annotate(count=Count('pk')).order_by())
+
+    price_counts = [0] * len(buckets)
+    stock_counts = {True: 0, False: 0}
+    for row in rows:
+        if row['in_stock'] == filters.get('in_stock', row['in_stock']):
+            price_counts[row['bucket']] += row['count']
+        if row.get('in_price', True):
+            stock_counts[row['in_stock']] += row['count']
+
+    facets = {
+        # Bounds formatted like product prices
+        'price': [
+            {'min': f'{low:.2f}', 'max': high and f'{high:.2f}', 'count': count}
+            for (low, high), count in zip(buckets, price_counts)
+        ],
+        'in_stock': {'true': stock_counts[True], 'false': stock_counts[False]},
+    }
+    cache.set(key, facets, settings.PRODUCT_FACETS_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from InventoryNest.purge import purge_deleted
+
+
+class Command(BaseCommand):
+    help = ("Remove deleted accounts, shops and products along with what depends on them. "
+            "Deleting queues this right away; run it periodically, e.g. hourly from cron, "
+            "to finish purges a restart interrupted.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of rows deleted per statement.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        accounts, shops, products = purge_deleted(batch_size=options['batch_size'])
+
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Purged {accounts} accounts, {shops} shops and {products} products "
+                f"in {time.monotonic() - started:.2f}s."
+            ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = ("Delete the records of deleted products that are older than PRODUCT_SYNC_RETENTION_DAYS. "
+            "Run it periodically, e.g. daily from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help="Number of tombstones deleted per statement.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        deleted = purge_tombstones(batch_size=options['batch_size'])
+
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Deleted {deleted} product tombstones in {time.monotonic() - started:.2f}s."
+            ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.popularity import recount_units_sold, refresh_orders_30d
+
+
+class Command(BaseCommand):
+    help = ("Recount the recent orders of every product for ordering by popularity. "
+            "Run it periodically, e.g. every 10 minutes from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of products updated per statement.")
+        parser.add_argument('--recount-units-sold', action='store_true',
+                            help="Also recount units_sold from all orders, e.g. after importing orders.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['recount_units_sold']:
+            recount_units_sold()
+        updated = refresh_orders_30d(batch_size=options['batch_size'])
+
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Updated the popularity of {updated} products in {time.monotonic() - started:.2f}s."
+            ))
@@ -0,0 +1,236 @@
+import io
+import itertools
+import json
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from orders.models import Order
+from products.models import Product
+from products.popularity import recount_units_sold, refresh_orders_30d
+from shop.models import Shop
+from users.models import UserProfile
+
+SHOP_CATEGORIES = ["Electronics", "Fashion", "Home", "Beauty", "Sports", "Toys", "Books", "Grocery"]
+ADJECTIVES = ["Classic", "Compact", "Deluxe", "Eco", "Essential", "Premium", "Smart", "Ultra", "Vintage", "Wireless"]
+NOUNS = ["Backpack", "Blender", "Candle", "Headphones", "Jacket", "Lamp", "Mug", "Sneakers", "Speaker", "Watch"]
+
+# Most orders are old and finished, a few are still moving through the pipeline
+ORDER_STATUSES = [Order.DELIVERED, Order.CANCELLED, Order.PENDING, Order.PROCESSING,
+                  Order.READY_TO_SHIP, Order.OUT_FOR_DELIVERY]
+ORDER_STATUS_WEIGHTS = [70, 8, 8, 6, 4, 4]
+
+
+class Command(BaseCommand):
+    help = ("Fill the database with synthetic users, shops, products, carts and orders. "
+            "The same --seed always produces the same data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--shops', type=int, default=100, help="Shops, each owned by one of the users.")
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--carts', type=int, default=500, help="Users with a filled cart.")
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, also used to name the rows.")
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help="Zipf exponent of product popularity; higher means a few products get most orders.")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Rows per INSERT or COPY.")
+        parser.add_argument('--no-copy', action='store_true',
+                            help="Use bulk_create even on PostgreSQL instead of COPY.")
+
+    def handle(self, *args, **options):
+        if options['shops'] > options['users'] or options['carts'] > options['users']:
+            raise CommandError("--shops and --carts can't be more than --users.")
+        if options['shops'] < 1 and options['products']:
+            raise CommandError("Products need at least one shop.")
+        if options['products'] < 1 and (options['carts'] or options['orders']):
+            raise CommandError("Carts and orders need at least one product.")
+
+        self.verbosity = options['verbosity']
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        self.now = timezone.now()
+        prefix = f"seed{options['seed']}"
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Data for seed {options['seed']} already exists; pick another --seed.")
+
+        started = time.monotonic()
+        total = 0
+        user_ids = self.seed_users(prefix, options['users'])
+        total += self._report("users", len(user_ids), started)
+
+        step = time.monotonic()
+        shops = self.seed_shops(prefix, user_ids[:options['shops']])
+        total += self._report("shops", len(shops), step)
+
+        step = time.monotonic()
+        products = self.seed_products(prefix, shops, options['products'])
+        total += self._report("products", len(products), step)
+
+        # A few products get most of the attention, the long tail hardly any
+        popularity = products[:]
+        self.rng.shuffle(popularity)
+        cum_weights = list(itertools.accumulate(1 / rank ** options['zipf'] for rank in range(1, len(popularity) + 1)))
+
+        def popular(k):
+            return self.rng.choices(popularity, cum_weights=cum_weights, k=k)
+
+        step = time.monotonic()
+        items = self.seed_carts(user_ids[-options['carts']:] if options['carts'] else [], popular)
+        total += self._report("carts and cart items", items, step)
+
+        step = time.monotonic()
+        orders = self.seed_orders(prefix, user_ids, options['orders'], popular)
+        total += self._report("orders", orders, step)
+
+        # Orders skipped Order.save, so count the products' sales from them
+        step = time.monotonic()
+        recount_units_sold(self.batch_size)
+        refresh_orders_30d()
+        self._report("product popularity", len(products), step)
+
+        elapsed = time.monotonic() - started
+        if self.verbosity:
+            self.stdout.write(self.style.SUCCESS(
+                f"Seeded {total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} rows/s)"
+                f"{' using COPY' if self.use_copy else ''}."
+            ))
+
+    def seed_users(self, prefix, count):
+        # Password hashing is deliberately slow, so every seeded user shares one hash
+        password = make_password('password')
+        last_id = User.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        self._insert(User, ['username', 'email', 'password', 'first_name', 'last_name', 'is_staff',
+                            'is_active', 'is_superuser', 'date_joined'],
+                     ((f'{prefix}_user{i}', f'{prefix}_user{i}@example.com', password, '', '',
+                       False, True, False, self.now) for i in range(count)))
+        user_ids = list(User.objects.filter(id__gt=last_id, username__startswith=f'{prefix}_')
+                        .order_by('id').values_list('id', flat=True))
+        # Inserted directly, so the post_save signal didn't create the profiles
+        self._insert(UserProfile, ['user_id'], ((user_id,) for user_id in user_ids))
+        return user_ids
+
+    def seed_shops(self, prefix, owner_ids):
+        rng = self.rng
+        self._insert(Shop, ['owner_id', 'shop_name', 'shop_description', 'shop_category', 'business_address',
+                            'email', 'terms_accepted', 'is_active', 'logo_variants', 'cover_image_variants',
+                            'created_at', 'updated_at'],
+                     ((owner_id, f"{prefix} Shop {i}", f"Everything {rng.choice(NOUNS).lower()}.",
+                       rng.choice(SHOP_CATEGORIES), f"{rng.randint(1, 999)} Market Street",
+                       f'{prefix}_shop{i}@example.com', True, rng.random() < 0.9, {}, {}, self.now, self.now)
+                      for i, owner_id in enumerate(owner_ids)))
+        return list(Shop.objects.filter(owner_id__in=owner_ids).order_by('owner_id').values_list('id', 'owner_id'))
+
+    def seed_products(self, prefix, shops, count):
+        rng = self.rng
+        # Shop sizes are skewed too: a few big shops and many small ones
+        shop_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(shops) + 1)))
+        last_id = Product.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        def rows():
+            for i in range(count):
+                # Prices cluster around 20-50 with a long tail of expensive items
+                price = Decimal(min(9999999, round(rng.lognormvariate(3.4, 1.0) * 100))) / 100 or Decimal('0.99')
+                stock = 0 if rng.random() < 0.05 else rng.randint(1, 500)
+                shop_id, owner_id = rng.choices(shops, cum_weights=shop_weights)[0]
+                # Listed at some point over the past year
+                created_at = self.now - timedelta(seconds=rng.randrange(365 * 24 * 60 * 60))
+                yield (f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {prefix}-{i}", "Synthetic product.",
+                       price, stock, owner_id, shop_id, 0, 0, created_at, created_at)
+        self._insert(Product, ['name', 'description', 'price', 'stock', 'user_id', 'shop_id', 'units_sold',
+                               'orders_30d', 'created_at', 'updated_at'], rows())
+        return list(Product.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'name', 'price'))
+
+    def seed_carts(self, user_ids, popular):
+        last_id = Cart.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        Cart.objects.bulk_create((Cart(user_id=user_id) for user_id in user_ids), batch_size=self.batch_size)
+        carts = Cart.objects.filter(id__gt=last_id)
+
+        def rows():
+            for cart_id in carts.order_by('id').values_list('id', flat=True):
+                # A cart holds a handful of distinct products
+                picked = {product[0] for product in popular(self.rng.randint(1, 5))}
+                for product_id in sorted(picked):
+                    yield cart_id, product_id, self.rng.randint(1, 3)
+        items = self._insert(CartItem, ['cart_id', 'product_id', 'quantity'], rows())
+        Cart.recalculate(carts)
+        return len(user_ids) + items
+
+    def seed_orders(self, prefix, user_ids, count, popular):
+        rng = self.rng
+
+        def rows():
+            for start in range(0, count, self.batch_size):
+                size = min(self.batch_size, count - start)
+                for (product_id, name, price), status in zip(
+                        popular(size), rng.choices(ORDER_STATUSES, weights=ORDER_STATUS_WEIGHTS, k=size)):
+                    quantity = rng.randint(1, 3)
+                    # One in ten orders is a guest checkout
+                    if rng.random() < 0.1:
+                        user_id, guest_email = None, f'{prefix}_guest{rng.randint(1, 10 ** 6)}@example.com'
+                    else:
+                        user_id, guest_email = rng.choice(user_ids), None
+                    # Placed over the past 90 days
+                    created_at = self.now - timedelta(seconds=rng.randrange(90 * 24 * 60 * 60))
+                    yield (user_id, guest_email, product_id, quantity, price * quantity, name, price, status,
+                           created_at, created_at)
+        # Inserted directly, so Order.save doesn't deduct stock or write order events
+        return self._insert(Order, ['user_id', 'guest_email', 'product_id', 'quantity', 'total_price',
+                                    'product_name', 'unit_price', 'status', 'created_at', 'updated_at'], rows())
+
+    def _insert(self, model, fields, rows):
+        """
+        Insert `rows` (tuples in `fields` order) in batches and return how many
+        were written. Uses COPY on PostgreSQL, bulk_create elsewhere.
+        """
+        inserted = 0
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return inserted
+            if self.use_copy:
+                self._copy(model, fields, batch)
+            else:
+                model.objects.bulk_create([model(**dict(zip(fields, row))) for row in batch])
+            inserted += len(batch)
+
+    def _copy(self, model, fields, batch):
+        columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+        sql = f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN"
+        data = ''.join('\t'.join(map(_copy_value, row)) + '\n' for row in batch)
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, 'copy'):
+                # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(data)
+            else:
+                raw.copy_expert(sql, io.StringIO(data))
+
+    def _report(self, label, rows, started):
+        elapsed = time.monotonic() - started
+        rate = rows / elapsed if elapsed else 0
+        if self.verbosity:
+            self.stdout.write(f"{label}: {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+        return rows
+
+
+def _copy_value(value):
+    """Format a value for COPY's text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, dict):
+        value = json.dumps(value)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Max, OuterRef, Subquery
+
+BATCH_SIZE = 10000
+
+
+def backfill_product_shop(apps, schema_editor):
+    """
+    Point existing products at their owner's shop, one id range at a time.
+    """
+    Product = apps.get_model('products', 'Product')
+    Shop = apps.get_model('shop', 'Shop')
+
+    shop = Shop.objects.filter(owner=OuterRef('user_id')).values('id')[:1]
+    last_id = Product.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    for start in range(0, last_id, BATCH_SIZE):
+        Product.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE, shop__isnull=True).update(
+            shop=Subquery(shop),
+        )
+
+
+class Migration(migrations.Migration):
+
+    # Every batch is committed on its own so the table is never locked as a whole
+    atomic = False
+
+    dependencies = [
+        ('products', '0002_product_shop'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_shop, migrations.RunPython.noop),
+    ]
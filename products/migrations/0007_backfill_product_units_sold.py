@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 10000
+
+
+def backfill_units_sold(apps, schema_editor):
+    """
+    Count the units of every product's orders that weren't cancelled, one
+    id range at a time. orders_30d is filled in by refresh_popularity.
+    """
+    Product = apps.get_model('products', 'Product')
+    Order = apps.get_model('orders', 'Order')
+
+    units = (Order.objects.filter(product=OuterRef('pk')).exclude(status='cancelled')
+             .values('product').annotate(units=Sum('quantity')).values('units'))
+    last_id = Product.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    for start in range(0, last_id, BATCH_SIZE):
+        Product.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE).update(
+            units_sold=Coalesce(Subquery(units), 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    # Every batch is committed on its own so the table is never locked as a whole
+    atomic = False
+
+    dependencies = [
+        ('products', '0006_product_popularity'),
+        ('orders', '0008_order_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_units_sold, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import F, Max
+
+BATCH_SIZE = 10000
+
+
+def backfill_version(apps, schema_editor):
+    """
+    Give existing products versions in id order. Ids are far below the
+    nanosecond timestamps new saves take, so every later change sorts after
+    them.
+    """
+    Product = apps.get_model('products', 'Product')
+    last_id = Product.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    for start in range(0, last_id, BATCH_SIZE):
+        Product.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE, version=0).update(version=F('id'))
+
+
+class Migration(migrations.Migration):
+
+    # Every batch is committed on its own so the table is never locked as a whole
+    atomic = False
+
+    dependencies = [
+        ('products', '0010_product_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_version, migrations.RunPython.noop),
+    ]
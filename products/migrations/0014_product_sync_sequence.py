@@ -0,0 +1,52 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_product_soft_delete'),
+    ]
+
+    operations = [
+        # Catalog versions come from a sequence. Existing rows keep their
+        # versions and all get the migration's txid, so they sort before
+        # every later change
+        migrations.RunSQL(
+            "CREATE SEQUENCE product_version_seq",
+            "DROP SEQUENCE product_version_seq",
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_version_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='txid',
+            field=models.BigIntegerField(db_default=models.Func(function='txid_current', output_field=models.BigIntegerField())),
+        ),
+        migrations.AddField(
+            model_name='producttombstone',
+            name='txid',
+            field=models.BigIntegerField(db_default=models.Func(function='txid_current', output_field=models.BigIntegerField())),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='version',
+            field=models.BigIntegerField(db_default=models.Func(models.Value('product_version_seq'), function='nextval', output_field=models.BigIntegerField())),
+        ),
+        migrations.AlterField(
+            model_name='producttombstone',
+            name='version',
+            field=models.BigIntegerField(db_default=models.Func(models.Value('product_version_seq'), function='nextval', output_field=models.BigIntegerField())),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['txid', 'version'], name='product_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producttombstone',
+            index=models.Index(fields=['txid', 'version'], name='producttombstone_sync_idx'),
+        ),
+    ]
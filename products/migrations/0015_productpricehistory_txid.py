@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_sync_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productpricehistory',
+            name='txid',
+            field=models.BigIntegerField(db_default=models.Func(function='txid_current', output_field=models.BigIntegerField()), editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='productpricehistory',
+            index=models.Index(fields=['txid', 'sequence'], name='productpricehistory_feed_idx'),
+        ),
+    ]
@@ -1,5 +1,27 @@
-from django.db import models
+import time
+
+from django.db import connection, models, transaction
+from django.db.models import Func, Value
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+
+from InventoryNest import feeds
+from InventoryNest.soft_delete import SoftDeleteManager
+
+# Database default of the version columns, see next_version()
+NEXT_VERSION = Func(Value('product_version_seq'), function='nextval', output_field=models.BigIntegerField())
+
+
+def next_version():
+    """
+    A catalog version number for a product or tombstone row, from the
+    product_version_seq sequence, with the current transaction's id: a
+    (txid, version) pair. Call it in the transaction that writes the row.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_current(), nextval('product_version_seq')")
+        return cursor.fetchone()
 
 
 class Product(models.Model):
@@ -10,6 +32,127 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
+    shop = models.ForeignKey('shop.Shop', on_delete=models.CASCADE, related_name='products', null=True, blank=True)
+    # Popularity: units in orders that weren't cancelled, kept up to date by
+    # checkout and cancellation, and orders over the last
+    # PRODUCT_POPULARITY_WINDOW_DAYS, recounted by refresh_popularity
+    units_sold = models.IntegerField(default=0)
+    orders_30d = models.IntegerField(default=0)
+    # Catalog sync: set from next_version() on every save, and by the database
+    # for rows inserted directly. Stock and counter updates by orders leave
+    # them alone
+    version = models.BigIntegerField(db_default=NEXT_VERSION)
+    txid = models.BigIntegerField(db_default=feeds.current_txid())
+    # Set when the product is deleted, see InventoryNest.soft_delete
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
+    # Only ever changed with UPDATE ... SET x = x + n
+    COUNTER_FIELDS = ('units_sold', 'orders_30d')
+
+    class Meta:
+        indexes = [
+            # Storefront pages list a shop's products newest first
+            models.Index(fields=['shop', 'created_at'], name='product_shop_created_idx'),
+            # List filters and ordering (products.filters)
+            models.Index(fields=['created_at'], name='product_created_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['shop', 'price'], name='product_shop_price_idx'),
+            # ?ordering=-popularity
+            models.Index(fields=['orders_30d', 'id'], name='product_popularity_idx'),
+            # Catalog sync reads changes in (txid, version) order
+            models.Index(fields=['txid', 'version'], name='product_sync_idx'),
+            # The purge looks up deleted products; the index holds only those
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted_at__isnull=False),
+                         name='product_deleted_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # A full save of a loaded product must not write back counters that
+        # checkouts have moved on since
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        elif kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = [*kwargs['update_fields'], 'version', 'txid']
+        with transaction.atomic():
+            self.txid, self.version = next_version()
+            super().save(*args, **kwargs)
+
+    @staticmethod
+    def hide(queryset):
+        """
+        Soft-delete the products of `queryset`. The same UPDATE moves them to
+        a new catalog version, so the next sync reports them deleted.
+        """
+        return queryset.update(deleted_at=timezone.now(), version=NEXT_VERSION, txid=feeds.current_txid())
+
+    @staticmethod
+    def top_sellers_cache_key(limit):
+        """
+        Cache key of the top sellers list. Keys include a version, so
+        `invalidate_top_sellers` drops the lists of every length at once.
+        The version is only seen by every process when the cache is shared.
+        """
+        version = cache.get_or_set("top_sellers_version", time.time_ns, None)
+        return f"top_sellers_{version}_{limit}"
+
+    @staticmethod
+    def invalidate_top_sellers():
+        cache.set("top_sellers_version", time.time_ns(), None)
+
+
+class ProductPriceHistory(models.Model):
+    """
+    One row per change of a product's price, written by ProductsSerializer.
+    """
+    sequence = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history')
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Transaction that made the change, the feed reads in (txid, sequence) order
+    txid = models.BigIntegerField(db_default=feeds.current_txid(), editable=False)
+
+    class Meta:
+        ordering = ['sequence']
+        indexes = [
+            models.Index(fields=['txid', 'sequence'], name='productpricehistory_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.sequence} {self.product_id}: {self.old_price} -> {self.price}"
+
+    @staticmethod
+    def settled():
+        """
+        Changes of transactions that have ended, in commit-safe order (see InventoryNest.feeds).
+        """
+        return feeds.settled(ProductPriceHistory.objects)
+
+
+class ProductTombstone(models.Model):
+    """
+    A deleted product, kept for PRODUCT_SYNC_RETENTION_DAYS so that syncing
+    clients learn about the deletion. Written when a product row is deleted,
+    including by cascades (see products.signals).
+    """
+    product_id = models.BigIntegerField()
+    version = models.BigIntegerField(db_default=NEXT_VERSION)
+    txid = models.BigIntegerField(db_default=feeds.current_txid())
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'version'], name='producttombstone_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} deleted at {self.deleted_at}"
@@ -0,0 +1,60 @@
+"""
+Product popularity counters.
+
+`units_sold` is kept up to date by checkout and cancellation (see
+`Order.save`). `orders_30d` ranks the product list and the top sellers; it is
+recounted by the refresh_popularity command, since updating an indexed column
+on every checkout would make every stock update rewrite the product's index
+entries.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product
+
+
+def refresh_orders_30d(batch_size=1000, now=None):
+    """
+    Recount the orders of the last PRODUCT_POPULARITY_WINDOW_DAYS per product
+    with one grouped query, and write only the counters that changed, in
+    batches. Returns the number of products updated.
+    """
+    from orders.models import Order
+
+    since = (now or timezone.now()) - timedelta(days=settings.PRODUCT_POPULARITY_WINDOW_DAYS)
+    counts = dict(
+        Order.objects.filter(created_at__gte=since).exclude(status=Order.CANCELLED)
+        .values('product').annotate(count=Count('pk')).order_by().values_list('product', 'count')
+    )
+    # Products that were counted before and may have dropped out of the window
+    current = dict(Product.objects.filter(orders_30d__gt=0).values_list('id', 'orders_30d'))
+
+    changed = [
+        Product(pk=product_id, orders_30d=counts.get(product_id, 0))
+        for product_id in current.keys() | counts.keys()
+        if counts.get(product_id, 0) != current.get(product_id, 0)
+    ]
+    Product.objects.bulk_update(changed, ['orders_30d'], batch_size=batch_size)
+    if changed:
+        Product.invalidate_top_sellers()
+    return len(changed)
+
+
+def recount_units_sold(batch_size=10000):
+    """
+    Recount units_sold from the orders, one id range at a time. Only needed
+    when orders were written without going through Order.save.
+    """
+    from orders.models import Order
+
+    units = (Order.objects.filter(product=OuterRef('pk')).exclude(status=Order.CANCELLED)
+             .values('product').annotate(units=Sum('quantity')).values('units'))
+    last_id = Product.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    for start in range(0, last_id, batch_size):
+        Product.objects.filter(id__gt=start, id__lte=start + batch_size).update(
+            units_sold=Coalesce(Subquery(units), 0),
+        )
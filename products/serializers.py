@@ -1,5 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Product
+from .models import Product, ProductPriceHistory
+from cart.models import Cart
+from shop.models import Shop
 
 
 class ProductsSerializer(serializers.ModelSerializer):
@@ -9,5 +12,32 @@ class ProductsSerializer(serializers.ModelSerializer):
         model = Product
         fields = [
             'id', 'name', 'description', 'price', 'stock', 'created_at',
-            'updated_at', 'user'
+            'updated_at', 'user', 'shop', 'units_sold', 'orders_30d'
         ]
+        read_only_fields = ['shop', 'units_sold', 'orders_30d']
+
+    # Lookups for the lean list path (InventoryNest.serialization)
+    lean_sources = {'user': 'user__username'}
+
+    def create(self, validated_data):
+        product = super().create(validated_data)
+        Shop.invalidate_storefront(product.shop_id)
+        return product
+
+    def update(self, instance, validated_data):
+        old_price = instance.price
+        with transaction.atomic():
+            product = super().update(instance, validated_data)
+            if product.price != old_price:
+                # Record the change for the price feed, only when the price really changed
+                ProductPriceHistory.objects.create(product=product, old_price=old_price, price=product.price)
+                # Subtotals of carts holding this product are now stale
+                Cart.recalculate(Cart.objects.filter(items__product=product))
+        Shop.invalidate_storefront(product.shop_id)
+        return product
+
+
+class ProductPriceChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductPriceHistory
+        fields = ['sequence', 'product', 'price', 'changed_at']
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Product, ProductTombstone
+
+
+@receiver(post_delete, sender=Product)
+def record_tombstone(sender, instance, **kwargs):
+    # Also runs for products deleted along with their shop or owner, in the
+    # deleting transaction; the database stamps the version and txid
+    ProductTombstone.objects.create(product_id=instance.pk)
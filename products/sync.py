@@ -0,0 +1,115 @@
+"""
+Incremental catalog sync.
+
+Every product save stamps the row with the writing transaction's id and a
+new `version` from a database sequence (see `next_version`), and every
+deletion leaves a `ProductTombstone` stamped the same way. A client keeps the
+token of its last sync and asks for what changed since: the products saved
+after it, and the ids of those deleted after it, in (txid, version) order,
+up to the commit-safe horizon of InventoryNest.feeds. Reading them is two
+index range scans, so a sync costs O(changes) rather than a walk over the
+whole catalog.
+
+Tokens are opaque to clients. They hold the (txid, version) position synced
+up to and the time they were issued. Tokens from before transaction ids
+were recorded are treated as expired. Tombstones are kept for PRODUCT_SYNC_RETENTION_DAYS,
+so a token older than that may have missed deletions and is refused; the
+client then starts over without a token.
+
+Deleting a product moves it to a new version along with its `deleted_at`
+(see `Product.hide`), so it drops out of the upserts and is reported as
+deleted by the next sync; its tombstone reports it once more when it is
+purged.
+
+Stock, units_sold and orders_30d change with every order and don't move the
+version; clients that need them current read them from the product endpoints.
+"""
+import base64
+import binascii
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from InventoryNest import feeds
+from .models import Product, ProductTombstone
+
+
+class TokenExpired(Exception):
+    pass
+
+
+def encode_token(position, issued=None):
+    txid, version = position
+    raw = f'{txid}.{version}.{int(time.time()) if issued is None else issued}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """
+    The (txid, version) position a token was synced up to. Raises ValueError
+    for tokens that can't be read and TokenExpired for tokens that are too old.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        parts = [int(part) for part in raw.split('.')]
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid sync token.")
+    if len(parts) == 2:
+        # A version and issue time, from before versions were commit-ordered
+        raise TokenExpired("The sync token has expired, sync again without a token.")
+    if len(parts) != 3:
+        raise ValueError("Invalid sync token.")
+    txid, version, issued = parts
+    if issued < time.time() - settings.PRODUCT_SYNC_RETENTION_DAYS * 24 * 60 * 60:
+        raise TokenExpired("The sync token has expired, sync again without a token.")
+    return txid, version
+
+
+def changes(since, limit, columns):
+    """
+    Up to `limit` changes after the (txid, version) position `since`: (rows
+    of the changed products' `columns`, deleted product ids, position synced
+    up to, whether more changes are waiting).
+
+    Only changes of transactions that have ended are read, so one that
+    commits later sorts after the returned position.
+    """
+    below = feeds.horizon()
+    window = feeds.after(*since, sequence='version')
+    rows = list(feeds.settled(Product.objects.filter(window), 'version', below)
+                .values('txid', 'version', *columns)[:limit])
+    # Products deleted but not purged yet, and those purged
+    tombstones = sorted(
+        list(feeds.settled(Product.all_objects.filter(window, deleted_at__isnull=False), 'version', below)
+             .values_list('txid', 'version', 'id')[:limit])
+        + list(feeds.settled(ProductTombstone.objects.filter(window), 'version', below)
+               .values_list('txid', 'version', 'product_id')[:limit])
+    )[:limit]
+    if len(rows) + len(tombstones) < limit:
+        # Everything below the horizon has been read; versions start at 1
+        return rows, [product_id for _, _, product_id in tombstones], max(since, (below, 0)), False
+
+    # Keep the `limit` oldest changes of both kinds
+    merged = sorted([((row['txid'], row['version']), row) for row in rows]
+                    + [((txid, version), product_id) for txid, version, product_id in tombstones],
+                    key=lambda change: change[0])[:limit]
+    return ([change for _, change in merged if isinstance(change, dict)],
+            [change for _, change in merged if not isinstance(change, dict)],
+            merged[-1][0], True)
+
+
+def purge_tombstones(batch_size=10000, now=None):
+    """
+    Delete tombstones older than PRODUCT_SYNC_RETENTION_DAYS, one batch at a
+    time. Returns the number deleted.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=settings.PRODUCT_SYNC_RETENTION_DAYS)
+    deleted = 0
+    while True:
+        ids = list(ProductTombstone.objects.filter(deleted_at__lt=cutoff)
+                   .values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += ProductTombstone.objects.filter(id__in=ids).delete()[0]
@@ -1,3 +1,279 @@
-from django.test import TestCase
+import base64
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from orders.models import Order
+from shop.models import Shop
+from . import sync
+from .models import Product, ProductPriceHistory
+from .popularity import recount_units_sold, refresh_orders_30d
+
+
+class CatalogSyncTests(TransactionTestCase):
+    # Sync only reads changes of finished transactions, so the tests can't run
+    # inside TestCase's transaction
+
+    def setUp(self):
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.client = APIClient()
+
+    def create_product(self, name):
+        return Product.objects.create(user=self.seller, name=name, description='A product', price='10.00', stock=1)
+
+    def sync(self, token=None):
+        response = self.client.get('/products/sync/', {'token': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_and_deletions_since_the_token(self):
+        lamp, chair = self.create_product('Lamp'), self.create_product('Chair')
+        data = self.sync()
+        self.assertEqual([product['name'] for product in data['products']], ['Lamp', 'Chair'])
+
+        lamp.name = 'Desk lamp'
+        lamp.save()
+        Product.all_objects.filter(pk=chair.pk).delete()
+        data = self.sync(data['token'])
+        self.assertEqual([product['name'] for product in data['products']], ['Desk lamp'])
+        self.assertEqual(data['deleted'], [chair.pk])
+
+        data = self.sync(data['token'])
+        self.assertEqual((data['products'], data['deleted'], data['has_more']), ([], [], False))
+
+    def test_deletion_is_reported_before_the_purge(self):
+        lamp, chair = self.create_product('Lamp'), self.create_product('Chair')
+        token = self.sync()['token']
+
+        self.client.force_authenticate(self.seller)
+        with mock.patch('products.views.enqueue') as enqueue:
+            response = self.client.delete(f'/products/{chair.pk}/delete/')
+        self.assertEqual(response.status_code, 204)
+        enqueue.assert_called_once()
+
+        data = self.sync(token)
+        self.assertEqual((data['products'], data['deleted']), ([], [chair.pk]))
+        self.assertEqual(self.sync(data['token'])['deleted'], [])
+
+    def test_change_committed_late_is_not_skipped(self):
+        lamp = self.create_product('Lamp')
+        started, saved, commit = threading.Event(), threading.Event(), threading.Event()
+
+        def slow_edit():
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT txid_current()")
+                    started.set()
+                    saved.wait(5)
+                    # Takes a higher version than the chair below, but commits after it
+                    Product.objects.filter(pk=lamp.pk).first().save()
+                    commit.wait(5)
+            finally:
+                connection.close()
+
+        token = self.sync()['token']
+        thread = threading.Thread(target=slow_edit)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(commit.set)
+        started.wait(5)
+        self.create_product('Chair')
+        saved.set()
+
+        data = self.sync(token)
+        self.assertEqual(data['products'], [])
+
+        commit.set()
+        thread.join(5)
+        data = self.sync(data['token'])
+        self.assertEqual([product['name'] for product in data['products']], ['Lamp', 'Chair'])
+
+    def test_tokens_from_before_transaction_ordering_are_expired(self):
+        # A version and the issue time
+        token = base64.urlsafe_b64encode(f'123.{int(time.time())}'.encode()).decode()
+        with self.assertRaises(sync.TokenExpired):
+            sync.decode_token(token)
+        self.assertEqual(sync.decode_token(sync.encode_token((45, 123))), (45, 123))
+
+
+class PriceChangeFeedTests(TransactionTestCase):
+    def setUp(self):
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.lamp, self.chair = (
+            Product.objects.create(user=seller, name=name, description='A product', price='10.00', stock=1)
+            for name in ('Lamp', 'Chair')
+        )
+        self.client = APIClient()
+
+    def change_price(self, product, price):
+        ProductPriceHistory.objects.create(product=product, old_price=product.price, price=price)
+
+    def test_latest_change_of_each_product_after_the_checkpoint(self):
+        self.change_price(self.lamp, '12.00')
+        self.change_price(self.chair, '20.00')
+        self.change_price(self.lamp, '14.00')
+
+        data = self.client.get('/products/changes/').data
+        self.assertEqual([(change['product'], change['price']) for change in data['changes']],
+                         [(self.chair.pk, '20.00'), (self.lamp.pk, '14.00')])
+
+        self.change_price(self.chair, '22.00')
+        data = self.client.get('/products/changes/', {'since': data['next_since']}).data
+        self.assertEqual([(change['product'], change['price']) for change in data['changes']],
+                         [(self.chair.pk, '22.00')])
+
+        data = self.client.get('/products/changes/', {'since': data['next_since']}).data
+        self.assertEqual(data['changes'], [])
+
+
+class ProductFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.shop, other_shop = [
+            Shop.objects.create(owner=owner, shop_name=owner.username, shop_description='Shop', shop_category='Home',
+                                business_address='Street 1', email=owner.email, is_active=True)
+            for owner in (seller, other)
+        ]
+        for owner, shop, name, price, stock in (
+            (seller, self.shop, 'Candle', '5.00', 3),
+            (seller, self.shop, 'Lamp', '20.00', 0),
+            (seller, self.shop, 'Chair', '60.00', 2),
+            (other, other_shop, 'Rug', '30.00', 1),
+            (other, other_shop, 'Sofa', '600.00', 0),
+        ):
+            Product.objects.create(user=owner, shop=shop, name=name, description=name, price=price, stock=stock)
+        Product.objects.filter(name='Candle').update(created_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+    def names(self, **params):
+        response = self.client.get('/products/', {'ordering': 'price', **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']]
+
+    def test_price_range(self):
+        self.assertEqual(self.names(min_price='20', max_price='60'), ['Lamp', 'Rug', 'Chair'])
+        self.assertEqual(self.names(min_price='100'), ['Sofa'])
+
+    def test_in_stock(self):
+        self.assertEqual(self.names(in_stock='true'), ['Candle', 'Rug', 'Chair'])
+        self.assertEqual(self.names(in_stock='no'), ['Lamp', 'Sofa'])
+
+    def test_shop(self):
+        self.assertEqual(self.names(shop=self.shop.pk), ['Candle', 'Lamp', 'Chair'])
+
+    def test_created_since(self):
+        self.assertEqual(self.names(created_since='2024-01-01'), ['Lamp', 'Rug', 'Chair', 'Sofa'])
+        self.assertEqual(self.names(created_since='2019-12-31T23:00:00Z', max_price='10'), ['Candle'])
+
+    def test_invalid_values_are_rejected(self):
+        for params in ({'min_price': 'cheap'}, {'max_price': 'NaN'}, {'in_stock': 'maybe'}, {'shop': 'x'},
+                       {'created_since': 'yesterday'}):
+            with self.subTest(**params), self.assertLogs('django.request', 'WARNING'):
+                self.assertEqual(self.client.get('/products/', params).status_code, 400)
+
+    def test_facets_ignore_their_own_filter(self):
+        response = self.client.get('/products/', {'min_price': '10', 'max_price': '100', 'in_stock': 'true',
+                                                  'facets': 'true'})
+        self.assertEqual(response.data['count'], 2)
+        facets = response.data['facets']
+
+        # Price buckets count the in-stock products at every price
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 0, 1, 1, 0, 0, 0])
+        self.assertEqual(facets['price'][0], {'min': '0.00', 'max': '10.00', 'count': 1})
+        self.assertEqual(facets['price'][-1], {'min': '500.00', 'max': None, 'count': 0})
+        # Stock counts take products in the price range, in stock or not
+        self.assertEqual(facets['in_stock'], {'true': 2, 'false': 1})
+
+    def test_facets_follow_the_other_filters(self):
+        response = self.client.get('/products/', {'shop': self.shop.pk, 'facets': 'true'})
+        facets = response.data['facets']
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 1, 0, 1, 0, 0, 0])
+        self.assertEqual(facets['in_stock'], {'true': 2, 'false': 1})
+
+
+class PopularityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.lamp, self.chair, self.rug = [
+            Product.objects.create(user=seller, name=name, description=name, price=Decimal('10.00'), stock=10)
+            for name in ('Lamp', 'Chair', 'Rug')
+        ]
+
+    def order(self, product, quantity=1, days_ago=0):
+        order = Order.objects.create(user=self.buyer, product=product, quantity=quantity)
+        if days_ago:
+            Order.objects.filter(pk=order.pk).update(created_at=datetime.now(timezone.utc) - timedelta(days=days_ago))
+        return order
+
+    def counters(self, product, *fields):
+        return Product.objects.values_list(*fields).get(pk=product.pk)
+
+    def top(self, **params):
+        response = self.client.get('/products/top/', params)
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data]
+
+    def test_checkout_and_cancel_move_units_sold(self):
+        first = self.order(self.lamp, 3)
+        self.order(self.lamp, 2)
+        self.assertEqual(self.counters(self.lamp, 'units_sold', 'stock'), (5, 5))
+
+        first.cancel()
+        self.assertEqual(self.counters(self.lamp, 'units_sold', 'stock'), (2, 8))
+        # Cancelled orders aren't taken out twice
+        first.save()
+        self.assertEqual(self.counters(self.lamp, 'units_sold', 'stock'), (2, 8))
+
+    def test_recount_units_sold(self):
+        self.order(self.lamp, 3)
+        self.order(self.lamp, 2).cancel()
+        self.order(self.chair, 4)
+        Product.objects.update(units_sold=99)
+
+        recount_units_sold(batch_size=1)
+
+        self.assertEqual(dict(Product.objects.values_list('name', 'units_sold')), {'Lamp': 3, 'Chair': 4, 'Rug': 0})
+
+    def test_refresh_orders_30d_writes_only_changes(self):
+        self.order(self.lamp)
+        self.order(self.lamp)
+        self.order(self.lamp, days_ago=40)
+        self.order(self.chair).cancel()
+        Product.objects.filter(pk=self.rug.pk).update(orders_30d=5)
+
+        # Lamp goes up, Rug drops out of the window, Chair stays at 0
+        self.assertEqual(refresh_orders_30d(), 2)
+        self.assertEqual(dict(Product.objects.values_list('name', 'orders_30d')), {'Lamp': 2, 'Chair': 0, 'Rug': 0})
+        self.assertEqual(refresh_orders_30d(), 0)
+
+    def test_top_sellers(self):
+        for product, orders in ((self.lamp, 1), (self.chair, 3), (self.rug, 1)):
+            for _ in range(orders):
+                self.order(product)
+        refresh_orders_30d()
+
+        # Ties go to the newest product
+        self.assertEqual(self.top(), ['Chair', 'Rug', 'Lamp'])
+        self.assertEqual(self.top(limit=1), ['Chair'])
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/products/top/', {'limit': 0}).status_code, 400)
+
+        # New orders only count after the next refresh, which drops the cached lists
+        for _ in range(3):
+            self.order(self.lamp)
+        self.assertEqual(self.top(), ['Chair', 'Rug', 'Lamp'])
+        refresh_orders_30d()
+        self.assertEqual(self.top(), ['Lamp', 'Chair', 'Rug'])
+        self.assertEqual(self.top(limit=1), ['Lamp'])
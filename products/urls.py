@@ -1,10 +1,13 @@
 from django.urls import path
-from .views import (create_product, list_products, get_product, update_product,
-                    delete_product)
+from .views import (create_product, list_products, top_products, product_changes, sync_products,
+                    get_product, update_product, delete_product)
 
 urlpatterns = [
     path('products/create/', create_product, name='product-create'),
     path('products/', list_products, name='product-list'),
+    path('products/top/', top_products, name='product-top'),
+    path('products/changes/', product_changes, name='product-changes'),
+    path('products/sync/', sync_products, name='product-sync'),
     path('products/<int:pk>/', get_product, name='product-detail'),
     path('products/<int:pk>/update/', update_product, name='product-update'),
     path('products/<int:pk>/delete/', delete_product, name='product-delete'),
@@ -1,11 +1,20 @@
-from rest_framework.decorators import api_view, permission_classes
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
-from .models import Product
-from .serializers import ProductsSerializer
+from .filters import TRUE_VALUES, filter_products, parse_filters, parse_since, product_facets
+from .models import Product, ProductPriceHistory
+from .serializers import ProductPriceChangeSerializer, ProductsSerializer
+from . import sync
+from InventoryNest import feeds
+from InventoryNest.purge import purge_products
+from InventoryNest.serialization import extractor_for, requested_fields
+from InventoryNest.tasks import enqueue
 from shop.models import Shop
+from throttling.throttles import AnonThrottle, UserThrottle, IPThrottle
 
 
 # 1. Create Product (POST request) - Only for users who have a shop
@@ -22,8 +31,8 @@ def create_product(request):
     # If the user has a shop, allow them to upload a product
     serializer = ProductsSerializer(data=request.data)
     if serializer.is_valid():
-        # Set the user who is uploading the product
-        serializer.save(user=request.user)
+        # Set the user and shop the product belongs to
+        serializer.save(user=request.user, shop=shop)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -31,27 +40,144 @@ def create_product(request):
 # 2. List Products (GET request) with Pagination - Anyone can view products
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes([AnonThrottle, UserThrottle, IPThrottle.scoped('products')])
 def list_products(request):
-    products = Product.objects.all()
+    # Only the fields asked for with ?fields= or ?exclude=, and only their columns are read
+    try:
+        fields = requested_fields(request, ProductsSerializer)
+        filters = parse_filters(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Apply search filter (e.g., search by product name)
-    search_query = request.query_params.get('search', '')
-    if search_query:
-        products = products.filter(name__icontains=search_query)
+    # Apply the search, price, stock, shop and created_since filters
+    products = filter_products(Product.objects.all(), filters)
 
-    # Apply ordering (e.g., order by creation date or price)
+    # Apply ordering (e.g., order by creation date, price or recent orders)
     ordering = request.query_params.get('ordering', 'created_at')
     allowed_ordering = ['created_at', 'price', '-created_at', '-price']
     if ordering in allowed_ordering:
         products = products.order_by(ordering)
+    elif ordering in ('popularity', '-popularity'):
+        # Ties broken by id so pages don't overlap
+        products = products.order_by(*[ordering.replace('popularity', field) for field in ('orders_30d', 'id')])
 
     # Pagination
     paginator = PageNumberPagination()
     paginator.page_size = 10
-    paginated_products = paginator.paginate_queryset(products, request)
+    # Serialize straight from the selected columns, output is the same as ProductsSerializer
+    extractor = extractor_for(ProductsSerializer, fields)
+    paginated_products = paginator.paginate_queryset(extractor.values(products), request)
+    response = paginator.get_paginated_response(extractor(paginated_products))
+
+    # Counts per price bucket and stock status, on request
+    if request.query_params.get('facets', '').lower() in TRUE_VALUES:
+        response.data['facets'] = product_facets(Product.objects.all(), filters)
+    return response
+
+
+# Top sellers (GET request) - Anyone can view them
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([AnonThrottle, UserThrottle, IPThrottle.scoped('products')])
+def top_products(request):
+    """
+    The products with the most orders over the last
+    PRODUCT_POPULARITY_WINDOW_DAYS, cached until the next popularity refresh.
+    The ranking is by orders_30d, which only the periodic refresh_popularity
+    recounts, so new orders move a product up after its next run.
+    """
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        return Response({'error': "'limit' must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= settings.PRODUCT_TOP_SELLERS_MAX:
+        return Response({'error': f"'limit' must be between 1 and {settings.PRODUCT_TOP_SELLERS_MAX}."},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    cache_key = Product.top_sellers_cache_key(limit)
+    data = cache.get(cache_key)
+    if data is None:
+        extractor = extractor_for(ProductsSerializer)
+        products = Product.objects.filter(orders_30d__gt=0).order_by('-orders_30d', '-id')[:limit]
+        data = extractor(extractor.values(products))
+        cache.set(cache_key, data, settings.PRODUCT_TOP_SELLERS_CACHE_TIMEOUT)
+    return Response(data, status=status.HTTP_200_OK)
 
-    serializer = ProductsSerializer(paginated_products, many=True)
-    return paginator.get_paginated_response(serializer.data)
+
+# Price changes (GET request) - Anyone can follow them
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([AnonThrottle, UserThrottle, IPThrottle.scoped('products')])
+def product_changes(request):
+    """
+    Price changes after ``since``, the ``next_since`` of a previous call
+    or, to start, an ISO 8601 timestamp. Only the latest change of each
+    product in the batch is returned.
+    """
+    since = request.query_params.get('since', '0')
+    try:
+        limit = min(int(request.query_params.get('limit', 100)), 1000)
+    except ValueError:
+        return Response({'error': "'limit' must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+    changes = ProductPriceHistory.settled()
+    txid, _, sequence = since.partition('-')
+    if txid.isdigit() and sequence.isdigit():
+        changes = changes.filter(feeds.after(int(txid), int(sequence)))
+    elif since.isdigit():
+        # A plain sequence number, from before cursors
+        changes = changes.filter(sequence__gt=int(since))
+    else:
+        try:
+            changes = changes.filter(changed_at__gt=parse_since(since, 'since'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    extractor = extractor_for(ProductPriceChangeSerializer)
+    values = list(changes.values('txid', *extractor.lookups)[:limit])
+    # Later changes of a product replace earlier ones
+    latest = {}
+    for row in extractor(values):
+        latest.pop(row['product'], None)
+        latest[row['product']] = row
+    return Response({
+        'changes': list(latest.values()),
+        # Until a change turns up, the given checkpoint or timestamp is handed back
+        'next_since': f"{values[-1]['txid']}-{values[-1]['sequence']}" if values else since,
+    }, status=status.HTTP_200_OK)
+
+
+# Catalog sync (GET request) - Anyone can mirror the catalog
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([AnonThrottle, UserThrottle, IPThrottle.scoped('products')])
+def sync_products(request):
+    """
+    Products saved and ids of products deleted since the sync ``token`` of a
+    previous call; without a token, the whole catalog. Call again with the
+    returned token while ``has_more`` is true.
+    """
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 500)), 1000))
+    except ValueError:
+        return Response({'error': "'limit' must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+    since = (0, 0)
+    if request.query_params.get('token'):
+        try:
+            since = sync.decode_token(request.query_params['token'])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except sync.TokenExpired as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+
+    extractor = extractor_for(ProductsSerializer)
+    rows, deleted, position, has_more = sync.changes(since, limit, extractor.lookups)
+    return Response({
+        'products': extractor(rows),
+        'deleted': deleted,
+        'token': sync.encode_token(position),
+        'has_more': has_more,
+    }, status=status.HTTP_200_OK)
 
 
 # 3. Retrieve Single Product (GET request) - Any user can view a product
@@ -59,13 +185,17 @@ def list_products(request):
 @permission_classes([IsAuthenticated])
 def get_product(request, pk):
     try:
-        product = Product.objects.get(pk=pk)
-    except Product.DoesNotExist:
+        fields = requested_fields(request, ProductsSerializer)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    extractor = extractor_for(ProductsSerializer, fields)
+    product = extractor.values(Product.objects.filter(pk=pk)).first()
+    if product is None:
         return Response({'error': "Product not found."},
                         status=status.HTTP_404_NOT_FOUND)
 
-    serializer = ProductsSerializer(product)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return Response(extractor([product])[0], status=status.HTTP_200_OK)
 
 
 # 4. Update Product (PUT/PATCH request) - Only the product owner (user) can update it
@@ -95,6 +225,11 @@ def delete_product(request, pk):
         return Response({'error': "Product not found."},
                         status=status.HTTP_404_NOT_FOUND)
 
-    product.delete()
+    # Hide the product now; its cart items and orders are removed in the background
+    Product.hide(Product.objects.filter(pk=product.pk))
+    enqueue(purge_products, id=product.pk)
+    Shop.invalidate_storefront(product.shop_id)
+    if product.orders_30d:
+        Product.invalidate_top_sellers()
     return Response({"message": "Product deleted successfully."},
                     status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,109 @@
+"""
+Shop logo and cover image processing.
+
+Uploads are stored under the SHA-256 of their content, so the same image
+uploaded twice is stored once and every path names one immutable file. After
+the upload is saved, a background task renders smaller, recompressed variants
+(JPEG and WebP at each size) next to it and records their paths on the shop.
+"""
+import hashlib
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Longest side of each variant, per image field
+VARIANT_SIZES = {
+    'logo': {'thumbnail': 128, 'medium': 512},
+    'cover_image': {'thumbnail': 480, 'medium': 1280},
+}
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+
+def store_original(upload, directory):
+    """
+    Save an uploaded file under the hash of its content and return its name.
+    Identical uploads end up as the same file.
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    extension = os.path.splitext(upload.name)[1].lower() or '.jpg'
+    name = f"{directory}/{digest.hexdigest()}{extension}"
+    if not default_storage.exists(name):
+        upload.seek(0)
+        default_storage.save(name, upload)
+    return name
+
+
+def render_variants(name, sizes):
+    """
+    Render every size of the image `name` as JPEG and WebP and return
+    {variant: path}, e.g. {'thumbnail': ..., 'thumbnail_webp': ...}.
+    Variants that already exist are reused.
+    """
+    base = os.path.splitext(name)[0]
+    variants = {}
+    image = None
+    for variant, size in sizes.items():
+        for suffix, extension in (('', 'jpg'), ('_webp', 'webp')):
+            path = f"{base}/{variant}.{extension}"
+            variants[variant + suffix] = path
+            if default_storage.exists(path):
+                continue
+            if image is None:
+                with default_storage.open(name) as original:
+                    image = ImageOps.exif_transpose(Image.open(original))
+                    image.load()
+            default_storage.save(path, ContentFile(_encode(image, size, extension)))
+    return variants
+
+
+def _encode(image, size, extension):
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    resized = image.convert('RGBA' if has_alpha else 'RGB')
+    # Only ever scale down
+    resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    if extension == 'webp':
+        resized.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        if has_alpha:
+            # JPEG has no transparency, flatten onto white
+            background = Image.new('RGB', resized.size, 'white')
+            background.paste(resized, mask=resized.getchannel('A'))
+            resized = background
+        resized.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def generate_shop_variants(shop_id, field):
+    """
+    Background task: render the variants of a shop's logo or cover image.
+    """
+    from users.models import UserProfile
+    from .models import Shop
+
+    name, owner_id = Shop.objects.filter(pk=shop_id).values_list(field, 'owner_id').first() or (None, None)
+    if not name:
+        return
+    variants = render_variants(name, VARIANT_SIZES[field])
+    # Only record them if the image wasn't replaced in the meantime
+    updated = Shop.objects.filter(pk=shop_id, **{field: name}).update(**{f'{field}_variants': variants})
+    if updated:
+        Shop.invalidate_storefront(shop_id)
+        UserProfile.invalidate_me(owner_id)
+
+
+def image_urls(name, variants):
+    """
+    URLs of the original image and of whichever variants are ready.
+    """
+    if not name:
+        return None
+    urls = {'original': default_storage.url(name)}
+    urls.update((variant, default_storage.url(path)) for variant, path in (variants or {}).items())
+    return urls
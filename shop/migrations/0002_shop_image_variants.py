@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='cover_image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='logo_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_shop_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='shop_deleted_idx'),
+        ),
+    ]
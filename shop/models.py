@@ -1,5 +1,10 @@
+import time
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from InventoryNest.soft_delete import SoftDeleteManager
 
 
 class Shop(models.Model):
@@ -13,6 +18,9 @@ class Shop(models.Model):
     email = models.EmailField(max_length=255)
     logo = models.ImageField(upload_to='shop_logos/', blank=True, null=True)
     cover_image = models.ImageField(upload_to='shop_covers/', blank=True, null=True)
+    # Paths of the resized copies of the images, filled in by a background task
+    logo_variants = models.JSONField(default=dict, blank=True)
+    cover_image_variants = models.JSONField(default=dict, blank=True)
 
     # Shipping and Delivery Information
     shipping_policy = models.TextField(blank=True, null=True)
@@ -33,6 +41,31 @@ class Shop(models.Model):
     # Date when the shop was created
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the shop is deleted, see InventoryNest.soft_delete
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted_at__isnull=False),
+                         name='shop_deleted_idx'),
+        ]
 
     def __str__(self):
-        return self.shop_name
\ No newline at end of file
+        return self.shop_name
+
+    @staticmethod
+    def storefront_cache_key(shop_id, page):
+        """
+        Cache key of one storefront page. Keys include a per-shop version, so
+        `invalidate_storefront` drops every cached page of the shop at once.
+        Other server processes only see the new version through a shared cache.
+        """
+        version = cache.get_or_set(f"storefront_version_{shop_id}", time.time_ns, None)
+        return f"storefront_{shop_id}_{version}_{page}"
+
+    @staticmethod
+    def invalidate_storefront(shop_id):
+        cache.set(f"storefront_version_{shop_id}", time.time_ns(), None)
@@ -1,12 +1,34 @@
 from rest_framework import serializers
+
+from InventoryNest.tasks import enqueue
+from .images import generate_shop_variants, image_urls, store_original
 from .models import Shop
 
-class ShopSerializer(serializers.ModelSerializer):
+
+class ShopImageUrlsMixin(serializers.Serializer):
+    """
+    Adds the URLs of the original logo and cover image and of their resized
+    variants, so clients can pick the smallest one that fits.
+    """
+    logo_urls = serializers.SerializerMethodField()
+    cover_image_urls = serializers.SerializerMethodField()
+
+    def get_logo_urls(self, shop):
+        return image_urls(shop.logo.name, shop.logo_variants)
+
+    def get_cover_image_urls(self, shop):
+        return image_urls(shop.cover_image.name, shop.cover_image_variants)
+
+
+class ShopSerializer(ShopImageUrlsMixin, serializers.ModelSerializer):
+    IMAGE_FIELDS = ['logo', 'cover_image']
+
     class Meta:
         model = Shop
         fields = [
             'id', 'owner', 'shop_name', 'shop_description', 'shop_category',
             'business_address', 'phone_number', 'email', 'logo', 'cover_image',
+            'logo_urls', 'cover_image_urls',
             'shipping_policy', 'return_policy', 'facebook_link',
             'instagram_link', 'twitter_link', 'website_link', 'terms_accepted',
             'is_active', 'created_at', 'updated_at'
@@ -15,4 +37,48 @@ class ShopSerializer(serializers.ModelSerializer):
     def validate_terms_accepted(self, value):
         if not value:
             raise serializers.ValidationError("You must accept the terms and conditions to register the shop.")
-        return value
\ No newline at end of file
+        return value
+
+    def _store_images(self, validated_data):
+        """
+        Store new uploads under their content hash and return the fields that changed.
+        """
+        changed = [field for field in self.IMAGE_FIELDS if field in validated_data]
+        for field in changed:
+            upload = validated_data[field]
+            if upload:
+                directory = Shop._meta.get_field(field).upload_to.rstrip('/')
+                validated_data[field] = store_original(upload, directory)
+            # Old variants belong to the old image
+            validated_data[f'{field}_variants'] = {}
+        return changed
+
+    def _render_variants(self, shop, changed):
+        for field in changed:
+            if getattr(shop, field):
+                enqueue(generate_shop_variants, shop.id, field)
+
+    def create(self, validated_data):
+        changed = self._store_images(validated_data)
+        shop = super().create(validated_data)
+        self._render_variants(shop, changed)
+        return shop
+
+    def update(self, instance, validated_data):
+        changed = self._store_images(validated_data)
+        shop = super().update(instance, validated_data)
+        self._render_variants(shop, changed)
+        return shop
+
+
+class StorefrontShopSerializer(ShopImageUrlsMixin, serializers.ModelSerializer):
+    """
+    The public part of a shop, shown as the header of its storefront.
+    """
+    class Meta:
+        model = Shop
+        fields = [
+            'id', 'shop_name', 'shop_description', 'shop_category', 'logo_urls', 'cover_image_urls',
+            'shipping_policy', 'return_policy', 'facebook_link', 'instagram_link',
+            'twitter_link', 'website_link', 'created_at'
+        ]
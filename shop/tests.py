@@ -1,3 +1,53 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from products.models import Product
+from .models import Shop
+
+
+@override_settings(STOREFRONT_PAGE_SIZE=2)
+class StorefrontTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+        self.shop = Shop.objects.create(owner=seller, shop_name='Shop', shop_description='Shop', shop_category='Home',
+                                        business_address='Street 1', email=seller.email, is_active=True)
+        for name in ('Lamp', 'Chair', 'Table', 'Rug', 'Vase'):
+            Product.objects.create(user=seller, shop=self.shop, name=name, description=name, price='10.00', stock=5)
+        self.client = APIClient()
+        self.url = f'/shop/{self.shop.pk}/products/'
+
+    def test_cached_page_links_ignore_other_query_params(self):
+        response = self.client.get(self.url, {'page': 2, 'utm_source': 'junk'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['next'], f'http://testserver{self.url}?page=3')
+        self.assertEqual(response.data['previous'], f'http://testserver{self.url}')
+
+        # Served from the cache, still without the first requester's query string
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(response.data['next'], f'http://testserver{self.url}?page=3')
+        self.assertEqual(response.data['previous'], f'http://testserver{self.url}')
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_writes_invalidate_the_cached_pages(self):
+        self.assertEqual(self.client.get(self.url).data['results'][0]['name'], 'Vase')
+
+        # Cached: a write that skips Shop.invalidate_storefront goes unseen
+        vase = Product.objects.get(name='Vase')
+        Product.objects.filter(pk=vase.pk).update(name='Tall vase')
+        self.assertEqual(self.client.get(self.url).data['results'][0]['name'], 'Vase')
+
+        Shop.invalidate_storefront(self.shop.pk)
+        self.assertEqual(self.client.get(self.url).data['results'][0]['name'], 'Tall vase')
+
+        # The product and shop endpoints invalidate on their own
+        seller = APIClient()
+        seller.force_authenticate(self.seller)
+        seller.patch(f'/products/{vase.pk}/update/', {'name': 'Blue vase'}, format='json')
+        self.assertEqual(self.client.get(self.url).data['results'][0]['name'], 'Blue vase')
+
+        seller.patch('/shop/update/', {'shop_name': 'Home goods'}, format='json')
+        self.assertEqual(self.client.get(self.url).data['shop']['shop_name'], 'Home goods')
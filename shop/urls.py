@@ -6,4 +6,5 @@ urlpatterns = [
     path('shop/profile/', views.get_shop, name='get_shop'),  # Get shop profile
     path('shop/update/', views.update_shop, name='update_shop'),  # Update shop profile
     path('shop/delete/', views.delete_shop, name='delete_shop'),  # Delete shop profile
+    path('shop/<int:shop_id>/products/', views.shop_storefront, name='shop_storefront'),  # Public storefront
 ]
@@ -1,9 +1,19 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework import status
+from InventoryNest.purge import purge_shop
+from InventoryNest.tasks import enqueue
+from products.serializers import ProductsSerializer
+from throttling.throttles import AnonThrottle, UserThrottle, IPThrottle
+from users.models import UserProfile
 from .models import Shop
-from .serializers import ShopSerializer
+from .serializers import ShopSerializer, StorefrontShopSerializer
 
 
 # 1. Create a new shop (or retrieve an existing one)
@@ -11,7 +21,11 @@ from .serializers import ShopSerializer
 @permission_classes([IsAuthenticated])
 def create_shop(request):
     # If the user already has a shop, return an error
-    if Shop.objects.filter(owner=request.user).exists():
+    shop = Shop.all_objects.filter(owner=request.user).only('deleted_at').first()
+    if shop is not None:
+        if shop.deleted_at:
+            return Response({'error': 'Your previous shop is still being deleted, please try again shortly.'},
+                            status=status.HTTP_400_BAD_REQUEST)
         return Response({'error': 'You already have a shop.'}, status=status.HTTP_400_BAD_REQUEST)
     
     # Create a new shop instance with the logged-in user as the owner
@@ -21,6 +35,7 @@ def create_shop(request):
     serializer = ShopSerializer(data=data)
     if serializer.is_valid():
         shop = serializer.save()
+        UserProfile.invalidate_me(request.user.id)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -46,6 +61,8 @@ def update_shop(request):
         serializer = ShopSerializer(shop, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            Shop.invalidate_storefront(shop.id)
+            UserProfile.invalidate_me(request.user.id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     except Shop.DoesNotExist:
@@ -58,7 +75,65 @@ def update_shop(request):
 def delete_shop(request):
     try:
         shop = Shop.objects.get(owner=request.user)
-        shop.delete()
+        # Hide the shop now; its products are removed in the background
+        Shop.objects.filter(pk=shop.pk).update(deleted_at=timezone.now())
+        enqueue(purge_shop, shop.id)
+        Shop.invalidate_storefront(shop.id)
+        UserProfile.invalidate_me(request.user.id)
         return Response({"message": "Shop deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
     except Shop.DoesNotExist:
         return Response({"error": "Shop not found."}, status=status.HTTP_404_NOT_FOUND)
+
+
+# 5. Public storefront: the shop header and its products, newest first
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([AnonThrottle, UserThrottle, IPThrottle.scoped('products')])
+def shop_storefront(request, shop_id):
+    # Pages are cached until the shop or its products change
+    page = request.query_params.get('page', '1')
+    cache_key = Shop.storefront_cache_key(shop_id, page) if page.isdigit() else None
+    if cache_key:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return Response(_storefront_page(request, *cached))
+
+    try:
+        shop = Shop.objects.get(pk=shop_id, is_active=True)
+    except Shop.DoesNotExist:
+        return Response({"error": "Shop not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    products = shop.products.select_related('user').order_by('-created_at', '-id')
+    paginator = PageNumberPagination()
+    paginator.page_size = settings.STOREFRONT_PAGE_SIZE
+    page_products = paginator.paginate_queryset(products, request)
+
+    # Cached without links, which are added per request from the page numbers
+    data = {
+        'shop': StorefrontShopSerializer(shop).data,
+        'count': paginator.page.paginator.count,
+        'results': ProductsSerializer(page_products, many=True).data,
+    }
+    next_page = paginator.page.next_page_number() if paginator.page.has_next() else None
+    previous_page = paginator.page.previous_page_number() if paginator.page.has_previous() else None
+    if cache_key:
+        cache.set(cache_key, (data, next_page, previous_page), settings.STOREFRONT_CACHE_TIMEOUT)
+    return Response(_storefront_page(request, data, next_page, previous_page))
+
+
+def _storefront_page(request, data, next_page, previous_page):
+    # Links carry only `page`, whatever else the requester put in the query string
+    url = request.build_absolute_uri(request.path)
+
+    def link(page_number):
+        if page_number is None:
+            return None
+        return url if page_number == 1 else replace_query_param(url, 'page', page_number)
+
+    return {
+        'shop': data['shop'],
+        'count': data['count'],
+        'next': link(next_page),
+        'previous': link(previous_page),
+        'results': data['results'],
+    }
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from throttling.models import ThrottleBucket
+
+
+class Command(BaseCommand):
+    help = "Delete throttle buckets that have refilled completely, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of rows deleted per statement.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # A full bucket behaves exactly like a missing one, so these are safe to drop
+        full = ThrottleBucket.objects.filter(full_at__lte=time.time())
+
+        deleted = 0
+        while True:
+            keys = list(full.values_list('key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            deleted += ThrottleBucket.objects.filter(key__in=keys, full_at__lte=time.time()).delete()[0]
+
+        elapsed = time.monotonic() - started
+        rate = deleted / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {deleted} full throttle buckets in {elapsed:.2f}s ({rate:.0f} rows/s)."
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:55
+
+from django.db import migrations, models
+
+
+def set_unlogged(apps, schema_editor):
+    # Rate limit state is disposable, so skip the write-ahead log on PostgreSQL:
+    # checks get much cheaper and a crash only resets the buckets.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE throttling_throttlebucket SET UNLOGGED')
+
+
+def set_logged(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE throttling_throttlebucket SET LOGGED')
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('full_at', models.FloatField(db_index=True)),
+            ],
+        ),
+        migrations.RunPython(set_unlogged, set_logged),
+    ]
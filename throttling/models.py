@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class ThrottleBucket(models.Model):
+    """
+    Rate limit state for one client in one scope, shared by all server processes.
+
+    A token bucket is stored as the time at which it will be full again
+    (`full_at`, in Unix seconds). Each request pushes that time forward by one
+    interval; a request is refused when it would push it further ahead than the
+    bucket's capacity allows. Buckets whose `full_at` has passed carry no state
+    and can be deleted at any time.
+    """
+    key = models.CharField(max_length=255, primary_key=True)
+    full_at = models.FloatField(db_index=True)
+
+    def __str__(self):
+        return self.key
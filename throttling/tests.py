@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import TestCase
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from .throttles import IPThrottle, UserThrottle
+
+
+class ThreePerMinute(IPThrottle):
+    # A bucket of 3 tokens, refilling one every 20 seconds
+    THROTTLE_RATES = {'ip': '3/min'}
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([ThreePerMinute])
+def limited(request):
+    return Response({})
+
+
+class TokenBucketThrottleTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.now = 1_000_000.0
+        patcher = mock.patch('throttling.throttles.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, **extra):
+        request = Request(self.factory.get('/', **extra))
+        request.user = AnonymousUser()
+        return request
+
+    def allow(self, throttle_class=ThreePerMinute, **extra):
+        throttle = throttle_class()
+        return throttle.allow_request(self.request(**extra), None), throttle.wait()
+
+    def test_burst_runs_out(self):
+        for _ in range(3):
+            self.assertEqual(self.allow(), (True, None))
+        self.assertEqual(self.allow(), (False, 20))
+
+    def test_tokens_refill_at_the_rate(self):
+        for _ in range(3):
+            self.allow()
+
+        self.now += 5
+        self.assertEqual(self.allow(), (False, 15))
+
+        # One token back after one interval
+        self.now += 15
+        self.assertEqual(self.allow(), (True, None))
+        self.assertEqual(self.allow(), (False, 20))
+
+        # A full bucket after the whole minute
+        self.now += 60
+        for _ in range(3):
+            self.assertTrue(self.allow()[0])
+        self.assertFalse(self.allow()[0])
+
+    def test_buckets_are_per_client(self):
+        for _ in range(3):
+            self.allow(REMOTE_ADDR='10.0.0.1')
+        self.assertFalse(self.allow(REMOTE_ADDR='10.0.0.1')[0])
+        self.assertTrue(self.allow(REMOTE_ADDR='10.0.0.2')[0])
+
+    def test_forged_forwarded_for_is_ignored(self):
+        for n in range(3):
+            self.allow(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'192.0.2.{n}')
+        self.assertFalse(self.allow(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='192.0.2.9')[0])
+
+    def test_user_throttle_skips_anonymous_requests(self):
+        class OnePerMinute(UserThrottle):
+            THROTTLE_RATES = {'user': '1/min'}
+
+        self.assertTrue(self.allow(OnePerMinute)[0])
+        self.assertTrue(self.allow(OnePerMinute)[0])
+
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        throttle = OnePerMinute()
+        for allowed in (True, False):
+            request = Request(self.factory.get('/'))
+            request.user = user
+            self.assertEqual(throttle.allow_request(request, None), allowed)
+        self.assertEqual(throttle.wait(), 60)
+
+    def test_refusal_sends_retry_after(self):
+        for _ in range(3):
+            self.assertEqual(limited(self.factory.get('/')).status_code, 200)
+
+        self.now += 2.5
+        response = limited(self.factory.get('/'))
+        self.assertEqual(response.status_code, 429)
+        # 17.5 seconds, rounded up
+        self.assertEqual(response['Retry-After'], '18')
@@ -0,0 +1,143 @@
+import hashlib
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .models import ThrottleBucket
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket rate limiting backed by the `ThrottleBucket` table.
+
+    Rates use the DRF format (`'60/min'`): the bucket holds 60 tokens and
+    refills one token per second, so short bursts up to the full rate are
+    allowed. Counters are shared between all processes and each check is a
+    single atomic upsert, so concurrent requests cannot overdraw a bucket.
+
+    Subclasses decide whom a request is counted against in `get_ident_key`;
+    returning None skips the throttle. Use `scoped()` to give a view its own rate.
+    """
+    scope = None
+    THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+    DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def __init__(self):
+        self.capacity, self.interval = self.parse_rate(self.get_rate())
+        self.retry_after = None
+
+    @classmethod
+    def scoped(cls, scope):
+        """Return a copy of this throttle that uses the rate configured for `scope`."""
+        return type(f'{cls.__name__}[{scope}]', (cls,), {'scope': scope})
+
+    def get_rate(self):
+        try:
+            return self.THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No throttle rate set for scope '{self.scope}'.")
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        capacity = int(num)
+        return capacity, self.DURATIONS[period[0]] / capacity
+
+    def get_ident_key(self, request):
+        raise NotImplementedError('.get_ident_key() must be overridden')
+
+    def allow_request(self, request, view):
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+
+        key = f'{self.scope}:{ident}'
+        now = time.time()
+        full_at = take_token(key, now, self.capacity, self.interval)
+        if full_at is not None:
+            return True
+
+        # Refused: the next token is free once the bucket is one interval below capacity
+        current = ThrottleBucket.objects.filter(key=key).values_list('full_at', flat=True).first()
+        self.retry_after = max(0, (current or now) - now - (self.capacity - 1) * self.interval)
+        return False
+
+    def wait(self):
+        return self.retry_after
+
+
+def take_token(key, now, capacity, interval):
+    """
+    Take one token from the bucket `key` and return its new `full_at`, or None
+    if the bucket is empty. Runs as one statement, so it is safe under concurrency.
+    """
+    db = router.db_for_write(ThrottleBucket)
+    connection = connections[db]
+    qn = connection.ops.quote_name
+    table = qn(ThrottleBucket._meta.db_table)
+    if connection.vendor == 'postgresql':
+        greatest = 'GREATEST'
+    elif connection.vendor == 'sqlite':
+        greatest = 'MAX'
+    else:
+        raise ImproperlyConfigured(f"Throttling is not supported on {connection.vendor}.")
+
+    current = f'{greatest}({table}.{qn("full_at")}, %s)'
+    sql = (
+        f'INSERT INTO {table} ({qn("key")}, {qn("full_at")}) VALUES (%s, %s) '
+        f'ON CONFLICT ({qn("key")}) DO UPDATE SET {qn("full_at")} = {current} + %s '
+        f'WHERE {current} + %s <= %s '
+        f'RETURNING {qn("full_at")}'
+    )
+    limit = now + capacity * interval
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [key, now + interval, now, interval, now, interval, limit])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class AnonThrottle(TokenBucketThrottle):
+    """Limits anonymous requests per client IP."""
+    scope = 'anon'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return None
+        return f'ip:{self.get_ident(request)}'
+
+
+class UserThrottle(TokenBucketThrottle):
+    """Limits authenticated requests per user."""
+    scope = 'user'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return None
+
+
+class IPThrottle(TokenBucketThrottle):
+    """Limits all requests per client IP, signed in or not."""
+    scope = 'ip'
+
+    def get_ident_key(self, request):
+        return f'ip:{self.get_ident(request)}'
+
+
+class IdentifierThrottle(TokenBucketThrottle):
+    """
+    Limits requests per account `identifier` (username or email) in the request
+    body, however many IPs they come from. Stops credential stuffing and OTP
+    guessing against a single account.
+    """
+    scope = 'identifier'
+    field = 'identifier'
+
+    def get_ident_key(self, request):
+        identifier = request.data.get(self.field) if hasattr(request.data, 'get') else None
+        if not identifier or not isinstance(identifier, str):
+            return None
+        digest = hashlib.sha256(identifier.strip().lower().encode()).hexdigest()
+        return f'id:{digest}'
@@ -0,0 +1,58 @@
+"""
+Password hashing spread over worker processes.
+
+Hashing is deliberately slow (hundreds of milliseconds per password), so a
+batch of hundreds would keep one process busy for a minute. This module
+imports no models, so worker processes can load it without setting Django
+up; they are handed the configured hasher itself.
+
+The workers come from one pool per server process, started on first use
+through a forkserver rather than by forking the (threaded) server, and kept
+for later batches.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.contrib.auth.hashers import get_hasher
+
+WORKERS = os.cpu_count() or 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _encode(hasher, password):
+    return hasher.encode(password, hasher.salt())
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('forkserver'))
+        return _pool
+
+
+def hash_passwords(passwords):
+    """
+    Hash `passwords` with the default hasher, in the worker pool. Short
+    lists are hashed in this process, where handing them to the workers
+    would cost more than it saves.
+    """
+    global _pool
+    hasher = get_hasher()
+    if WORKERS == 1 or len(passwords) < 2 * WORKERS:
+        return [_encode(hasher, password) for password in passwords]
+    pool = _get_pool()
+    try:
+        return list(pool.map(_encode, [hasher] * len(passwords), passwords,
+                             chunksize=max(1, len(passwords) // (WORKERS * 4))))
+    except BrokenProcessPool:
+        # A worker died; the next batch starts a fresh pool
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Max
+
+BATCH_SIZE = 10000
+
+
+def backfill_profiles(apps, schema_editor):
+    """
+    Create the missing profiles of existing users, one id range at a time.
+    New users get theirs from the post_save signal.
+    """
+    User = apps.get_model('auth', 'User')
+    UserProfile = apps.get_model('users', 'UserProfile')
+    last_id = User.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    for start in range(0, last_id, BATCH_SIZE):
+        user_ids = (User.objects.filter(id__gt=start, id__lte=start + BATCH_SIZE, userprofile__isnull=True)
+                    .values_list('id', flat=True))
+        UserProfile.objects.bulk_create([UserProfile(user_id=user_id) for user_id in user_ids])
+
+
+class Migration(migrations.Migration):
+
+    # Every batch is committed on its own so the table is never locked as a whole
+    atomic = False
+
+    dependencies = [
+        ('users', '0002_userprofile_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_profiles, migrations.RunPython.noop),
+    ]
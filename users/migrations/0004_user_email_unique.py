@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Emails identify users at login, and signup and bulk_signup check that
+    they're free before inserting. The index makes two concurrent signups
+    with the same email fail instead of both succeeding. Accounts without an
+    email are left out. Merge any existing duplicates before migrating.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_backfill_userprofiles'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX auth_user_email_unique ON auth_user (email) WHERE email <> ''",
+            "DROP INDEX auth_user_email_unique",
+        ),
+    ]
@@ -1,11 +1,44 @@
+import time
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
 
+from InventoryNest.soft_delete import SoftDeleteManager
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='userprofile')
     address = models.TextField(blank=True, null=True)
     payment_info = models.JSONField(blank=True, null=True)
     preferences = models.JSONField(blank=True, null=True)
+    # Set when the account is deleted, see InventoryNest.soft_delete. The user
+    # is deactivated at the same time, so it can no longer log in
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = SoftDeleteManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted_at__isnull=False),
+                         name='userprofile_deleted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
+
+    @staticmethod
+    def me_cache_key(user_id):
+        """
+        Cache key of a user's `me/` response. Keys include a per-user version,
+        so `invalidate_me` drops the cached response without knowing its key.
+        The versions live in the cache, which has to be shared by all server
+        processes for an invalidation to reach them (see InventoryNest.checks).
+        """
+        version = cache.get_or_set(f"me_version_{user_id}", time.time_ns, None)
+        return f"me_{user_id}_{version}"
+
+    @staticmethod
+    def invalidate_me(user_id):
+        cache.set(f"me_version_{user_id}", time.time_ns(), None)
@@ -0,0 +1,80 @@
+"""
+Bulk creation of user accounts, for sellers onboarded in batches from
+partner systems.
+
+A batch costs a fixed number of queries however large it is: one IN query
+each to find taken usernames and emails, and one bulk insert each for the
+users and their profiles (bulk_create sends no post_save, so the profiles
+are inserted here rather than by users.signals). Passwords are hashed in
+worker processes (users.hashing) and the verification emails are sent in
+the background once the batch has committed.
+
+Usernames and emails are unique in the database (users migration 0004 adds
+the email index), so a batch racing another signup for the same name or
+email fails as a whole with an IntegrityError.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from InventoryNest.tasks import enqueue
+from .hashing import hash_passwords
+from .models import UserProfile
+
+# Verification emails sent over one SMTP connection
+EMAIL_BATCH_SIZE = 500
+
+
+def find_conflicts(rows):
+    """
+    {row index: {field: [message]}} for usernames and emails that are taken
+    or repeated within the batch.
+    """
+    errors = {}
+    for field in ('username', 'email'):
+        values = [row[field] for row in rows]
+        taken = set(User.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+        repeated = {value for value, count in Counter(values).items() if count > 1}
+        for index, value in enumerate(values):
+            if value in taken:
+                errors.setdefault(index, {})[field] = [f"A user with this {field} already exists."]
+            elif value in repeated:
+                errors.setdefault(index, {})[field] = [f"This {field} appears more than once in the batch."]
+    return errors
+
+
+def provision_users(rows, verification_url):
+    """
+    Create inactive users with profiles from validated `rows` and queue
+    their verification emails, with links starting with `verification_url`.
+    Check the rows with `find_conflicts` first. Returns the users.
+    """
+    passwords = hash_passwords([row['password'] for row in rows])
+    users = [
+        User(username=row['username'], email=row['email'], first_name=row['first_name'],
+             last_name=row['last_name'], password=password, is_active=False)  # Inactive until verified
+        for row, password in zip(rows, passwords)
+    ]
+    with transaction.atomic():
+        users = User.objects.bulk_create(users)
+        if users and users[0].pk is None:
+            # Databases that can't return the new keys from a bulk insert
+            users = list(User.objects.filter(username__in=[user.username for user in users]).order_by('id'))
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+
+        emails = [
+            ("Verify Your Email",
+             f"Click the link to verify your account: {verification_url}"
+             f"{urlsafe_base64_encode(force_bytes(user.pk))}/{default_token_generator.make_token(user)}/",
+             settings.EMAIL_HOST_USER, [user.email])
+            for user in users
+        ]
+        for start in range(0, len(emails), EMAIL_BATCH_SIZE):
+            enqueue(send_mass_mail, emails[start:start + EMAIL_BATCH_SIZE])
+    return users
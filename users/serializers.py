@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import UserProfile
 
 
@@ -15,3 +18,26 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'username', 'first_name', 'last_name', 'email', 'address',
             'payment_info', 'preferences'
         ]
+
+
+class NewUserSerializer(serializers.Serializer):
+    # The same checks as the User model's fields, without the per-row uniqueness queries
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField(max_length=254)
+    password = serializers.CharField(write_only=True, max_length=128)
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        # AUTH_PASSWORD_VALIDATORS, with the user's details for the similarity check
+        user = User(username=attrs['username'], email=attrs['email'],
+                    first_name=attrs['first_name'], last_name=attrs['last_name'])
+        try:
+            validate_password(attrs['password'], user)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'password': list(e.messages)})
+        return attrs
+
+
+class BulkSignupSerializer(serializers.Serializer):
+    users = NewUserSerializer(many=True, allow_empty=False, max_length=500)
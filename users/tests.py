@@ -1,3 +1,113 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import UserProfile
+
+
+class BulkSignupTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def new_user(self, name, **fields):
+        return {'username': name, 'email': f'{name}@example.com', 'password': 'correct horse battery', **fields}
+
+    def bulk_signup(self, *users):
+        with self.assertNoLogs('django.request', 'ERROR'):
+            return self.client.post('/signup/bulk/', {'users': list(users)}, format='json')
+
+    def test_creates_inactive_users_with_profiles(self):
+        response = self.bulk_signup(self.new_user('ann'), self.new_user('bob'))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([user['username'] for user in response.data['users']], ['ann', 'bob'])
+        users = User.objects.filter(username__in=['ann', 'bob'])
+        self.assertEqual({user.is_active for user in users}, {False})
+        self.assertTrue(users[0].check_password('correct horse battery'))
+        self.assertEqual(UserProfile.objects.filter(user__in=users).count(), 2)
+
+    def test_taken_and_repeated_emails_are_reported_per_row(self):
+        User.objects.create_user('carol', 'carol@example.com', 'password')
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post('/signup/bulk/', {'users': [
+                self.new_user('ann', email='carol@example.com'),
+                self.new_user('bob', email='bob@example.com'),
+                self.new_user('dan', email='bob@example.com'),
+            ]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['users']), {0, 1, 2})
+        self.assertIn('already exists', response.data['users'][0]['email'][0])
+        self.assertIn('more than once', response.data['users'][2]['email'][0])
+        self.assertFalse(User.objects.filter(username__in=['ann', 'bob', 'dan']).exists())
+
+    def test_weak_passwords_are_refused(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post('/signup/bulk/', {'users': [
+                self.new_user('ann'), self.new_user('bob', password='12345678'),
+            ]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.data['users'][1])
+        self.assertFalse(User.objects.filter(username='ann').exists())
+
+    def test_email_taken_by_a_concurrent_signup_is_a_conflict(self):
+        # Signed up after the batch was checked
+        with mock.patch('users.views.find_conflicts', return_value={}):
+            User.objects.create_user('carol', 'ann@example.com', 'password')
+            with self.assertLogs('django.request', 'WARNING'):
+                response = self.client.post('/signup/bulk/', {'users': [
+                    self.new_user('bob'), self.new_user('ann'),
+                ]}, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(User.objects.filter(username__in=['ann', 'bob']).exists())
+
+    def test_emails_are_unique(self):
+        User.objects.create_user('ann', 'ann@example.com', 'password')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user('bob', 'ann@example.com', 'password')
+        # Accounts without an email don't collide
+        User.objects.create_user('carol', '', 'password')
+        User.objects.create_user('dan', '', 'password')
+
+
+class MeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ann', 'ann@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def me(self):
+        response = self.client.get('/me/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_writes_invalidate_the_cached_response(self):
+        self.assertEqual((self.me()['address'], self.me()['shop']), (None, None))
+
+        # Cached: a write that skips UserProfile.invalidate_me goes unseen
+        UserProfile.objects.filter(user=self.user).update(address='Street 1')
+        self.assertIsNone(self.me()['address'])
+        UserProfile.invalidate_me(self.user.id)
+        self.assertEqual(self.me()['address'], 'Street 1')
+
+        # Profile and shop writes invalidate on their own
+        response = self.client.patch('/profile/update/', {'address': 'Street 2'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.me()['address'], 'Street 2')
 
-# Create your tests here.
+        response = self.client.post('/shop/', {
+            'shop_name': 'Shop', 'shop_description': 'Shop', 'shop_category': 'Home',
+            'business_address': 'Street 2', 'email': 'ann@example.com',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.me()['shop']['shop_name'], 'Shop')
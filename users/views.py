@@ -1,21 +1,32 @@
 import logging
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 
 from InventoryNest import settings
+from InventoryNest.purge import purge_account
+from InventoryNest.tasks import enqueue
+from shop.models import Shop
+from shop.serializers import ShopSerializer
 from users.models import UserProfile
+from cart.utils import merge_guest_cart
+from throttling.throttles import AnonThrottle, IPThrottle, IdentifierThrottle
 from .forms import *
-from .serializers import UserProfileSerializer
+from .provisioning import find_conflicts, provision_users
+from .serializers import BulkSignupSerializer, UserProfileSerializer
 from django.core.mail import send_mail
 from .utils import generate_otp
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
 from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
 
 
 # Function for generate a JWT token for user
@@ -27,16 +38,13 @@ def get_tokens_for_user(user):
 # Function to signin a user
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AnonThrottle, IPThrottle.scoped('signup')])
 def signup(request):
     user_form = UserRegistrationForm(data=request.data)
     if user_form.is_valid():
         user = user_form.save(commit=False)
         user.is_active = False  # Account is inactive until verified
-        user.save()
-
-        # Create UserProfile with default values (null for optional fields)
-        UserProfile.objects.create(user=user,
-                                address=None, payment_info=None, preferences=None)
+        user.save()  # The profile is created by users.signals
 
         uid = urlsafe_base64_encode(force_bytes(user.pk))
         token = default_token_generator.make_token(user)
@@ -52,8 +60,8 @@ def signup(request):
                 from_email=settings.EMAIL_HOST_USER,
                 fail_silently=False,
             )
-        except Exception as e:
-            print(f"Error sending email: {e}")
+        except Exception:
+            logger.exception("Error sending email")
 
         return Response(
             {"message": "Account created. Please verify your email."},
@@ -61,6 +69,40 @@ def signup(request):
     return Response(user_form.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_signup(request):
+    """
+    Create many accounts at once, e.g. sellers onboarded from a partner
+    system. Nothing is created unless every user in the batch is valid.
+
+    Passwords are hashed while the request waits, so batches are capped at
+    500 users; larger onboardings are sent as several requests.
+    """
+    serializer = BulkSignupSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = serializer.validated_data['users']
+    errors = find_conflicts(rows)
+    if errors:
+        return Response({'users': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        users = provision_users(rows, request.build_absolute_uri('/verify-email/'))
+    except IntegrityError:
+        # Signed up by someone else since the check
+        return Response({'error': "Some usernames or emails were taken meanwhile, please retry."},
+                        status=status.HTTP_409_CONFLICT)
+
+    return Response(
+        {
+            "message": f"{len(users)} accounts created. Verification emails are on their way.",
+            "users": [{"id": user.id, "username": user.username} for user in users],
+        },
+        status=status.HTTP_201_CREATED)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def verify_email(request, uid, token):
@@ -85,6 +127,7 @@ def verify_email(request, uid, token):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([IPThrottle.scoped('login'), IdentifierThrottle.scoped('login_identifier')])
 def login(request):
     """
     Authenticate user with either email or username and password, 
@@ -129,8 +172,8 @@ def login(request):
             from_email=settings.EMAIL_HOST_USER,
             fail_silently=False,
         )
-    except Exception as e:
-        logging.error(f"Failed to send OTP to {user.email}: {e}")
+    except Exception:
+        logger.exception("Failed to send OTP to %s", user.email)
         return Response(
             {"error": "Failed to send OTP. Please try again later."},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -144,6 +187,7 @@ def login(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([IPThrottle.scoped('login'), IdentifierThrottle.scoped('otp_identifier')])
 def verify_otp(request):
     """
     Verify the OTP sent to the user's email and log the user in upon success.
@@ -178,6 +222,9 @@ def verify_otp(request):
     # Issue JWT tokens
     token = get_tokens_for_user(user)
 
+    # Carry over anything the user added to the cart as a guest
+    merge_guest_cart(request.session.session_key, user)
+
     # Clear OTP after successful verification
     cache.delete(cache_key)
 
@@ -196,21 +243,47 @@ def view_profile(request):
     """
     Retrieve the authenticated user's profile details.
     """
-    user = request.user
-
     try:
-        user_profile, created = UserProfile.objects.get_or_create(user=user)
-    except Exception as e:
+        user_profile = UserProfile.objects.select_related('user').get(user=request.user)
+    except UserProfile.DoesNotExist:
         return Response(
-            {"error": f"Failed to retrieve or create profile: {str(e)}"},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            {"error": "User profile does not exist."},
+            status=status.HTTP_404_NOT_FOUND,
         )
 
     serializer = UserProfileSerializer(user_profile)
-    response_data = serializer.data
-    if created:
-        response_data["message"] = "Profile was newly created."
-    return Response(response_data, status=status.HTTP_200_OK)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def me(request):
+    """
+    The authenticated user's account, profile and shop in one response.
+    User, profile and shop are loaded in one query, and the response is
+    cached until the profile or shop changes.
+    """
+    cache_key = UserProfile.me_cache_key(request.user.id)
+    data = cache.get(cache_key)
+    if data is not None:
+        return Response(data, status=status.HTTP_200_OK)
+
+    try:
+        user_profile = (UserProfile.objects.select_related('user', 'user__shop')
+                        .get(user=request.user))
+    except UserProfile.DoesNotExist:
+        return Response(
+            {"error": "User profile does not exist."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    # select_related skips the managers, so a deleted shop still shows up here
+    shop = getattr(user_profile.user, 'shop', None)
+    data = UserProfileSerializer(user_profile).data
+    data["id"] = request.user.id
+    data["shop"] = ShopSerializer(shop).data if shop and not shop.deleted_at else None
+    cache.set(cache_key, data, settings.ME_CACHE_TIMEOUT)
+    return Response(data, status=status.HTTP_200_OK)
 
 
 @api_view(['PUT', 'PATCH'])
@@ -232,6 +305,7 @@ def update_profile(request):
     serializer = UserProfileSerializer(user_profile, data=request.data, partial=True)
     if serializer.is_valid():
         serializer.save()
+        UserProfile.invalidate_me(user.id)
         return Response(
             {
                 "message": "Profile updated successfully.",
@@ -247,22 +321,38 @@ def update_profile(request):
 def delete_account(request):
     """
     Deletes the authenticated user's account and sends a goodbye email.
+    The account is deactivated at once; its shop, products and orders are
+    removed in the background.
     """
     user = request.user
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Logging in and existing tokens stop working right away
+        user.is_active = False
+        user.set_unusable_password()
+        user.save(update_fields=['is_active', 'password'])
+        UserProfile.all_objects.update_or_create(user=user, defaults={'deleted_at': now})
+        shop_ids = list(Shop.objects.filter(owner=user).values_list('id', flat=True))
+        Shop.objects.filter(id__in=shop_ids).update(deleted_at=now)
+        enqueue(purge_account, user.id)
+
+        # Send the 'Sorry to see you leave' email
+        enqueue(
+            send_mail,
+            subject='Sorry to See You Go',
+            message=f"Dear {user.get_full_name() or user.username},\n\n"
+            "We’re sorry to see you go. Thank you for being a part of our journey. "
+            "If there’s anything we could improve, we’d love to hear your feedback.\n\n"
+            "Best wishes,\nThe InventoryNest Team",
+            recipient_list=[user.email],
+            from_email=settings.EMAIL_HOST_USER,
+            fail_silently=False,
+        )
 
-    # Send the 'Sorry to see you leave' email
-    send_mail(
-        subject='Sorry to See You Go',
-        message=f"Dear {user.name},\n\n"
-        "We’re sorry to see you go. Thank you for being a part of our journey. "
-        "If there’s anything we could improve, we’d love to hear your feedback.\n\n"
-        "Best wishes,\nThe InventoryNest Team",
-        recipient_list=[user.email],
-        fail_silently=False,
-    )
-
-    # Delete the user account
-    user.delete()
+    for shop_id in shop_ids:
+        Shop.invalidate_storefront(shop_id)
+    UserProfile.invalidate_me(user.id)
 
     return Response(
         {